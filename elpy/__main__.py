@@ -7,18 +7,25 @@ python -m elpy
 The first line should be "elpy-rpc ready". If it isn't, something
 broke.
 
+To keep a warm server around that forks a new one for every client,
+run "python -m elpy --zygote SOCKET", and start clients with
+"python -m elpy --connect SOCKET". See elpy.zygote for details.
+
 """
 
-import os
 import sys
 
-import elpy
-from elpy.server import ElpyRPCServer
+from elpy.server import serve
 
 if __name__ == "__main__":
-    stdin = sys.stdin
-    stdout = sys.stdout
-    sys.stdout = sys.stderr = open(os.devnull, "w")
-    stdout.write("elpy-rpc ready ({0})\n".format(elpy.__version__))
-    stdout.flush()
-    ElpyRPCServer(stdin, stdout).serve_forever()
+    if len(sys.argv) == 3 and sys.argv[1] == "--zygote":
+        from elpy import zygote
+
+        zygote.serve_zygote(sys.argv[2])
+    elif len(sys.argv) == 3 and sys.argv[1] == "--connect":
+        from elpy import zygote
+
+        if not zygote.connect(sys.argv[2]):
+            serve(sys.stdin, sys.stdout)
+    else:
+        serve(sys.stdin, sys.stdout)
@@ -2,7 +2,9 @@
 
 """
 
+import copy
 import os
+from typing import Any, Dict, Tuple
 
 from elpy.rpc import Fault
 
@@ -11,14 +13,65 @@ try:
 except ImportError:  # pragma: no cover
     autopep8 = None
 
+# The project configuration files autopep8 reads
+CONFIG_FILES = ("setup.cfg", "tox.ini", ".pep8", ".flake8", "pyproject.toml")
+
+# directory -> (config key, options)
+_options: Dict[str, Tuple[Any, Any]] = {}
+
+
+def get_config_key(directory):
+    """Return a key that changes whenever the configuration might.
+
+    autopep8 reads the user configuration and the first project
+    configuration found from directory upwards. The key lists the
+    modification times of all files it might read.
+
+    """
+    paths = []
+    if autopep8:
+        paths.append(autopep8.DEFAULT_CONFIG)
+    parent = os.path.abspath(directory)
+    while True:
+        paths.extend(os.path.join(parent, filename) for filename in CONFIG_FILES)
+        parent, tail = os.path.split(parent)
+        if not tail:
+            break
+    key = []
+    for path in paths:
+        try:
+            key.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+    return tuple(key)
+
+
+def get_options(directory):
+    """Return the autopep8 options that apply to directory.
+
+    The options are cached per directory until one of the configuration
+    files changes. Every caller gets a copy, as autopep8 modifies them.
+
+    """
+    directory = os.path.abspath(directory)
+    config_key = get_config_key(directory)
+    cached = _options.get(directory)
+    if cached is None or cached[0] != config_key:
+        try:
+            # autopep8 looks for configuration files from the
+            # directory of the file given upwards.
+            options = autopep8.parse_args(
+                [os.path.join(directory, "")], apply_config=True
+            )
+        except SystemExit:
+            raise Fault("Invalid autopep8 configuration", code=400)
+        cached = (config_key, options)
+        _options[directory] = cached
+    return copy.deepcopy(cached[1])
+
 
 def fix_code(code, directory):
     """Formats Python code to conform to the PEP 8 style guide."""
     if not autopep8:
         raise Fault("autopep8 not installed, cannot fix code.", code=400)
-    old_dir = os.getcwd()
-    try:
-        os.chdir(directory)
-        return autopep8.fix_code(code, apply_config=True)
-    finally:
-        os.chdir(old_dir)
+    return autopep8.fix_code(code, options=get_options(directory))
@@ -0,0 +1,479 @@
+"""Benchmarks for the hot paths of the RPC server.
+
+The benchmarks drive an ElpyRPCServer through its JSON protocol, like
+Emacs does, on a fixed corpus written to a temporary project. For
+every case, they report the 50th, 95th and 99th percentile latency
+and the peak memory allocated while handling one request:
+
+  python -m elpy.benchmark
+  python -m elpy.benchmark --save-baseline baseline.json
+  python -m elpy.benchmark --baseline baseline.json --threshold 0.25
+
+Documentation is rendered in a helper process, whose memory is not
+included in the peak of the pydoc_documentation case.
+
+With a baseline, the run fails if a case got slower or allocates more
+than threshold times the baseline. Differences below --min-delta-ms
+milliseconds and --min-delta-kb kilobytes are not counted, as they
+are within the noise of small cases.
+
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+# The module completed in and navigated, with a few hundred names
+SHAPES_SOURCE = (
+    '"""Shapes of all kinds."""\n'
+    "import math\n"
+    "\n"
+    "\n"
+    "class Shape:\n"
+    '    """A shape."""\n'
+    "\n"
+    "    def area(self):\n"
+    '        """Return the area of the shape."""\n'
+    "        raise NotImplementedError\n"
+    "\n"
+    "    def scale(self, factor):\n"
+    "        return self\n"
+    "\n"
+    "\n"
+    + "".join(
+        "class Shape{0}(Shape):\n"
+        '    """Shape number {0}."""\n'
+        "\n"
+        "    def __init__(self, size):\n"
+        "        self.size = size\n"
+        "\n"
+        "    def area(self):\n"
+        "        return math.pi * self.size ** {0}\n"
+        "\n"
+        "    def perimeter_{0}(self):\n"
+        "        return 2 * math.pi * self.size\n"
+        "\n"
+        "\n"
+        "def make_shape_{0}(size=1):\n"
+        '    """Return a new Shape{0}."""\n'
+        "    return Shape{0}(size)\n"
+        "\n"
+        "\n".format(number)
+        for number in range(100)
+    )
+)
+
+MAIN_SOURCE = (
+    "import os\n"
+    "import shapes\n"
+    "\n"
+    "\n"
+    "def total_area(items):\n"
+    "    total = 0\n"
+    "    for item in items:\n"
+    "        total += item.area()\n"
+    "    return total\n"
+    "\n"
+    "\n"
+    "circle = shapes.make_shape_42(size=3)\n"
+    "print(total_area([circle, shapes.Shape7(2)]))\n"
+    "print(os.path.join('a', 'b'))\n"
+    "circle.perimeter_42()\n"
+    "os.path.\n"
+)
+
+# Standard library symbols to document and complete. There are more
+# than iterations by default, so every timed request misses the caches.
+PYDOC_SYMBOLS = [
+    "argparse.ArgumentParser",
+    "base64.b64encode",
+    "bisect.insort",
+    "calendar.monthrange",
+    "configparser.ConfigParser",
+    "copy.deepcopy",
+    "csv.DictReader",
+    "datetime.timedelta",
+    "difflib.unified_diff",
+    "fnmatch.fnmatch",
+    "fractions.Fraction",
+    "functools.reduce",
+    "glob.glob",
+    "gzip.open",
+    "hashlib.sha256",
+    "heapq.heappush",
+    "hmac.new",
+    "html.escape",
+    "inspect.signature",
+    "ipaddress.ip_address",
+    "itertools.chain",
+    "json.dumps",
+    "math.isclose",
+    "operator.itemgetter",
+    "os.path.join",
+    "pprint.pformat",
+    "queue.Queue",
+    "random.Random",
+    "re.compile",
+    "sched.scheduler",
+    "secrets.token_hex",
+    "shlex.split",
+    "shutil.copyfile",
+    "statistics.mean",
+    "string.capwords",
+    "struct.pack",
+    "tarfile.TarFile",
+    "tempfile.mkdtemp",
+    "textwrap.dedent",
+    "urllib.parse.quote",
+    "uuid.uuid4",
+    "zipfile.ZipFile",
+    "zlib.compress",
+]
+
+# Badly formatted code, to give the formatters some work
+UNFORMATTED_SOURCE = "".join(
+    "def function_{0}( a,b ,c = {0} ):\n"
+    "  x=[ a,b,c ]\n"
+    "  return {{ 'key':x , 'other' : (a+b)*c }}\n"
+    "\n".format(number)
+    for number in range(30)
+)
+
+
+class Case(NamedTuple):
+    """A benchmark case.
+
+    get_params returns the parameters of the RPC method for a project
+    directory and the number of the iteration.
+
+    """
+
+    name: str
+    method: str
+    get_params: Callable[[str, int], List[Any]]
+
+
+def _offset(source: str, text: str, delta: int = 0) -> int:
+    return source.index(text) + delta
+
+
+def _main(directory: str) -> str:
+    return os.path.join(directory, "main.py")
+
+
+def _unformatted(iteration: int) -> str:
+    # Formatting results are cached, so every iteration formats new code.
+    return "# Iteration {0}\n{1}".format(iteration, UNFORMATTED_SOURCE)
+
+
+def _pydoc_symbol(iteration: int) -> str:
+    # Documentation is cached, and so are the names of every module
+    # completed in, so iterations use different modules.
+    return PYDOC_SYMBOLS[iteration % len(PYDOC_SYMBOLS)]
+
+
+def _pydoc_prefix(iteration: int) -> str:
+    module, name = _pydoc_symbol(iteration).rsplit(".", 1)
+    return "{0}.{1}".format(module, name[:2])
+
+
+CASES = [
+    Case(
+        "completions_module",
+        "get_completions",
+        lambda directory, iteration: [
+            _main(directory),
+            MAIN_SOURCE,
+            _offset(MAIN_SOURCE, "os.path.\n", len("os.path.")),
+        ],
+    ),
+    Case(
+        "completions_project",
+        "get_completions",
+        lambda directory, iteration: [
+            _main(directory),
+            MAIN_SOURCE,
+            _offset(MAIN_SOURCE, "shapes.make_shape_42", len("shapes.")),
+        ],
+    ),
+    Case(
+        "calltip",
+        "get_calltip",
+        lambda directory, iteration: [
+            _main(directory),
+            MAIN_SOURCE,
+            _offset(MAIN_SOURCE, "make_shape_42(size", len("make_shape_42(")),
+        ],
+    ),
+    Case(
+        "definition",
+        "get_definition",
+        lambda directory, iteration: [
+            _main(directory),
+            MAIN_SOURCE,
+            _offset(MAIN_SOURCE, "perimeter_42()", 1),
+        ],
+    ),
+    Case(
+        "usages",
+        "get_usages",
+        lambda directory, iteration: [
+            _main(directory),
+            MAIN_SOURCE,
+            _offset(MAIN_SOURCE, "total_area([", 1),
+        ],
+    ),
+    Case(
+        "names",
+        "get_names",
+        lambda directory, iteration: [
+            os.path.join(directory, "shapes.py"),
+            SHAPES_SOURCE,
+            0,
+        ],
+    ),
+    Case(
+        "fix_code_autopep8",
+        "fix_code",
+        lambda directory, iteration: [_unformatted(iteration), directory],
+    ),
+    Case(
+        "fix_code_yapf",
+        "fix_code_with_yapf",
+        lambda directory, iteration: [_unformatted(iteration), directory],
+    ),
+    Case(
+        "fix_code_black",
+        "fix_code_with_black",
+        lambda directory, iteration: [_unformatted(iteration), directory],
+    ),
+    Case(
+        "pydoc_completions",
+        "get_pydoc_completions",
+        lambda directory, iteration: [_pydoc_prefix(iteration)],
+    ),
+    Case(
+        "pydoc_documentation",
+        "get_pydoc_documentation",
+        lambda directory, iteration: [_pydoc_symbol(iteration)],
+    ),
+]
+
+
+class BenchmarkClient:
+    """Send requests to an ElpyRPCServer through its JSON protocol."""
+
+    def __init__(self, project_root: str) -> None:
+        from elpy.server import ElpyRPCServer
+
+        self.server = ElpyRPCServer(io.StringIO(), io.StringIO())
+        self._id = 0
+        self.call("init", [{"project_root": project_root, "environment": None}])
+
+    def call(self, method: str, params: List[Any]) -> Any:
+        """Call method with params, and return the result.
+
+        Raises RuntimeError if the server answers with an error.
+
+        """
+        self._id += 1
+        request = {"id": self._id, "method": method, "params": params}
+        self.server.stdin = io.StringIO(json.dumps(request) + "\n")
+        self.server.stdout = io.StringIO()
+        self.server.handle_request()
+        response = json.loads(self.server.stdout.getvalue())
+        if "error" in response:
+            raise RuntimeError(response["error"]["message"])
+        return response["result"]
+
+    def close(self) -> None:
+        if self.server._pydoc_renderer is not None:
+            self.server._pydoc_renderer.stop()
+        if self.server._file_formatter is not None:
+            self.server._file_formatter.shutdown()
+
+
+def write_corpus(directory: str) -> None:
+    """Write the files of the benchmark project to directory."""
+    for filename, source in (("shapes.py", SHAPES_SOURCE), ("main.py", MAIN_SOURCE)):
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+            f.write(source)
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """Return the nearest-rank percentile of samples."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_case(
+    client: BenchmarkClient,
+    case: Case,
+    directory: str,
+    iterations: int,
+    warmup: int = 2,
+) -> Dict[str, Any]:
+    """Run case and return its statistics, or its error."""
+    samples = []
+    try:
+        for iteration in range(warmup):
+            client.call(case.method, case.get_params(directory, -1 - iteration))
+        for iteration in range(iterations):
+            params = case.get_params(directory, iteration)
+            start = time.perf_counter()
+            client.call(case.method, params)
+            samples.append((time.perf_counter() - start) * 1000)
+        # Tracing allocations slows everything down, so memory is
+        # measured in a separate run.
+        params = case.get_params(directory, iterations)
+        tracemalloc.start()
+        try:
+            client.call(case.method, params)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except RuntimeError as e:
+        return {"error": str(e)}
+    return {
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "peak_kb": peak / 1024,
+    }
+
+
+def run(
+    cases: List[Case], iterations: int, warmup: int = 2
+) -> Dict[str, Dict[str, Any]]:
+    """Run cases on the corpus and return their results by name."""
+    directory = tempfile.mkdtemp(prefix="elpy-benchmark-")
+    try:
+        write_corpus(directory)
+        client = BenchmarkClient(directory)
+        try:
+            return {
+                case.name: run_case(client, case, directory, iterations, warmup)
+                for case in cases
+            }
+        finally:
+            client.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float,
+    min_delta_ms: float = 1.0,
+    min_delta_kb: float = 64.0,
+) -> List[str]:
+    """Return a message for every regression of results over baseline.
+
+    A case failing that succeeded in the baseline is a regression.
+
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        expected = baseline.get(name)
+        if expected is None or "error" in expected:
+            continue
+        if "error" in result:
+            regressions.append("{0}: failed with {1}".format(name, result["error"]))
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms", "peak_kb"):
+            if key not in expected:
+                continue
+            min_delta = min_delta_kb if key == "peak_kb" else min_delta_ms
+            limit = max(expected[key] * (1 + threshold), expected[key] + min_delta)
+            if result[key] > limit:
+                regressions.append(
+                    "{0}: {1} is {2:.1f}, baseline {3:.1f}".format(
+                        name, key, result[key], expected[key]
+                    )
+                )
+    return regressions
+
+
+def format_results(results: Dict[str, Dict[str, Any]]) -> str:
+    lines = [
+        "{0:<24} {1:>9} {2:>9} {3:>9} {4:>10}".format(
+            "case", "p50 ms", "p95 ms", "p99 ms", "peak kB"
+        )
+    ]
+    for name, result in results.items():
+        if "error" in result:
+            lines.append("{0:<24} error: {1}".format(name, result["error"]))
+        else:
+            lines.append(
+                "{0:<24} {1:>9.2f} {2:>9.2f} {3:>9.2f} {4:>10.1f}".format(
+                    name,
+                    result["p50_ms"],
+                    result["p95_ms"],
+                    result["p99_ms"],
+                    result["peak_kb"],
+                )
+            )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m elpy.benchmark", description="Benchmark the RPC server."
+    )
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument(
+        "--cases", nargs="+", metavar="CASE", help="only run these cases"
+    )
+    parser.add_argument("--baseline", help="fail on regressions over this baseline")
+    parser.add_argument(
+        "--save-baseline", metavar="FILE", help="write the results to FILE"
+    )
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    parser.add_argument("--min-delta-kb", type=float, default=64.0)
+    args = parser.parse_args(argv)
+
+    cases = CASES
+    if args.cases:
+        unknown = set(args.cases) - set(case.name for case in CASES)
+        if unknown:
+            parser.error("unknown cases: {0}".format(", ".join(sorted(unknown))))
+        cases = [case for case in CASES if case.name in args.cases]
+
+    results = run(cases, args.iterations, args.warmup)
+    print(format_results(results))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(
+            results,
+            baseline,
+            args.threshold,
+            args.min_delta_ms,
+            args.min_delta_kb,
+        )
+        if regressions:
+            print("\nRegressions over {0}:".format(args.baseline))
+            for regression in regressions:
+                print("  " + regression)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,9 @@
 """
 
 import os
-from dataclasses import dataclass
+from dataclasses import astuple, dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, Optional
 
 import toml
 
@@ -23,11 +23,16 @@ class BlackCodeFormatter:
         if not self.black:
             raise Fault("black not installed", code=400)
         self.find_pyproject_toml = self.black.files.find_pyproject_toml
+        self._configurations: Dict[Path, CachedConfig] = {}
 
     def format_code(self, code: str, directory: Path) -> str:
         config = self._get_black_configuration(directory)
         return self._run_black(code, config)
 
+    def get_config_key(self, directory: Path) -> Any:
+        """Return a key for the configuration that applies to directory."""
+        return astuple(self._get_black_configuration(directory))
+
     def _run_black(self, code: str, configuration: Config) -> str:
         try:
             fm = self.black.FileMode(
@@ -44,10 +49,34 @@ class BlackCodeFormatter:
             raise Fault("Error during formatting: {}".format(e), code=400)
 
     def _get_black_configuration(self, directory: Path) -> Config:
+        """Return the configuration for directory.
+
+        The configuration is cached per directory until the
+        pyproject.toml it was read from changes.
+
+        """
+        cached = self._configurations.get(directory)
+        if cached is not None and cached.pyproject_path is not None:
+            if get_mtime(cached.pyproject_path) == cached.mtime:
+                return cached.config
+        # Black caches the project root, so this is cheap.
+        pyproject_path = self.find_pyproject_toml((str(directory),))
+        mtime = get_mtime(pyproject_path) if pyproject_path else None
+        if mtime is None:
+            pyproject_path = None
+        if cached is not None and (cached.pyproject_path, cached.mtime) == (
+            pyproject_path,
+            mtime,
+        ):
+            return cached.config
+        config = self._load_black_configuration(pyproject_path)
+        self._configurations[directory] = CachedConfig(pyproject_path, mtime, config)
+        return config
+
+    def _load_black_configuration(self, pyproject_path: Optional[str]) -> Config:
         line_length = self.black.DEFAULT_LINE_LENGTH
         string_normalization = True
-        pyproject_path = self.find_pyproject_toml((str(directory),))
-        if pyproject_path and os.path.exists(pyproject_path):
+        if pyproject_path is not None:
             pyproject_config = toml.load(pyproject_path)
             black_config = pyproject_config.get("tool", {}).get("black", {})
             if "line-length" in black_config:
@@ -60,6 +89,20 @@ class BlackCodeFormatter:
         )
 
 
+@dataclass
+class CachedConfig:
+    pyproject_path: Optional[str]
+    mtime: Optional[int]
+    config: BlackCodeFormatter.Config
+
+
+def get_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
 def fix_code(code: str, directory: str) -> str:
     """Formats Python code to conform to the PEP 8 style guide."""
     formatter = BlackCodeFormatter()
@@ -0,0 +1,73 @@
+"""Columnar encoding of lists of dicts.
+
+Large responses like completions and usages are lists of dicts with
+the same keys. Encoded as columns, every key is written once, and
+values repeated a lot, like file names, are written once to a string
+table and referenced by their index:
+
+  [{"name": "foo", "filename": "a.py", "offset": 3},
+   {"name": "foo", "filename": "a.py", "offset": 9}]
+
+becomes
+
+  {"length": 2,
+   "columns": {"name": ["foo", "foo"],
+               "filename": [0, 0],
+               "offset": [3, 9]},
+   "strings": ["a.py"],
+   "interned": ["filename"]}
+
+Keys missing from a dict get None in their column. None values are
+not put in the string table.
+
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def encode(rows: List[Dict[str, Any]], interned: Iterable[str] = ()) -> Dict[str, Any]:
+    """Return rows in columns, with the values of interned keys in a table."""
+    interned = set(interned)
+    keys = dict.fromkeys(key for row in rows for key in row)
+    strings: List[Any] = []
+    indexes: Dict[Any, int] = {}
+
+    def intern(value: Any) -> Optional[int]:
+        if value is None:
+            return None
+        index = indexes.get(value)
+        if index is None:
+            index = indexes[value] = len(strings)
+            strings.append(value)
+        return index
+
+    columns = {}
+    for key in keys:
+        if key in interned:
+            columns[key] = [intern(row.get(key)) for row in rows]
+        else:
+            columns[key] = [row.get(key) for row in rows]
+    return {
+        "length": len(rows),
+        "columns": columns,
+        "strings": strings,
+        "interned": [key for key in keys if key in interned],
+    }
+
+
+def decode(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return the rows encoded in data."""
+    interned = set(data["interned"])
+    strings = data["strings"]
+    columns = {
+        key: (
+            [None if index is None else strings[index] for index in values]
+            if key in interned
+            else values
+        )
+        for key, values in data["columns"].items()
+    }
+    return [
+        {key: values[i] for key, values in columns.items()}
+        for i in range(data["length"])
+    ]
@@ -0,0 +1,660 @@
+"""In-process diagnostics.
+
+Syntax errors are found by parso. On top of that, some of the checks
+of pyflakes are run on the same tree: undefined names (F821), unused
+imports (F401) and unused local variables (F841).
+
+What the checks find within a top-level function or method only
+depends on the code of that function, so their results are cached per
+function. When a file changes, only the functions that changed are
+checked again.
+
+"""
+
+import ast
+import builtins
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from elpy.documents import DocumentStore
+
+BUILTIN_NAMES = frozenset(dir(builtins)) | {
+    "__builtins__",
+    "__doc__",
+    "__file__",
+    "__loader__",
+    "__name__",
+    "__package__",
+    "__path__",
+    "__spec__",
+}
+
+NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class FunctionResult:
+    """What checking a function found.
+
+    Line numbers are relative to the start of the function, so the
+    result stays valid when the function moves within the file.
+
+    """
+
+    def __init__(
+        self,
+        diagnostics: List[Dict[str, Any]],
+        free_uses: List[Any],
+        used_names: FrozenSet[str],
+        global_names: FrozenSet[str],
+    ) -> None:
+        self.diagnostics = diagnostics
+        # (name, diagnostic) for names not defined within the function
+        self.free_uses = free_uses
+        self.used_names = used_names
+        # Module-level names the function declares global
+        self.global_names = global_names
+
+
+class DiagnosticsCache:
+    """Check files, reusing the results for unchanged functions.
+
+    The results of at most size functions are kept, the least recently
+    used ones are dropped first. Modules are parsed using documents.
+
+    """
+
+    def __init__(
+        self, documents: Optional[DocumentStore] = None, size: int = 1024
+    ) -> None:
+        self.size = size
+        self.documents = documents if documents is not None else DocumentStore()
+        self._functions: "OrderedDict[Tuple[str, int], FunctionResult]" = OrderedDict()
+
+    def get_diagnostics(self, filename: str, source: str) -> List[Dict[str, Any]]:
+        """Return the diagnostics for filename, sorted by position.
+
+        Every diagnostic is a dict with the keys line, column,
+        end_line, end_column, code, message and severity ("error" or
+        "warning"). Lines start at 1, columns at 0.
+
+        """
+        module = self.documents.get_module(filename, source)
+        errors = list(self.documents.grammar.iter_errors(module))
+        gaps = _get_grammar_gaps(source, filename, errors) if errors else None
+        if gaps is not None:
+            # Python parses the code, parso does not support all of it.
+            return sorted(
+                (
+                    diagnostic
+                    for diagnostic in self._check_module(
+                        module, is_package=filename.endswith("__init__.py")
+                    )
+                    if not gaps.covers(diagnostic)
+                ),
+                key=lambda diagnostic: (diagnostic["line"], diagnostic["column"]),
+            )
+        diagnostics = [
+            {
+                "line": error.start_pos[0],
+                "column": error.start_pos[1],
+                "end_line": error.end_pos[0],
+                "end_column": error.end_pos[1],
+                "code": "E999",
+                "message": error.message,
+                "severity": "error",
+            }
+            for error in errors
+        ]
+        diagnostics.extend(
+            self._check_module(module, is_package=filename.endswith("__init__.py"))
+        )
+        diagnostics.sort(
+            key=lambda diagnostic: (diagnostic["line"], diagnostic["column"])
+        )
+        return diagnostics
+
+    def _check_module(self, module, is_package: bool) -> List[Dict[str, Any]]:
+        diagnostics: List[Dict[str, Any]] = []
+        results: List[Tuple[Any, FunctionResult]] = []
+
+        def check_function(funcdef):
+            results.append((funcdef, self._check_function(funcdef)))
+
+        scope = Scope(None, "module")
+        _walk(module, scope, check_function)
+
+        has_star_import = any(
+            node.is_star_import()
+            for node in module.iter_imports()
+            if node.type == "import_from"
+        )
+        used_names = (
+            _get_used_names(scope) | _get_all_names(module) | scope.fallback_names
+        )
+        for _, result in results:
+            scope.declared |= result.global_names
+        for funcdef, result in results:
+            line = funcdef.start_pos[0]
+            # Methods can use the implicit __class__ cell
+            is_method = funcdef.search_ancestor("classdef") is not None
+            used_names |= result.used_names
+            diagnostics.extend(
+                _move(diagnostic, line) for diagnostic in result.diagnostics
+            )
+            if not has_star_import:
+                diagnostics.extend(
+                    _move(diagnostic, line)
+                    for name, diagnostic in result.free_uses
+                    if not scope.defines(name)
+                    and not (is_method and name == "__class__")
+                )
+        if not has_star_import:
+            diagnostics.extend(_get_undefined_names(scope))
+        if not is_package:
+            diagnostics.extend(
+                _unused_import(leaf)
+                for leaf in scope.imports
+                if leaf.value not in used_names
+            )
+        for class_scope in scope.iter_scopes():
+            if class_scope is not scope:
+                diagnostics.extend(_get_unused_imports(class_scope))
+        return diagnostics
+
+    def _check_function(self, funcdef) -> FunctionResult:
+        code = funcdef.get_code(include_prefix=False)
+        key = (
+            hashlib.sha1(code.encode("utf-8", "surrogatepass")).hexdigest(),
+            funcdef.start_pos[1],
+        )
+        result = self._functions.get(key)
+        if result is None:
+            result = _check_function(funcdef)
+            self._functions[key] = result
+            while len(self._functions) > self.size:
+                self._functions.popitem(last=False)
+        else:
+            self._functions.move_to_end(key)
+        return result
+
+
+class Scope:
+    """The names defined and used within a module, class or function."""
+
+    def __init__(self, parent: Optional["Scope"], kind: str) -> None:
+        self.parent = parent
+        self.kind = kind
+        self.definitions: Set[str] = set()
+        # Names declared global or nonlocal
+        self.declared: Set[str] = set()
+        self.global_names: Set[str] = set()
+        self.imports: List[Any] = []
+        # Names rebound in except ImportError blocks, which count as
+        # uses of their imports
+        self.fallback_names: Set[str] = set()
+        self.assignments: List[Any] = []
+        self.uses: List[Any] = []
+        # Names used within string annotations
+        self.annotation_names: Set[str] = set()
+        self.children: List[Scope] = []
+        if parent is not None:
+            parent.children.append(self)
+
+    def defines(self, name: str) -> bool:
+        return name in self.definitions or name in self.declared
+
+    def resolves(self, name: str) -> bool:
+        """Return whether name is visible from within this scope.
+
+        As in Python, class scopes are not visible from the scopes
+        nested within them.
+
+        """
+        if self.defines(name):
+            return True
+        in_function = self.kind == "function"
+        scope = self.parent
+        while scope is not None:
+            if scope.kind == "class" and in_function and name == "__class__":
+                return True
+            if scope.kind != "class" and scope.defines(name):
+                return True
+            in_function = in_function or scope.kind == "function"
+            scope = scope.parent
+        return name in BUILTIN_NAMES
+
+    def iter_scopes(self):
+        yield self
+        for child in self.children:
+            yield from child.iter_scopes()
+
+
+def _check_function(funcdef) -> FunctionResult:
+    """Check funcdef on its own."""
+    scope = _walk_function(funcdef, None)
+    assert scope is not None
+    line = funcdef.start_pos[0]
+    diagnostics: List[Dict[str, Any]] = []
+    free_uses = []
+    for function_scope in scope.iter_scopes():
+        for leaf in function_scope.uses:
+            if not function_scope.resolves(leaf.value):
+                free_uses.append((leaf.value, _move(_undefined_name(leaf), -line)))
+        diagnostics.extend(
+            _move(diagnostic, -line)
+            for diagnostic in _get_unused_imports(function_scope)
+        )
+        if function_scope.kind == "function":
+            diagnostics.extend(
+                _move(diagnostic, -line)
+                for diagnostic in _get_unused_variables(function_scope)
+            )
+    # Builtins are left out, the remaining free names are resolved
+    # against the module by the caller.
+    return FunctionResult(
+        diagnostics=diagnostics,
+        free_uses=[
+            (name, diagnostic)
+            for name, diagnostic in free_uses
+            if name not in BUILTIN_NAMES
+        ],
+        used_names=frozenset(_get_used_names(scope)),
+        global_names=frozenset(
+            name for child in scope.iter_scopes() for name in child.global_names
+        ),
+    )
+
+
+def _walk(node, scope: Scope, check_function: Optional[Callable[[Any], None]]) -> None:
+    """Record the names defined and used within node in scope.
+
+    Top-level functions and methods are passed to check_function
+    instead of being walked, if given.
+
+    """
+    for child in node.children:
+        if child.type == "name":
+            _add_name(child, scope)
+        elif child.type == "funcdef":
+            _add_definition(child, child.name.value, scope)
+            _walk_function(child, scope, check_function)
+        elif child.type == "lambdef":
+            _walk_function(child, scope)
+        elif child.type == "classdef":
+            _add_definition(child, child.name.value, scope)
+            for grandchild in child.children[2:-1]:
+                _walk_leaf_or_node(grandchild, scope, check_function)
+            _walk(child.children[-1], Scope(scope, "class"), check_function)
+        elif child.type == "annassign":
+            _walk_annotation(child.children[1], scope)
+            for grandchild in child.children[2:]:
+                _walk_leaf_or_node(grandchild, scope, check_function)
+        elif child.type in ("global_stmt", "nonlocal_stmt"):
+            names = {name.value for name in child.children if name.type == "name"}
+            scope.declared.update(names)
+            if child.type == "global_stmt":
+                scope.global_names.update(names)
+        elif hasattr(child, "children"):
+            _walk(child, scope, check_function)
+
+
+def _walk_leaf_or_node(node, scope: Scope, check_function) -> None:
+    if node.type == "name":
+        _add_name(node, scope)
+    elif hasattr(node, "children"):
+        _walk(node, scope, check_function)
+
+
+def _walk_annotation(node, scope: Scope) -> None:
+    """Walk an annotation, which may contain names within strings."""
+    _walk_leaf_or_node(node, scope, None)
+    for leaf in _iter_leaves(node):
+        if leaf.type == "string":
+            scope.annotation_names.update(NAME_RE.findall(leaf.value))
+
+
+def _walk_function(
+    funcdef, scope: Optional[Scope], check_function=None
+) -> Optional[Scope]:
+    """Walk a function or lambda.
+
+    Default values and annotations belong to scope, the parameters and
+    the body to a new scope, which is returned. If scope is a module
+    or class, and check_function is given, the body is left to
+    check_function instead.
+
+    """
+    params = funcdef.get_params()
+    if scope is not None:
+        for param in params:
+            if param.default is not None:
+                _walk_leaf_or_node(param.default, scope, None)
+            if param.annotation is not None:
+                _walk_annotation(param.annotation, scope)
+        if funcdef.type == "funcdef" and funcdef.children[3] == "->":
+            _walk_annotation(funcdef.children[4], scope)
+        if check_function is not None and scope.kind != "function":
+            check_function(funcdef)
+            return None
+    function_scope = Scope(scope, "function")
+    function_scope.definitions.update(param.name.value for param in params)
+    _walk_leaf_or_node(funcdef.children[-1], function_scope, None)
+    return function_scope
+
+
+def _add_name(leaf, scope: Scope) -> None:
+    parent = leaf.parent
+    if parent.type == "error_node":
+        # Names in code that does not parse are unreliable
+        return
+    if parent.type == "fstring_conversion":
+        # The r of f"{x!r}"
+        return
+    if (
+        parent.type in ("namedexpr_test", "argument")
+        and parent.children[0] is leaf
+        and parent.children[1] == ":="
+    ):
+        # Comprehensions are not scopes of their own here, so this is
+        # the scope assignment expressions bind in.
+        scope.definitions.add(leaf.value)
+        scope.assignments.append(leaf)
+        return
+    previous = leaf.get_previous_sibling()
+    if parent.type in ("trailer", "dotted_name") and previous == ".":
+        # An attribute
+        return
+    if parent.type == "argument" and parent.children[0] is leaf and previous is None:
+        if len(parent.children) > 1 and parent.children[1] == "=":
+            # A keyword argument
+            return
+    import_node = leaf.search_ancestor("import_name", "import_from")
+    if import_node is not None:
+        if import_node.type == "import_from" and [
+            name.value for name in import_node.get_from_names()
+        ] == ["__future__"]:
+            return
+        if leaf.is_definition():
+            scope.definitions.add(leaf.value)
+            scope.imports.append(leaf)
+        return
+    definition = leaf.get_definition()
+    if definition is not None and definition.type != "del_stmt":
+        _add_definition(leaf, leaf.value, scope)
+        if definition.type == "expr_stmt":
+            operator = definition.children[1]
+            if operator.type == "operator" and operator != "=":
+                # Augmented assignments use the name as well
+                scope.uses.append(leaf)
+            elif leaf.parent is definition:
+                scope.assignments.append(leaf)
+        return
+    scope.uses.append(leaf)
+
+
+def _add_definition(node, name: str, scope: Scope) -> None:
+    scope.definitions.add(name)
+    if _is_import_fallback(node):
+        scope.fallback_names.add(name)
+
+
+def _is_import_fallback(node) -> bool:
+    """Return whether node is within an except ImportError block."""
+    while node.parent is not None and node.parent.type not in SCOPE_TYPES:
+        parent = node.parent
+        if parent.type == "try_stmt":
+            clause = parent.children[parent.children.index(node) - 2]
+            if clause.type == "except_clause" and any(
+                leaf.type == "name" and leaf.value in IMPORT_ERRORS
+                for leaf in _iter_leaves(clause)
+            ):
+                return True
+        node = parent
+    return False
+
+
+SCOPE_TYPES = ("classdef", "file_input", "funcdef", "lambdef")
+IMPORT_ERRORS = ("ImportError", "ModuleNotFoundError")
+
+
+class GrammarGaps:
+    """The statements of a module Python parses but parso does not.
+
+    The checks do not see into these statements, so diagnostics they
+    would change are left out.
+
+    """
+
+    def __init__(self, tree) -> None:
+        self.lines: Set[int] = set()
+        self.bound_names: Set[str] = set()
+        # The first and last line of every statement and the names it
+        # loads
+        self.uses: List[Tuple[int, int, Set[str]]] = []
+        self._functions = [
+            (node.lineno, node.end_lineno or node.lineno)
+            for node in ast.walk(tree)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+        ]
+
+    def add(self, statement) -> None:
+        decorators = getattr(statement, "decorator_list", [])
+        first_line = min([statement.lineno] + [node.lineno for node in decorators])
+        self.lines.update(range(first_line, statement.end_lineno + 1))
+        self.bound_names.update(_get_bound_names(statement))
+        self.uses.append(
+            (
+                first_line,
+                statement.end_lineno,
+                {
+                    node.id
+                    for node in ast.walk(statement)
+                    if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+                },
+            )
+        )
+
+    def covers(self, diagnostic: Dict[str, Any]) -> bool:
+        """Return whether diagnostic might be wrong because of the gaps."""
+        if diagnostic["line"] in self.lines:
+            return True
+        code = diagnostic["code"]
+        if code == "F821":
+            return _get_name(diagnostic) in self.bound_names
+        if code in ("F401", "F841"):
+            return self._is_used(_get_name(diagnostic), diagnostic["line"])
+        return False
+
+    def _is_used(self, name: str, line: int) -> bool:
+        """Return whether a statement in the scope of line loads name."""
+        functions = [
+            (first, last) for first, last in self._functions if first <= line <= last
+        ]
+        # Within the innermost function, or anywhere in the module
+        first, last = max(functions) if functions else (0, float("inf"))
+        return any(
+            name in names and first <= statement_first and statement_last <= last
+            for statement_first, statement_last, names in self.uses
+        )
+
+
+def _get_grammar_gaps(
+    source: str, filename: str, errors: List[Any]
+) -> Optional[GrammarGaps]:
+    """Return what parso can not check, if Python parses source.
+
+    The grammar of parso lags behind Python, match statements for
+    example are not supported. If Python compiles source, returns the
+    statements parso fails to parse. Otherwise, returns None.
+
+    """
+    try:
+        tree = ast.parse(source, filename)
+        # Some errors are only found when compiling, like a nonlocal
+        # statement without a binding.
+        compile(tree, filename, "exec", dont_inherit=True)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    gaps = GrammarGaps(tree)
+    # parso recovers from the errors differently than Python parses
+    # the code, so the whole statement containing an error is left out.
+    error_lines = {error.start_pos[0] for error in errors}
+    for line in sorted(error_lines):
+        statement = _find_statement(tree.body, line)
+        if statement is not None and line not in gaps.lines:
+            gaps.add(statement)
+    return gaps
+
+
+def _find_statement(body, line: int):
+    """Return the innermost statement of a block that contains line."""
+    for statement in body:
+        if statement.lineno <= line <= statement.end_lineno:
+            if isinstance(
+                statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+            ):
+                return _find_statement(statement.body, line) or statement
+            return statement
+    return None
+
+
+def _get_bound_names(statement) -> Set[str]:
+    names = set()
+    for node in ast.walk(statement):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+    return names
+
+
+def _get_name(diagnostic: Dict[str, Any]) -> str:
+    return diagnostic["message"].split("'")[1]
+
+
+def _get_used_names(scope: Scope) -> Set[str]:
+    names: Set[str] = set()
+    for child in scope.iter_scopes():
+        names.update(leaf.value for leaf in child.uses)
+        names.update(child.annotation_names)
+    return names
+
+
+def _get_all_names(module) -> Set[str]:
+    """Return the names listed in __all__.
+
+    Names assigned or added to __all__, and passed to its extend and
+    append methods, in the module scope are found.
+
+    """
+    names = set()
+    for node in _iter_module_statements(module):
+        if node.type == "expr_stmt":
+            if [name.value for name in node.get_defined_names()] != ["__all__"]:
+                continue
+        elif node.type in ("atom_expr", "power"):
+            if (
+                node.children[0].type != "name"
+                or node.children[0].value != "__all__"
+                or len(node.children) != 3
+                or node.children[1].get_code() not in (".extend", ".append")
+            ):
+                continue
+        else:
+            continue
+        for leaf in _iter_leaves(node.children[-1]):
+            if leaf.type == "string":
+                try:
+                    names.add(ast.literal_eval(leaf.value))
+                except (ValueError, SyntaxError):
+                    pass
+    return names
+
+
+def _iter_module_statements(node):
+    """Yield the small statements of the module scope of node."""
+    for child in node.children:
+        if child.type == "simple_stmt":
+            yield from child.children
+        elif child.type not in SCOPE_TYPES and hasattr(child, "children"):
+            yield from _iter_module_statements(child)
+
+
+def _iter_leaves(node):
+    if hasattr(node, "children"):
+        for child in node.children:
+            yield from _iter_leaves(child)
+    else:
+        yield node
+
+
+def _get_undefined_names(scope: Scope) -> List[Dict[str, Any]]:
+    return [
+        _undefined_name(leaf)
+        for child in scope.iter_scopes()
+        for leaf in child.uses
+        if not child.resolves(leaf.value)
+    ]
+
+
+def _get_unused_imports(scope: Scope) -> List[Dict[str, Any]]:
+    used_names = _get_used_names(scope) | scope.fallback_names
+    return [
+        _unused_import(leaf) for leaf in scope.imports if leaf.value not in used_names
+    ]
+
+
+def _get_unused_variables(scope: Scope) -> List[Dict[str, Any]]:
+    # Nested functions can assign to the variable using nonlocal
+    used_names = _get_used_names(scope) | {
+        name for child in scope.iter_scopes() for name in child.declared
+    }
+    if "locals" in used_names:
+        return []
+    return [
+        _diagnostic(
+            leaf,
+            "F841",
+            "local variable '{0}' is assigned to but never used".format(leaf.value),
+        )
+        for leaf in scope.assignments
+        if leaf.value not in used_names
+        and leaf.value not in scope.declared
+        and leaf.value != "_"
+    ]
+
+
+def _undefined_name(leaf) -> Dict[str, Any]:
+    return _diagnostic(
+        leaf, "F821", "undefined name '{0}'".format(leaf.value), severity="error"
+    )
+
+
+def _unused_import(leaf) -> Dict[str, Any]:
+    return _diagnostic(leaf, "F401", "'{0}' imported but unused".format(leaf.value))
+
+
+def _diagnostic(leaf, code: str, message: str, severity="warning") -> Dict[str, Any]:
+    return {
+        "line": leaf.line,
+        "column": leaf.column,
+        "end_line": leaf.end_pos[0],
+        "end_column": leaf.end_pos[1],
+        "code": code,
+        "message": message,
+        "severity": severity,
+    }
+
+
+def _move(diagnostic: Dict[str, Any], lines: int) -> Dict[str, Any]:
+    return dict(
+        diagnostic,
+        line=diagnostic["line"] + lines,
+        end_line=diagnostic["end_line"] + lines,
+    )
@@ -0,0 +1,327 @@
+"""Search docstrings by their content.
+
+A DocSearchIndex builds an inverted index of the docstrings of the
+modules, classes and functions of a project and of the packages
+installed in its environment, in a background thread. Docstrings are
+read from the source with ast, nothing is imported.
+
+The index of every installed distribution is persisted to disk, keyed
+by its name and version, so it is only built once per version. The
+index of the project is built anew every time.
+
+"""
+
+import ast
+import heapq
+import importlib.metadata
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from jedi.api.environment import get_cached_default_environment
+
+from elpy.preparse import (
+    IGNORED_DIRECTORIES,
+    BackgroundWorker,
+    get_site_directories,
+    iter_project_files,
+)
+
+# Bumped whenever the format of the persisted indexes changes
+FORMAT_VERSION = 1
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9]+")
+STOP_WORDS = frozenset(
+    "an and are as at be by for from if in is it of on or that the this to "
+    "was with".split()
+)
+
+# Parameters of the BM25 ranking
+K1 = 1.2
+B = 0.75
+
+
+class Unit:
+    """The inverted index of the docstrings of some modules.
+
+    docs holds the symbol, kind, summary line and number of tokens of
+    every docstring. postings maps every token to a flat list of pairs
+    of a position in docs and the number of times the token occurs.
+
+    """
+
+    __slots__ = ("docs", "postings", "total_length")
+
+    def __init__(self, docs: List[List[Any]], postings: Dict[str, List[int]]) -> None:
+        self.docs = docs
+        self.postings = postings
+        self.total_length = sum(doc[3] for doc in docs)
+
+    @classmethod
+    def build(cls, files: Iterable[Tuple[str, str]]) -> "Unit":
+        """Index the files, given as pairs of path and module name."""
+        docs: List[List[Any]] = []
+        postings: Dict[str, List[int]] = {}
+        for path, module_name in files:
+            for symbol, kind, docstring in extract_docs(path, module_name):
+                counts: Dict[str, int] = {}
+                tokens = tokenize(docstring) + tokenize(symbol.rsplit(".", 1)[-1])
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, count in counts.items():
+                    postings.setdefault(token, []).extend((len(docs), count))
+                docs.append([symbol, kind, _get_summary(docstring), len(tokens)])
+        return cls(docs, postings)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"docs": self.docs, "postings": self.postings}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Unit":
+        return cls(data["docs"], data["postings"])
+
+
+class DocSearchIndex(BackgroundWorker):
+    """Index docstrings in the background and search them.
+
+    The project_root is indexed first, skipping ignored_directories
+    like the preparser does, followed by the distributions installed
+    in the site-packages of environment. Their indexes are persisted in
+    cache_directory, which defaults to a directory in the cache
+    directory of Jedi.
+
+    The environment is queried on the thread creating the index, not
+    the background thread.
+
+    """
+
+    def __init__(
+        self,
+        project_root: Optional[str],
+        environment: Any = None,
+        ignored_directories: Iterable[str] = (),
+        cache_directory: Optional[str] = None,
+        max_files: int = 2000,
+        idle_delay: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(idle_delay, clock)
+        self.project_root = project_root
+        self.site_directories = get_site_directories(
+            environment or get_cached_default_environment()
+        )
+        self.ignored_directories = IGNORED_DIRECTORIES | set(ignored_directories)
+        self.cache_directory = cache_directory
+        self.max_files = max_files
+        self._units: Dict[str, Unit] = {}
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        try:
+            if self.project_root:
+                files = iter_project_files(
+                    self.project_root, self.ignored_directories, self.max_files
+                )
+                for path in self._iter_when_idle(files):
+                    module_name = _get_module_name(self.project_root, path)
+                    self._add(
+                        "file:{0}".format(path), Unit.build([(path, module_name)])
+                    )
+            for distribution, site_directory in self._iter_when_idle(
+                self._iter_distributions()
+            ):
+                self._add_distribution(distribution, site_directory)
+        finally:
+            self.done.set()
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Return the limit best hits for query, best first.
+
+        Every hit has the name, kind and summary line of a docstring,
+        and its score.
+
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            units = list(self._units.values())
+        total_docs = sum(len(unit.docs) for unit in units)
+        if not terms or not total_docs:
+            return []
+        average_length = sum(unit.total_length for unit in units) / total_docs
+        scores: Dict[Tuple[int, int], float] = {}
+        for term in terms:
+            document_frequency = sum(
+                len(unit.postings.get(term, ())) // 2 for unit in units
+            )
+            if not document_frequency:
+                continue
+            idf = math.log(
+                1 + (total_docs - document_frequency + 0.5) / (document_frequency + 0.5)
+            )
+            for unit_number, unit in enumerate(units):
+                postings = unit.postings.get(term)
+                if not postings:
+                    continue
+                for i in range(0, len(postings), 2):
+                    doc, count = postings[i], postings[i + 1]
+                    length = unit.docs[doc][3]
+                    score = idf * (
+                        count
+                        * (K1 + 1)
+                        / (count + K1 * (1 - B + B * length / average_length))
+                    )
+                    key = (unit_number, doc)
+                    scores[key] = scores.get(key, 0.0) + score
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        hits = []
+        for (unit_number, doc), score in best:
+            symbol, kind, summary, _ = units[unit_number].docs[doc]
+            hits.append(
+                {"name": symbol, "kind": kind, "summary": summary, "score": score}
+            )
+        return hits
+
+    def _add(self, key: str, unit: Unit) -> None:
+        with self._lock:
+            self._units[key] = unit
+
+    def _add_distribution(self, distribution, site_directory: str) -> None:
+        name = distribution.metadata["Name"] or ""
+        version = distribution.version or ""
+        cache_path = os.path.join(
+            self._get_cache_directory(),
+            "{0}-{1}.json".format(_safe_name(name), _safe_name(version)),
+        )
+        unit = _load_unit(cache_path)
+        if unit is None:
+            files = _iter_distribution_files(distribution, site_directory)
+            unit = Unit.build(self._iter_when_idle(files))
+            if self._stopped:
+                # The unit is incomplete
+                return
+            _save_unit(cache_path, unit)
+        self._add("distribution:{0}".format(name), unit)
+
+    def _iter_when_idle(self, items: Iterable[Any]) -> Iterator[Any]:
+        """Yield items when the server is idle, until stopped."""
+        for item in items:
+            if not self._wait_until_idle():
+                return
+            yield item
+
+    def _iter_distributions(self) -> Iterator[Tuple[Any, str]]:
+        seen = set()
+        for site_directory in self.site_directories:
+            for distribution in importlib.metadata.distributions(path=[site_directory]):
+                name = distribution.metadata["Name"]
+                if name and name not in seen:
+                    seen.add(name)
+                    yield distribution, site_directory
+
+    def _get_cache_directory(self) -> str:
+        if self.cache_directory is None:
+            from jedi import settings
+
+            self.cache_directory = os.path.join(
+                settings.cache_directory, "elpy-docsearch-{0}".format(FORMAT_VERSION)
+            )
+        return self.cache_directory
+
+
+def extract_docs(path: str, module_name: str) -> List[Tuple[str, str, str]]:
+    """Return the docstrings of the module at path.
+
+    Returns the symbol, kind and docstring of the module and its public
+    classes, functions and methods that have a docstring.
+
+    """
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return []
+    docs = []
+
+    def visit(node, symbol, kind):
+        docstring = ast.get_docstring(node)
+        if docstring:
+            docs.append((symbol, kind, docstring))
+        for child in node.body:
+            if isinstance(child, ast.ClassDef):
+                child_kind = "class"
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                child_kind = "function"
+            else:
+                continue
+            if not child.name.startswith("_") and kind != "function":
+                visit(child, "{0}.{1}".format(symbol, child.name), child_kind)
+
+    visit(tree, module_name, "module")
+    return docs
+
+
+def tokenize(text: str) -> List[str]:
+    """Return the words of text to be indexed."""
+    return [
+        token
+        for token in TOKEN_RE.findall(text.lower().replace("_", " "))
+        if token not in STOP_WORDS
+    ]
+
+
+def _get_summary(docstring: str) -> str:
+    return docstring.strip().split("\n", 1)[0]
+
+
+def _get_module_name(root: str, path: str) -> str:
+    relative_path = os.path.splitext(os.path.relpath(path, root))[0]
+    parts = relative_path.split(os.sep)
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts.pop()
+    return ".".join(parts)
+
+
+def _iter_distribution_files(
+    distribution, site_directory: str
+) -> Iterator[Tuple[str, str]]:
+    for file in distribution.files or ():
+        parts = file.parts
+        if file.suffix != ".py" or ".." in parts or not parts[0].isidentifier():
+            continue
+        path = os.path.join(site_directory, *parts)
+        yield path, _get_module_name(site_directory, path)
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9.]+", "_", name)
+
+
+def _load_unit(path: str) -> Optional[Unit]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return Unit.from_json(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_unit(path: str, unit: Unit) -> None:
+    """Write unit to path atomically, ignoring errors."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    except OSError:
+        return
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(unit.to_json(), f)
+        os.replace(temporary_path, path)
+    except OSError:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
@@ -0,0 +1,92 @@
+"""Parsed documents, updated incrementally.
+
+The server keeps the parso tree of every file it was asked about. When
+a new version of the file comes in, parso's diff parser is used to
+reparse only the changed parts, so small edits to a large module cost
+work proportional to the edit.
+
+Jedi already does the same for the trees it uses itself. The trees
+kept here are used by elpy's own consumers like the outline.
+
+"""
+
+from collections import OrderedDict
+from typing import Any
+
+import parso
+from parso import split_lines
+from parso.python.diff import DiffParser
+
+
+class Document:
+    """A parsed version of a file.
+
+    version is increased every time the file is reparsed.
+
+    """
+
+    def __init__(self, filename: str, source: str, module: Any) -> None:
+        self.filename = filename
+        self.source = source
+        self.lines = split_lines(source, keepends=True)
+        self.module = module
+        self.version = 0
+
+    def update(self, source: str, module: Any) -> None:
+        self.source = source
+        self.lines = split_lines(source, keepends=True)
+        self.module = module
+        self.version += 1
+
+
+class DocumentStore:
+    """Keep the parsed documents of at most size files.
+
+    The least recently used documents are dropped first.
+
+    """
+
+    def __init__(self, size: int = 16) -> None:
+        self.size = size
+        self.grammar = parso.load_grammar()
+        self._documents: "OrderedDict[str, Document]" = OrderedDict()
+
+    def get_document(self, filename: str, source: str) -> Document:
+        """Return the document for filename, parsed from source."""
+        document = self._documents.get(filename)
+        if document is None:
+            document = Document(filename, source, self._parse(source))
+            self._documents[filename] = document
+            while len(self._documents) > self.size:
+                self._documents.popitem(last=False)
+        else:
+            self._documents.move_to_end(filename)
+            if document.source != source:
+                document.update(source, self._reparse(document, source))
+        return document
+
+    def is_open(self, filename: str) -> bool:
+        """Return whether there is a document for filename."""
+        return filename in self._documents
+
+    def close_document(self, filename: str) -> None:
+        """Forget about the document for filename."""
+        self._documents.pop(filename, None)
+
+    def _parse(self, source: str) -> Any:
+        return self.grammar.parse(source, error_recovery=True)
+
+    def _reparse(self, document: Document, source: str) -> Any:
+        new_lines = split_lines(source, keepends=True)
+        try:
+            return DiffParser(
+                self.grammar._pgen_grammar, self.grammar._tokenizer, document.module
+            ).update(old_lines=document.lines, new_lines=new_lines)
+        except Exception:
+            # The diff parser is not as battle-tested as the normal
+            # one. A full parse is slower, but always works.
+            return self._parse(source)
+
+    def get_module(self, filename: str, source: str) -> Any:
+        """Return the parso module for filename, parsed from source."""
+        return self.get_document(filename, source).module
@@ -0,0 +1,176 @@
+"""Caching of Jedi environments.
+
+Creating a Jedi environment starts the target interpreter to find out
+its version and sys.path. This module keeps that information on disk,
+keyed by the interpreter path and its modification time, and keeps a
+small pool of already created environments around so that switching
+between a handful of virtualenvs does not start new interpreters.
+
+"""
+
+import json
+import os
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import jedi
+from jedi.api.environment import Environment, _VersionInfo
+
+CACHE_FORMAT_VERSION = 1
+
+
+class CachedEnvironment(Environment):
+    """A Jedi environment restored from cached metadata.
+
+    The interpreter is only started once Jedi actually needs it for
+    inference, not when the environment is created.
+
+    """
+
+    def __init__(self, executable: str, info: Dict[str, Any]) -> None:
+        self._start_executable = executable
+        self._env_vars = None
+        self.executable = info["executable"]
+        self.path = info["prefix"]
+        self.version_info = _VersionInfo(*info["version_info"])
+        self._sys_path = list(info["sys_path"])
+
+    def get_sys_path(self):
+        return list(self._sys_path)
+
+
+class EnvironmentCache:
+    """Create Jedi environments, reusing earlier results if possible.
+
+    Environments are pooled in memory, with the least recently used
+    one being dropped once more than pool_size are kept. Their
+    metadata is additionally stored in cache_file, so that a restarted
+    server does not need to introspect the interpreter again.
+
+    """
+
+    def __init__(self, cache_file: Optional[str] = None, pool_size: int = 8) -> None:
+        self.cache_file = cache_file
+        self.pool_size = pool_size
+        self._pool: "OrderedDict[Tuple[str, float], Environment]" = OrderedDict()
+        self._metadata: Optional[Dict[str, Any]] = None
+
+    def get_environment(self, path: str) -> Environment:
+        """Return the environment for the virtualenv or interpreter at path."""
+        executable = get_executable_path(path)
+        mtime = _get_mtime(executable)
+        if mtime is None:
+            # Nothing we could use as a cache key, let Jedi deal with it.
+            return jedi.create_environment(path, safe=False)
+        key = (executable, mtime)
+        environment = self._pool.get(key)
+        if environment is None:
+            environment = self._load_environment(path, executable, mtime)
+            self._pool[key] = environment
+            while len(self._pool) > self.pool_size:
+                self._pool.popitem(last=False)
+        else:
+            self._pool.move_to_end(key)
+        return environment
+
+    def _load_environment(
+        self, path: str, executable: str, mtime: float
+    ) -> Environment:
+        metadata = self._get_metadata()
+        info = metadata.get(executable)
+        if info is not None and _is_fresh(info, mtime):
+            return CachedEnvironment(executable, info)
+        environment = jedi.create_environment(path, safe=False)
+        sys_path = environment.get_sys_path()
+        metadata[executable] = {
+            "mtime": mtime,
+            "executable": environment.executable,
+            "prefix": environment.path,
+            "version_info": list(environment.version_info),
+            "sys_path": sys_path,
+            "sys_path_mtimes": _get_mtimes(sys_path),
+        }
+        self._save_metadata()
+        return environment
+
+    def _get_metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = {}
+            cache_file = self._get_cache_file()
+            try:
+                with open(cache_file, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+            if (
+                isinstance(data, dict)
+                and data.get("version") == CACHE_FORMAT_VERSION
+                and isinstance(data.get("environments"), dict)
+            ):
+                self._metadata = data["environments"]
+        return self._metadata
+
+    def _save_metadata(self) -> None:
+        cache_file = self._get_cache_file()
+        temporary_file = "{0}.{1}.tmp".format(cache_file, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(temporary_file, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": CACHE_FORMAT_VERSION, "environments": self._metadata},
+                    f,
+                )
+            os.replace(temporary_file, cache_file)
+        except OSError:
+            # The cache is an optimization only.
+            pass
+
+    def _get_cache_file(self) -> str:
+        if self.cache_file is None:
+            self.cache_file = os.path.join(get_cache_directory(), "environments.json")
+        return self.cache_file
+
+
+def get_executable_path(path: str) -> str:
+    """Return the interpreter Jedi would use for the given path.
+
+    path is either an interpreter or a virtualenv directory.
+
+    """
+    if os.path.isfile(path):
+        return path
+    if os.name == "nt":
+        return os.path.join(path, "Scripts", "python.exe")
+    return os.path.join(path, "bin", "python")
+
+
+def get_cache_directory() -> str:
+    """Return the directory elpy stores its caches in."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "elpy")
+
+
+def _is_fresh(info: Dict[str, Any], mtime: float) -> bool:
+    # Installing packages can change sys.path through .pth files, so
+    # the site directories are checked as well as the interpreter.
+    if info.get("mtime") != mtime:
+        return False
+    return info.get("sys_path_mtimes") == _get_mtimes(info.get("sys_path", []))
+
+
+def _get_mtimes(paths) -> Dict[str, Optional[float]]:
+    return {path: _get_mtime(path) for path in paths}
+
+
+def _get_mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+environment_cache = EnvironmentCache()
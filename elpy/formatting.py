@@ -0,0 +1,360 @@
+"""Helpers shared by the code formatters.
+
+The formatters themselves only know how to format a complete piece of
+code. The functions here allow applying them to a range of lines, and
+turn their results into edits, which are lists of offset, length and
+replacement text like the edits of refactorings.
+
+"""
+
+import difflib
+import functools
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import parso
+from parso import split_lines
+
+from elpy.rpc import Fault
+
+# Above this number of changed lines, get_edits does not diff them
+MAX_DIFF_LINES = 20000
+
+
+class FormattingCache:
+    """Remember what formatters made of which sources.
+
+    Entries are keyed by the formatter, a key for its resolved
+    configuration, and the hash of the source. They store the formatted
+    source, or None if formatting did not change anything. At most size
+    entries are kept, the least recently used ones are dropped first.
+
+    """
+
+    def __init__(self, size: int = 64) -> None:
+        self.size = size
+        self._results: "OrderedDict[Tuple[str, Any, str], Optional[str]]" = (
+            OrderedDict()
+        )
+
+    def fix_code(
+        self,
+        fix_code: Callable[[str], str],
+        formatter: str,
+        config_key: Any,
+        source: str,
+    ) -> str:
+        """Return source formatted by fix_code, using cached results."""
+        key = (formatter, config_key, _hash(source))
+        if key in self._results:
+            self._results.move_to_end(key)
+            formatted = self._results[key]
+            return source if formatted is None else formatted
+        formatted = fix_code(source)
+        if formatted == source:
+            self._add(key, None)
+        else:
+            self._add(key, formatted)
+            # Formatters are expected to leave their own output alone,
+            # which makes the next format on save cheap.
+            self._add((formatter, config_key, _hash(formatted)), None)
+        return formatted
+
+    def _add(self, key: Tuple[str, Any, str], formatted: Optional[str]) -> None:
+        self._results[key] = formatted
+        self._results.move_to_end(key)
+        while len(self._results) > self.size:
+            self._results.popitem(last=False)
+
+
+class FileFormatter:
+    """Format files in place, in parallel.
+
+    The files are formatted by a pool of worker processes. The state
+    of every file formatted is remembered, so files that did not change
+    since, by modification time or by content, are skipped next time.
+    Calls are handled one at a time, as they share the pool and state.
+
+    """
+
+    def __init__(self, processes: Optional[int] = None) -> None:
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # path -> (formatter, config key, mtime, hash) of formatted files
+        self._formatted: Dict[str, Tuple[str, Any, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def format_files(
+        self,
+        paths: Iterable[str],
+        formatter: str,
+        get_config_key: Callable[[str, str], Any],
+        callback: Callable[[Dict[str, Any]], None],
+    ) -> Dict[str, int]:
+        """Format paths with formatter.
+
+        get_config_key(formatter, directory) returns a key for the
+        configuration that applies to a directory. callback is called
+        with a dict for every file once it is done, with the keys
+        filename, status ("formatted", "unchanged" or "error") and, for
+        errors, message. Returns the number of files per status.
+
+        Errors, like a formatter that is not installed, are reported
+        for the files they affect, they are not raised.
+
+        """
+        counts = {"formatted": 0, "unchanged": 0, "error": 0}
+
+        def report(path, status, message=None):
+            counts[status] += 1
+            result = {"filename": path, "status": status}
+            if message is not None:
+                result["message"] = message
+            callback(result)
+
+        with self._lock:
+            futures = {}
+            for path in paths:
+                path = os.path.abspath(path)
+                future = None
+                try:
+                    config_key = get_config_key(formatter, os.path.dirname(path))
+                    if not self._is_formatted(path, formatter, config_key):
+                        future = self._get_executor().submit(
+                            format_file, formatter, path
+                        )
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        self._executor = None
+                    report(path, "error", _get_message(e))
+                    continue
+                if future is None:
+                    report(path, "unchanged")
+                else:
+                    futures[future] = (path, config_key)
+            self._collect(futures, formatter, report)
+        return counts
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _collect(self, futures, formatter: str, report) -> None:
+        """Report the results of futures as they are done."""
+        for future in as_completed(futures):
+            path, config_key = futures[future]
+            try:
+                status, message, content_hash = future.result()
+            except BrokenProcessPool as e:
+                # Start over with a new pool next time
+                self._executor = None
+                status, message, content_hash = "error", str(e), None
+            except Exception as e:
+                status, message, content_hash = "error", _get_message(e), None
+            if content_hash is not None:
+                self._remember(path, formatter, config_key, content_hash)
+            report(path, status, message)
+
+    def _is_formatted(self, path: str, formatter: str, config_key: Any) -> bool:
+        formatted = self._formatted.get(path)
+        if formatted is None or formatted[:2] != (formatter, config_key):
+            return False
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == formatted[2]:
+            return True
+        # Touched, but maybe not changed
+        content_hash = _hash_file(path)
+        if content_hash != formatted[3]:
+            return False
+        self._remember(path, formatter, config_key, content_hash)
+        return True
+
+    def _remember(
+        self, path: str, formatter: str, config_key: Any, content_hash: str
+    ) -> None:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        self._formatted[path] = (formatter, config_key, mtime, content_hash)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # The server runs threads, which do not mix well with fork.
+            self._executor = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+
+def format_file(formatter: str, path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Format the file at path in place.
+
+    This runs in the worker processes. Returns the status, an error
+    message and the hash of the formatted contents.
+
+    """
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            source = f.read()
+        formatted = _get_fix_code(formatter, os.path.dirname(path))(source)
+        if formatted == source:
+            return "unchanged", None, _hash(source)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(formatted)
+        return "formatted", None, _hash(formatted)
+    except Fault as fault:
+        return "error", fault.message, None
+    except (OSError, UnicodeDecodeError) as e:
+        return "error", str(e), None
+
+
+# The black formatter of worker processes, which caches configurations
+_black_formatter = None
+
+
+def _get_fix_code(formatter: str, directory: str) -> Callable[[str], str]:
+    global _black_formatter
+    if formatter == "black":
+        from elpy import blackutil
+
+        if _black_formatter is None:
+            _black_formatter = blackutil.BlackCodeFormatter()
+        return functools.partial(
+            _black_formatter.format_code, directory=Path(directory)
+        )
+    elif formatter == "yapf":
+        from elpy import yapfutil
+
+        return functools.partial(yapfutil.fix_code, directory=directory)
+    else:
+        from elpy import auto_pep8
+
+        return functools.partial(auto_pep8.fix_code, directory=directory)
+
+
+def _get_message(error: Exception) -> str:
+    return error.message if isinstance(error, Fault) else str(error)
+
+
+def _hash_file(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            return _hash(f.read())
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _hash(source: str) -> str:
+    return hashlib.sha1(source.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def fix_code_range(
+    fix_code: Callable[[str], str], source: str, start_line: int, end_line: int
+) -> List[list]:
+    """Format the top-level statements covering the given lines.
+
+    fix_code formats a complete piece of code. Lines start at 1 and
+    end_line is included. Returns the edits to apply to source, which
+    are empty if nothing changed.
+
+    """
+    statement_lines = get_statement_lines(source, start_line, end_line)
+    if statement_lines is None:
+        return []
+    first_line, last_line = statement_lines
+    lines = split_lines(source, keepends=True)
+    offset = sum(len(line) for line in lines[: first_line - 1])
+    code = "".join(lines[first_line - 1 : last_line])
+    return get_edits(code, fix_code(code), offset)
+
+
+def get_statement_lines(
+    source: str, start_line: int, end_line: int
+) -> Optional[Tuple[int, int]]:
+    """Return the lines of the top-level statements covering the lines.
+
+    Returns the first and last line of those statements, or None if
+    there are no statements within the lines.
+
+    """
+    module = parso.parse(source)
+    first_line = last_line = None
+    for node in module.children:
+        if node.type == "endmarker":
+            continue
+        node_start = node.start_pos[0]
+        node_end = node.end_pos[0] - 1 if node.end_pos[1] == 0 else node.end_pos[0]
+        if node_end < start_line:
+            continue
+        if node_start > end_line:
+            break
+        if first_line is None:
+            first_line = node_start
+        last_line = node_end
+    if first_line is None or last_line is None:
+        return None
+    return first_line, last_line
+
+
+def get_edits(old: str, new: str, offset: int = 0) -> List[list]:
+    """Return the edits turning old into new.
+
+    Every edit replaces a range of whole lines, and lines that did not
+    change are left out. offset is the offset of old within the text
+    the edits are meant for.
+
+    Lines old and new start and end with are skipped before diffing
+    the rest. If the rest is longer than MAX_DIFF_LINES, it is
+    replaced by a single edit.
+
+    """
+    if old == new:
+        return []
+    old_lines = split_lines(old, keepends=True)
+    new_lines = split_lines(new, keepends=True)
+    prefix = 0
+    while (
+        prefix < min(len(old_lines), len(new_lines))
+        and old_lines[prefix] == new_lines[prefix]
+    ):
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < min(len(old_lines), len(new_lines)) - prefix
+        and old_lines[-1 - suffix] == new_lines[-1 - suffix]
+    ):
+        suffix += 1
+    start = offset + sum(len(line) for line in old_lines[:prefix])
+    old_lines = old_lines[prefix : len(old_lines) - suffix]
+    new_lines = new_lines[prefix : len(new_lines) - suffix]
+    if max(len(old_lines), len(new_lines)) > MAX_DIFF_LINES:
+        old_changed = "".join(old_lines)
+        return [[start, len(old_changed), "".join(new_lines)]]
+    line_offsets = [start]
+    for line in old_lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+    # Lines that are very common, like empty lines, are not used to
+    # match the texts up, which keeps this from going quadratic.
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    return [
+        [
+            line_offsets[old_start],
+            line_offsets[old_end] - line_offsets[old_start],
+            "".join(new_lines[new_start:new_end]),
+        ]
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes()
+        if tag != "equal"
+    ]
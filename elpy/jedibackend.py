@@ -9,12 +9,14 @@ https://github.com/davidhalter/jedi
 import re
 import sys
 import traceback
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import jedi
 from jedi import debug
+from parso import split_lines
 
-from elpy import rpc
+from elpy import environments, rpc
+from elpy.refactorings import RefactoringStore
 from elpy.rpc import Fault
 from elpy.use_cases import (
     get_completion_docstring_use_case,
@@ -22,7 +24,14 @@ from elpy.use_cases import (
     get_completions_use_case,
     refactor_rename_use_case,
 )
-from elpy.use_cases.interface import Location, Refactoring
+from elpy.use_cases.interface import (
+    ChangedFile,
+    FileEdits,
+    Location,
+    Refactoring,
+    StreamedRefactoring,
+    TextEdit,
+)
 
 
 class JediBackend:
@@ -40,10 +49,11 @@ class JediBackend:
     ) -> None:
         self.environment = None
         if environment_binaries_path is not None:
-            self.environment = jedi.create_environment(
-                environment_binaries_path, safe=False
+            self.environment = environments.environment_cache.get_environment(
+                environment_binaries_path
             )
         self.completions: Dict[Any, Any] = {}
+        self.refactorings = RefactoringStore()
         sys.path.append(project_root)
 
     def rpc_get_completions(
@@ -323,7 +333,12 @@ class JediBackend:
         return result
 
     def rpc_get_rename_diff(
-        self, filename: str, source: str, offset: int, new_name: str
+        self,
+        filename: str,
+        source: str,
+        offset: int,
+        new_name: str,
+        as_edits: bool = False,
     ) -> Dict[str, Any]:
         """Get the diff resulting from renaming the thing at point"""
         output_port = RefactorRenameOutputPort()
@@ -337,12 +352,54 @@ class JediBackend:
                 offset=offset,
                 new_name=new_name,
                 file_name=filename,
+                as_edits=as_edits,
+            )
+        )
+        return output_port.render_response()
+
+    def rpc_stream_rename_diff(
+        self,
+        filename: str,
+        source: str,
+        offset: int,
+        new_name: str,
+        notify: Callable[[Dict[str, Any]], None],
+        as_edits: bool = False,
+    ) -> Dict[str, Any]:
+        """Rename the thing at point, passing the changes file by file.
+
+        notify is called with the diff or edits of every changed file
+        as soon as they are rendered. The returned response only
+        summarizes the refactoring.
+
+        """
+        output_port = RefactorRenameOutputPort(notify=notify)
+        use_case = refactor_rename_use_case.RefactorRenameUseCase(
+            presenter=output_port,
+            refactorer=self,
+        )
+        use_case.stream_rename_diff(
+            request=refactor_rename_use_case.Request(
+                source=source,
+                offset=offset,
+                new_name=new_name,
+                file_name=filename,
+                as_edits=as_edits,
             )
         )
         return output_port.render_response()
 
     def rpc_get_extract_variable_diff(
-        self, filename, source, offset, new_name, line_beg, line_end, col_beg, col_end
+        self,
+        filename,
+        source,
+        offset,
+        new_name,
+        line_beg,
+        line_end,
+        col_beg,
+        col_end,
+        as_edits=False,
     ):
         """Get the diff resulting from extracting the selected code"""
         if not hasattr(jedi.Script, "extract_variable"):  # pragma: no cover
@@ -364,15 +421,19 @@ class JediBackend:
         if ren is None:
             return {"success": False}
         else:
-            return {
-                "success": True,
-                "project_path": ren._inference_state.project._path,
-                "diff": ren.get_diff(),
-                "changed_files": list(ren.get_changed_files().keys()),
-            }
+            return render_refactoring(ren, as_edits, *self._store_refactoring(ren))
 
     def rpc_get_extract_function_diff(
-        self, filename, source, offset, new_name, line_beg, line_end, col_beg, col_end
+        self,
+        filename,
+        source,
+        offset,
+        new_name,
+        line_beg,
+        line_end,
+        col_beg,
+        col_end,
+        as_edits=False,
     ):
         """Get the diff resulting from extracting the selected code"""
         if not hasattr(jedi.Script, "extract_function"):  # pragma: no cover
@@ -394,14 +455,9 @@ class JediBackend:
         if ren is None:
             return {"success": False}
         else:
-            return {
-                "success": True,
-                "project_path": ren._inference_state.project._path,
-                "diff": ren.get_diff(),
-                "changed_files": list(ren.get_changed_files().keys()),
-            }
+            return render_refactoring(ren, as_edits, *self._store_refactoring(ren))
 
-    def rpc_get_inline_diff(self, filename, source, offset):
+    def rpc_get_inline_diff(self, filename, source, offset, as_edits=False):
         """Get the diff resulting from inlining the selected variable"""
         if not hasattr(jedi.Script, "inline"):  # pragma: no cover
             return {"success": "Not available"}
@@ -417,12 +473,7 @@ class JediBackend:
         if ren is None:
             return {"success": False}
         else:
-            return {
-                "success": True,
-                "project_path": ren._inference_state.project._path,
-                "diff": ren.get_diff(),
-                "changed_files": list(ren.get_changed_files().keys()),
-            }
+            return render_refactoring(ren, as_edits, *self._store_refactoring(ren))
 
     def rename_identifier(
         self,
@@ -430,9 +481,143 @@ class JediBackend:
         offset: int,
         file_name: str,
         new_identifier_name: str,
+        as_edits: bool = False,
     ) -> Optional[Refactoring]:
+        ren = self._rename(source, offset, file_name, new_identifier_name)
+        if ren is None:
+            return None
+        handle, file_edits = self._store_refactoring(ren)
+        if as_edits:
+            return Refactoring(
+                changed_files=ren.get_changed_files().keys(),
+                diff=None,
+                project_path=ren._inference_state.project._path,
+                file_edits=file_edits,
+                renames=get_renames(ren),
+                handle=handle,
+            )
+        return Refactoring(
+            changed_files=ren.get_changed_files().keys(),
+            diff=ren.get_diff(),
+            project_path=ren._inference_state.project._path,
+            handle=handle,
+        )
+
+    def rename_identifier_by_file(
+        self,
+        source: str,
+        offset: int,
+        file_name: str,
+        new_identifier_name: str,
+        as_edits: bool = False,
+    ) -> Optional[StreamedRefactoring]:
+        ren = self._rename(source, offset, file_name, new_identifier_name)
+        if ren is None:
+            return None
+        renames = get_renames(ren)
+        handle = self.refactorings.add(ren._inference_state.project._path, renames)
+        return StreamedRefactoring(
+            changed_files=self._iter_changed_files(ren, as_edits, handle),
+            project_path=ren._inference_state.project._path,
+            renames=renames,
+            handle=handle,
+        )
+
+    def rpc_refactoring_preview(
+        self,
+        handle: str,
+        filename: Optional[str] = None,
+        sources: Optional[Dict[str, str]] = None,
+    ):
+        """Return the diff of a stored refactoring.
+
+        If filename is given, only return the diff for that file.
+        sources is used like for rpc_refactoring_apply.
+
+        """
+        return self.refactorings.get_diff(handle, sources or {}, filename)
+
+    def rpc_refactoring_apply(
+        self, handle: str, sources: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Return the edits of a stored refactoring and forget about it.
+
+        sources maps file names to their current contents, for files
+        with unsaved changes. Other files are read from disk. If any
+        file changed since the refactoring was computed, a Fault
+        listing the stale files is raised instead.
+
+        """
+        stale_files = self.refactorings.get_stale_files(handle, sources or {})
+        if stale_files:
+            raise Fault(
+                "Refactoring is out of date, files changed",
+                code=400,
+                data={"stale_files": stale_files},
+            )
+        stored = self.refactorings.get(handle)
+        self.refactorings.remove(handle)
+        return {
+            "success": True,
+            "project_path": stored.project_path,
+            "changed_files": list(stored.files),
+            "edits": [
+                {"filename": file_name, "edits": stored_file.edits}
+                for file_name, stored_file in stored.files.items()
+            ],
+            "renames": stored.renames,
+        }
+
+    def _store_refactoring(self, ren) -> Tuple[str, List[FileEdits]]:
+        """Store ren, returning its handle and its edits."""
+        handle = self.refactorings.add(
+            ren._inference_state.project._path, get_renames(ren)
+        )
+        file_edits = [
+            FileEdits(
+                file_name=str(path),
+                edits=self._store_file(handle, path, changed_file),
+            )
+            for path, changed_file in ren.get_changed_files().items()
+        ]
+        self.refactorings.finish(handle)
+        return handle, file_edits
+
+    def _iter_changed_files(
+        self, ren, as_edits: bool, handle: str
+    ) -> Iterator[ChangedFile]:
+        """Render the changes of ren one file at a time, storing them.
+
+        Each file is only stored as it is rendered, so the sources of
+        the files are not all needed at once.
+
+        """
+        for path, changed_file in ren.get_changed_files().items():
+            edits = self._store_file(handle, path, changed_file)
+            if as_edits:
+                yield ChangedFile(file_name=str(path), edits=edits)
+            else:
+                yield ChangedFile(file_name=str(path), diff=changed_file.get_diff())
+        self.refactorings.finish(handle)
+
+    def _store_file(self, handle: str, path, changed_file) -> List[TextEdit]:
+        source = changed_file._module_node.get_code()
+        edits = get_text_edits(
+            changed_file._module_node, changed_file._node_to_str_map, source
+        )
+        new_path = changed_file._to_path
+        self.refactorings.add_file(
+            handle,
+            str(path),
+            source,
+            [[edit.offset, edit.length, edit.replacement] for edit in edits],
+            None if new_path is None or new_path == path else str(new_path),
+        )
+        return edits
+
+    def _rename(self, source, offset, file_name, new_identifier_name):
         line, column = pos_to_linecol(source, offset)
-        ren = run_with_debug(
+        return run_with_debug(
             jedi,
             "rename",
             code=source,
@@ -444,13 +629,6 @@ class JediBackend:
                 "new_name": new_identifier_name,
             },
         )
-        if ren is None:
-            return None
-        return Refactoring(
-            changed_files=ren.get_changed_files().keys(),
-            diff=ren.get_diff(),
-            project_path=ren._inference_state.project._path,
-        )
 
     def can_do_renaming(self) -> bool:
         return hasattr(jedi.Script, "rename")
@@ -468,7 +646,7 @@ class JediBackend:
             fun_kwargs={"line": line, "column": column},
         )
         self.completions = dict((proposal.name, proposal) for proposal in proposals)
-        return [
+        return (
             get_completions_use_case.Completion(
                 name=proposal.name.rstrip("="),
                 suffix=proposal.complete.rstrip("="),
@@ -476,7 +654,7 @@ class JediBackend:
                 description=proposal.description,
             )
             for proposal in proposals
-        ]
+        )
 
     def get_completion_docstring(self, name: str) -> Optional[str]:
         completion = self.completions.get(name)
@@ -534,6 +712,114 @@ def linecol_to_pos(text, line, col):
     return offset
 
 
+def render_refactoring(
+    ren,
+    as_edits: bool = False,
+    handle: Optional[str] = None,
+    file_edits: Optional[List[FileEdits]] = None,
+) -> Dict[str, Any]:
+    """Return the RPC response for a successful Jedi refactoring.
+
+    By default, the changes are described by a unified diff. If
+    as_edits is true, the diff is not built at all, and the changes
+    are returned as a list of per-file edits instead. handle is the
+    handle the refactoring is stored under, if any. file_edits are
+    the edits of ren, if they were computed already.
+
+    """
+    response = {
+        "success": True,
+        "project_path": ren._inference_state.project._path,
+        "changed_files": list(ren.get_changed_files().keys()),
+    }
+    if handle is not None:
+        response["handle"] = handle
+    if as_edits:
+        if file_edits is None:
+            file_edits = get_file_edits(ren)
+        response["edits"] = render_file_edits(file_edits)
+        response["renames"] = get_renames(ren)
+    else:
+        response["diff"] = ren.get_diff()
+    return response
+
+
+def render_file_edits(file_edits: List[FileEdits]) -> List[Dict[str, Any]]:
+    """Return file edits in their compact RPC representation.
+
+    Every edit is a list of offset, length and replacement text.
+    Offsets refer to the file contents before any of the edits are
+    applied.
+
+    """
+    return [
+        {
+            "filename": file_edit.file_name,
+            "edits": [
+                [edit.offset, edit.length, edit.replacement] for edit in file_edit.edits
+            ],
+        }
+        for file_edit in file_edits
+    ]
+
+
+def get_file_edits(ren) -> List[FileEdits]:
+    """Return the text edits of a Jedi refactoring, per changed file."""
+    return [
+        FileEdits(
+            file_name=str(path),
+            edits=get_text_edits(
+                changed_file._module_node, changed_file._node_to_str_map
+            ),
+        )
+        for path, changed_file in ren.get_changed_files().items()
+    ]
+
+
+def get_renames(ren) -> List[Tuple[str, str]]:
+    """Return the file renames of a Jedi refactoring."""
+    return [(str(from_), str(to)) for from_, to in ren.get_renames()]
+
+
+def get_text_edits(
+    module_node, node_to_str_map, code: Optional[str] = None
+) -> List[TextEdit]:
+    """Return the edits replacing nodes of module_node.
+
+    node_to_str_map maps parso nodes to their new code, prefix
+    included, which is what Jedi refactorings are made of. Nodes
+    within other replaced nodes are ignored, just like parso does
+    when rendering the new code. code is the code of module_node, if
+    known already.
+
+    """
+    if code is None:
+        code = module_node.get_code()
+    line_offsets = [0]
+    for line in split_lines(code, keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    def to_offset(position):
+        line, column = position
+        return line_offsets[line - 1] + column
+
+    replacements = sorted(
+        (
+            (to_offset(node.get_start_pos_of_prefix()), to_offset(node.end_pos), code)
+            for node, code in node_to_str_map.items()
+        ),
+        key=lambda replacement: (replacement[0], -replacement[1]),
+    )
+    edits: List[TextEdit] = []
+    last_end = 0
+    for start, end, code in replacements:
+        if edits and start < last_end:
+            continue
+        edits.append(TextEdit(offset=start, length=end - start, replacement=code))
+        last_end = end
+    return edits
+
+
 def run_with_debug(jedi, name, fun_kwargs={}, *args, re_raise=(), **kwargs):
     try:
         script = jedi.Script(*args, **kwargs)
@@ -583,12 +869,27 @@ def run_with_debug(jedi, name, fun_kwargs={}, *args, re_raise=(), **kwargs):
 
 
 class RefactorRenameOutputPort:
-    def __init__(self) -> None:
+    def __init__(
+        self, notify: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> None:
         self.response: Optional[refactor_rename_use_case.Response] = None
+        self.notify = notify
 
     def present_refactoring(self, response: refactor_rename_use_case.Response) -> None:
         self.response = response
 
+    def present_changed_file(self, changed_file: ChangedFile) -> None:
+        assert self.notify
+        notification: Dict[str, Any] = {"filename": changed_file.file_name}
+        if changed_file.diff is not None:
+            notification["diff"] = changed_file.diff
+        if changed_file.edits is not None:
+            notification["edits"] = [
+                [edit.offset, edit.length, edit.replacement]
+                for edit in changed_file.edits
+            ]
+        self.notify(notification)
+
     def render_response(self) -> Dict[str, Any]:
         assert self.response
         changes = self.response.changes
@@ -597,12 +898,20 @@ class RefactorRenameOutputPort:
         elif changes == refactor_rename_use_case.FailureReason.NO_RESULT:
             return {"success": False}
         elif isinstance(changes, refactor_rename_use_case.Changes):
-            return {
+            response = {
                 "success": True,
                 "project_path": changes.project_path,
-                "diff": changes.diff,
                 "changed_files": changes.changed_files,
             }
+            if changes.diff is not None:
+                response["diff"] = changes.diff
+            if changes.file_edits is not None:
+                response["edits"] = render_file_edits(changes.file_edits)
+            if changes.renames is not None:
+                response["renames"] = changes.renames
+            if changes.handle is not None:
+                response["handle"] = changes.handle
+            return response
         else:
             raise Exception()
 
@@ -0,0 +1,48 @@
+"""Modules that are imported on first use.
+
+Importing Jedi and the formatter libraries takes a noticeable amount
+of time. The server refers to them through LazyModule instances, so
+that it can greet the client before any of them are loaded.
+
+"""
+
+import importlib
+import time
+from typing import Any, Dict
+
+# Seconds spent importing each lazily imported module.
+import_times: Dict[str, float] = {}
+
+
+class LazyModule:
+    """A module that is imported when one of its attributes is used.
+
+    The instance is false if the module can not be imported.
+
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: Any = None
+
+    def load(self) -> Any:
+        """Import the module if that did not happen yet, and return it."""
+        if self._module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            import_times.setdefault(self._name, time.perf_counter() - start)
+            self._module = module
+        return self._module
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
+
+    def __bool__(self) -> bool:
+        try:
+            self.load()
+        except ImportError:
+            return False
+        return True
+
+    def __repr__(self) -> str:
+        return "<LazyModule {0}>".format(self._name)
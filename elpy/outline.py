@@ -0,0 +1,132 @@
+"""Document outlines built from a parso parse.
+
+An outline is a tree of the classes, functions and assignments in a
+module, each with the range of text it covers.
+
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from parso import split_lines
+
+from elpy.documents import DocumentStore
+
+# Compound statements whose bodies still belong to the enclosing scope,
+# like definitions within "if TYPE_CHECKING:".
+BLOCK_TYPES = (
+    "if_stmt",
+    "try_stmt",
+    "with_stmt",
+    "for_stmt",
+    "while_stmt",
+    "async_stmt",
+    "suite",
+    "simple_stmt",
+)
+
+
+class OutlineCache:
+    """Cache outlines per file and source hash.
+
+    At most size outlines are kept, the least recently used ones are
+    dropped first. Modules are parsed using documents.
+
+    """
+
+    def __init__(
+        self, documents: Optional[DocumentStore] = None, size: int = 32
+    ) -> None:
+        self.size = size
+        self._outlines: "OrderedDict[Tuple[str, str], List[Dict[str, Any]]]" = (
+            OrderedDict()
+        )
+        self.documents = documents if documents is not None else DocumentStore()
+
+    def get_outline(self, filename: str, source: str) -> List[Dict[str, Any]]:
+        key = (
+            filename,
+            hashlib.sha1(source.encode("utf-8", "surrogatepass")).hexdigest(),
+        )
+        outline = self._outlines.get(key)
+        if outline is None:
+            module = self.documents.get_module(filename, source)
+            outline = get_outline(module, source)
+            self._outlines[key] = outline
+            while len(self._outlines) > self.size:
+                self._outlines.popitem(last=False)
+        else:
+            self._outlines.move_to_end(key)
+        return outline
+
+
+def get_outline(module, source: str) -> List[Dict[str, Any]]:
+    """Return the outline of a parso module parsed from source.
+
+    Every entry is a dict with the name and kind ("class", "function"
+    or "assignment") of the definition, its line, the start and end
+    offsets of the text it covers, and the entries defined within.
+    Assignments are only listed for modules and classes, not for
+    functions.
+
+    """
+    line_offsets = [0]
+    for line in split_lines(source, keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    def to_offset(position):
+        line, column = position
+        return line_offsets[line - 1] + column
+
+    return _get_entries(module, to_offset, with_assignments=True)
+
+
+def _get_entries(node, to_offset, with_assignments: bool) -> List[Dict[str, Any]]:
+    entries = []
+    for child in node.children:
+        definition = _get_definition(child)
+        if definition is not None:
+            is_class = definition.type == "classdef"
+            entries.append(
+                {
+                    "name": definition.name.value,
+                    "kind": "class" if is_class else "function",
+                    "line": definition.start_pos[0],
+                    "start": to_offset(child.start_pos),
+                    "end": to_offset(child.end_pos),
+                    "children": _get_entries(
+                        definition.children[-1], to_offset, with_assignments=is_class
+                    ),
+                }
+            )
+        elif child.type == "expr_stmt":
+            if with_assignments:
+                entries.extend(_get_assignments(child, to_offset))
+        elif child.type in BLOCK_TYPES:
+            entries.extend(_get_entries(child, to_offset, with_assignments))
+    return entries
+
+
+def _get_definition(node) -> Optional[Any]:
+    if node.type == "decorated":
+        node = node.children[-1]
+    if node.type in ("async_funcdef", "async_stmt"):
+        node = node.children[-1]
+    if node.type in ("classdef", "funcdef"):
+        return node
+    return None
+
+
+def _get_assignments(expr_stmt, to_offset) -> List[Dict[str, Any]]:
+    return [
+        {
+            "name": name.value,
+            "kind": "assignment",
+            "line": name.start_pos[0],
+            "start": to_offset(expr_stmt.start_pos),
+            "end": to_offset(expr_stmt.end_pos),
+            "children": [],
+        }
+        for name in expr_stmt.get_defined_names()
+    ]
@@ -0,0 +1,265 @@
+"""Parse a project in the background.
+
+Jedi parses modules lazily, so the first completions in every module
+of a project are slow. A Preparser walks the project and the
+third-party packages it imports most, and parses them into the parso
+cache Jedi uses, in a background thread.
+
+Interactive requests take precedence. The server pauses the preparser
+while it handles a request, and it only continues once the server was
+idle for a moment.
+
+"""
+
+import abc
+import collections
+import os
+import threading
+import time
+from typing import Any, Callable, Counter, Iterable, Iterator, List, Optional, Set
+
+import parso
+from jedi import settings
+from jedi.api.environment import get_cached_default_environment
+
+IGNORED_DIRECTORIES = {
+    "__pycache__",
+    "build",
+    "dist",
+    "env",
+    "node_modules",
+    "venv",
+}
+
+
+class BackgroundWorker(abc.ABC):
+    """Run a task in a background thread that yields to requests.
+
+    Subclasses implement run, which sets done once finished, and call
+    _wait_until_idle between steps of their work, which returns False
+    once they should stop.
+
+    """
+
+    def __init__(
+        self, idle_delay: float = 0.5, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.idle_delay = idle_delay
+        self.clock = clock
+        self.done = threading.Event()
+        self._condition = threading.Condition()
+        self._active_requests = 0
+        self._resume_at = 0.0
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def pause(self) -> None:
+        """Hold off working until resume is called as often."""
+        with self._condition:
+            self._active_requests += 1
+
+    def resume(self) -> None:
+        """Continue working once idle_delay seconds passed without a pause."""
+        with self._condition:
+            self._active_requests -= 1
+            self._resume_at = self.clock() + self.idle_delay
+            self._condition.notify_all()
+
+    @abc.abstractmethod
+    def run(self) -> None:
+        """Do the work, in the background thread."""
+
+    def _wait_until_idle(self) -> bool:
+        """Wait until the server is idle. Return False if stopped."""
+        with self._condition:
+            while not self._stopped:
+                delay = self._resume_at - self.clock()
+                if self._active_requests:
+                    self._condition.wait()
+                elif delay > 0:
+                    self._condition.wait(delay)
+                else:
+                    return True
+            return False
+
+
+class Preparser(BackgroundWorker):
+    """Parse the modules of a project in a background thread.
+
+    At most max_files project modules are parsed, followed by the
+    modules of the max_packages third-party packages imported most
+    often. Directories named in ignored_directories, hidden
+    directories and virtualenvs are skipped.
+
+    Files for which is_open returns true are skipped as well: Jedi
+    caches the trees of open files parsed from their unsaved contents,
+    which must not be replaced by the version on disk.
+
+    The environment is queried on the thread creating the preparser,
+    not the background thread.
+
+    """
+
+    def __init__(
+        self,
+        project_root: str,
+        environment: Any = None,
+        ignored_directories: Iterable[str] = (),
+        max_files: int = 2000,
+        max_packages: int = 10,
+        idle_delay: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+        is_open: Callable[[str], bool] = lambda path: False,
+    ) -> None:
+        super().__init__(idle_delay, clock)
+        self.project_root = project_root
+        self.environment = environment or get_cached_default_environment()
+        self.ignored_directories = IGNORED_DIRECTORIES | set(ignored_directories)
+        self.max_files = max_files
+        self.max_packages = max_packages
+        self.is_open = is_open
+        self.sys_path = get_site_directories(self.environment)
+        self.parsed_files = 0
+
+    def run(self) -> None:
+        try:
+            grammar = self.environment.get_grammar()
+            imports: Counter[str] = collections.Counter()
+            project_modules = set()
+            for path in self._iter_project_files():
+                if not self._wait_until_idle():
+                    return
+                project_modules.add(_get_module_name(self.project_root, path))
+                module = self._parse(grammar, path)
+                if module is not None:
+                    imports.update(_get_imported_packages(module))
+            packages = [
+                name for name, _ in imports.most_common() if name not in project_modules
+            ][: self.max_packages]
+            for name in packages:
+                for path in _iter_package_files(self.sys_path, name):
+                    if not self._wait_until_idle():
+                        return
+                    self._parse(grammar, path)
+        finally:
+            self.done.set()
+
+    def _parse(self, grammar, path: str) -> Optional[Any]:
+        """Parse path like Jedi would, so the result ends up in its cache.
+
+        Jedi uses the diff parser, which updates cached trees in place,
+        while Jedi might be using them. A plain parse is used instead.
+
+        """
+        if self.is_open(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        code = parso.python_bytes_to_unicode(data, encoding="utf-8", errors="replace")
+        if len(code) > settings._cropped_file_size:
+            code = code[: settings._cropped_file_size]
+        module = grammar.parse(
+            code=code,
+            path=path,
+            cache=True,
+            diff_cache=False,
+            cache_path=settings.cache_directory,
+        )
+        self.parsed_files += 1
+        return module
+
+    def _iter_project_files(self) -> Iterator[str]:
+        return iter_project_files(
+            self.project_root, self.ignored_directories, self.max_files
+        )
+
+
+def get_site_directories(environment: Any) -> List[str]:
+    """Return the site-packages directories of environment.
+
+    Jedi environments run a subprocess to answer this, which must not
+    be shared with background threads, so this is called up front.
+
+    """
+    return [
+        path
+        for path in environment.get_sys_path()
+        if os.path.basename(path) in ("site-packages", "dist-packages")
+    ]
+
+
+def iter_project_files(
+    project_root: str, ignored_directories: Iterable[str], max_files: int
+) -> Iterator[str]:
+    """Return the first max_files modules of the project, sorted.
+
+    Directories named in ignored_directories, hidden directories and
+    virtualenvs are skipped.
+
+    """
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(project_root):
+        dirnames[:] = sorted(
+            dirname
+            for dirname in dirnames
+            if not _is_ignored(os.path.join(dirpath, dirname), ignored_directories)
+        )
+        for filename in sorted(filenames):
+            if filename.endswith(".py"):
+                if count >= max_files:
+                    return
+                count += 1
+                yield os.path.join(dirpath, filename)
+
+
+def _is_ignored(path: str, ignored_directories: Iterable[str]) -> bool:
+    name = os.path.basename(path)
+    return (
+        name.startswith(".")
+        or name.endswith(".egg-info")
+        or name in ignored_directories
+        or os.path.exists(os.path.join(path, "pyvenv.cfg"))
+    )
+
+
+def _get_module_name(project_root: str, path: str) -> str:
+    relative_path = os.path.relpath(path, project_root)
+    return relative_path.split(os.sep)[0].rsplit(".py", 1)[0]
+
+
+def _get_imported_packages(module) -> Set[str]:
+    """Return the top-level names of the absolute imports in module."""
+    names = set()
+    for node in module.iter_imports():
+        if node.type == "import_name":
+            for path in node.get_paths():
+                names.add(path[0].value)
+        elif node.level == 0:
+            names.add(node.get_from_names()[0].value)
+    return names
+
+
+def _iter_package_files(sys_path: List[str], name: str) -> Iterator[str]:
+    """Return the modules directly within the package called name."""
+    for directory in sys_path:
+        package = os.path.join(directory, name)
+        if os.path.isfile(os.path.join(package, "__init__.py")):
+            for filename in sorted(os.listdir(package)):
+                if filename.endswith(".py"):
+                    yield os.path.join(package, filename)
+            return
+        if os.path.isfile(package + ".py"):
+            yield package + ".py"
+            return
@@ -0,0 +1,229 @@
+"""Render pydoc documentation in a helper process.
+
+Rendering documentation imports the module documented, which can take
+seconds and leaves the module resident in memory. The server hands
+this to a helper process instead, which is restarted when it takes
+too long and after a number of renders, so whatever it imported is
+freed again.
+
+The helper reads one JSON request per line on stdin and answers with
+one JSON line on stdout:
+
+  {"symbol": "json.dumps", "paginate": false, "sys_path": [...]}
+  {"documentation": "..."}
+
+Paginated documentation of a module only summarizes its classes and
+functions, and lists them as sections to be rendered on demand:
+
+  {"documentation": {"text": "...",
+                     "sections": [{"symbol": "json.JSONDecoder",
+                                   "kind": "class"}, ...]}}
+
+"""
+
+import inspect
+import json
+import os
+import pkgutil
+import pydoc
+import queue
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from elpy import pydocutils
+from elpy.rpc import Fault
+
+
+class DocumentationRenderer:
+    """Render documentation in a helper process, with a cache.
+
+    Renders taking longer than timeout seconds are aborted. The helper
+    is restarted after max_renders renders. The last cache_size results
+    are cached by symbol and the version of the module documented.
+
+    """
+
+    def __init__(
+        self, timeout: float = 10.0, max_renders: int = 20, cache_size: int = 32
+    ) -> None:
+        self.timeout = timeout
+        self.max_renders = max_renders
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, bool, Any], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._replies: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._renders = 0
+
+    def render(self, symbol: str, paginate: bool = False) -> Any:
+        """Return the documentation for symbol, or None if not found.
+
+        If paginate is true, return the paginated documentation.
+
+        """
+        key = (symbol, paginate, pydocutils.get_module_version(symbol))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            request = {"symbol": symbol, "paginate": paginate, "sys_path": sys.path}
+            documentation = self._request(request)["documentation"]
+            self._cache[key] = documentation
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return documentation
+
+    def stop(self) -> None:
+        """Stop the helper process, if it is running."""
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def _request(self, request):
+        if self._process is None or self._renders >= self.max_renders:
+            self._start()
+        self._renders += 1
+        try:
+            self._process.stdin.write(json.dumps(request) + "\n")
+            self._process.stdin.flush()
+            line = self._replies.get(timeout=self.timeout)
+        except OSError:
+            line = None
+        except queue.Empty:
+            self.stop()
+            raise Fault(
+                "Rendering documentation for {0} timed out".format(request["symbol"]),
+                code=400,
+            )
+        if line is None:
+            self.stop()
+            raise Fault("The documentation helper exited", code=400)
+        reply = json.loads(line)
+        if "error" in reply:
+            raise Fault(reply["error"], code=400)
+        return reply
+
+    def _start(self) -> None:
+        self.stop()
+        environment = dict(os.environ)
+        elpy_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        environment["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [elpy_path, environment.get("PYTHONPATH")])
+        )
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "elpy.pydocrender"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=environment,
+            encoding="utf-8",
+        )
+        self._renders = 0
+        # Every process gets its own queue, so replies of a process
+        # that was stopped can not be mistaken for those of the next.
+        self._replies = queue.Queue()
+        threading.Thread(
+            target=_read_replies,
+            args=(self._process.stdout, self._replies),
+            daemon=True,
+        ).start()
+
+
+def _read_replies(stdout, replies) -> None:
+    for line in stdout:
+        replies.put(line)
+    replies.put(None)
+
+
+class SummaryTextDoc(pydoc.TextDoc):
+    """A pydoc renderer summarizing classes and functions in a line.
+
+    The symbols of the classes, functions and submodules summarized
+    are collected in sections.
+
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sections: List[Dict[str, str]] = []
+
+    def docmodule(self, object, *args, **kwargs):
+        for _, modname, _ in pkgutil.iter_modules(getattr(object, "__path__", [])):
+            self._add_section(object.__name__, modname, "module")
+        return super().docmodule(object, *args, **kwargs)
+
+    def docclass(self, object, name=None, mod=None, *ignored):
+        return self._summarize(object, name, mod, "class")
+
+    def docroutine(self, object, name=None, mod=None, *args, **kwargs):
+        return self._summarize(object, name, mod, "function")
+
+    def _summarize(self, object, name, mod, kind):
+        name = name or object.__name__
+        self._add_section(mod, name, kind)
+        synopsis = (inspect.getdoc(object) or "").strip().split("\n")[0]
+        if synopsis:
+            return "{0} - {1}\n".format(self.bold(name), synopsis)
+        return self.bold(name) + "\n"
+
+    def _add_section(self, mod, name, kind):
+        symbol = "{0}.{1}".format(mod, name) if mod else name
+        self.sections.append({"symbol": symbol, "kind": kind})
+
+
+def render_documentation(symbol: str, paginate: bool = False) -> Any:
+    """Render the documentation for symbol in this process.
+
+    If paginate is true and symbol is a module, return a dict with the
+    summarized documentation as text and the symbols of its classes,
+    functions and submodules as sections.
+
+    """
+    try:
+        renderer = None
+        if paginate:
+            resolved = pydoc.resolve(symbol)
+            if resolved is not None and inspect.ismodule(resolved[0]):
+                renderer = SummaryTextDoc()
+        docstring = pydoc.render_doc(
+            str(symbol), "Elpy Pydoc Documentation for %s", False, renderer
+        )
+    except (ImportError, pydoc.ErrorDuringImport):
+        return None
+    if isinstance(docstring, bytes):
+        docstring = docstring.decode("utf-8", "replace")
+    if not paginate:
+        return docstring
+    sections = renderer.sections if renderer is not None else []
+    return {"text": docstring, "sections": sections}
+
+
+def main() -> None:
+    """Answer render requests on stdin until it is closed."""
+    # Modules imported for rendering might print, which must not end
+    # up in the replies.
+    replies = open(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    devnull = open(os.devnull, "w")
+    os.dup2(devnull.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr = devnull
+    for line in sys.stdin:
+        request = json.loads(line)
+        sys.path[:] = request["sys_path"]
+        try:
+            reply = {
+                "documentation": render_documentation(
+                    request["symbol"], request.get("paginate", False)
+                )
+            }
+        except Exception as e:
+            reply = {"error": "Error rendering documentation: {0}".format(e)}
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
+import ast
+import bisect
+import os
 import sys
 import types
+from importlib.machinery import EXTENSION_SUFFIXES
 from pkgutil import iter_modules
 from pydoc import ErrorDuringImport, resolve, safeimport
+from typing import Any, Dict, Tuple
+
+import parso
 
 # Types we want to recurse into (nodes).
 CONTAINER_TYPES = (type, types.ModuleType)
@@ -16,6 +23,81 @@ PYDOC_TYPES = (
 )
 
 
+class ModuleIndex(object):
+    """An index of the modules found on a search path.
+
+    Listing the modules of every sys.path entry takes hundreds of
+    directory reads, so the listing of every entry is kept along with
+    its modification time and only repeated once the entry changed.
+    The merged names are kept sorted to look them up by prefix.
+
+    """
+
+    def __init__(self):
+        # entry -> (mtime, names)
+        self._entries = {}
+        # tuple of entries -> (mtimes, sorted names)
+        self._indexes = {}
+
+    def get_modules(self, path=None):
+        """Return the sorted names of the modules on path.
+
+        If path is not given, return the top level modules on sys.path
+        and the builtin modules.
+
+        """
+        if path is None:
+            entries = tuple(sys.path)
+            builtins = sys.builtin_module_names
+        else:
+            entries = tuple(path)
+            builtins = ()
+        mtimes = tuple(_get_mtime(entry) for entry in entries)
+        cached = self._indexes.get(entries)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1]
+        names = set(builtins)
+        for entry, mtime in zip(entries, mtimes):
+            names.update(self._get_entry_modules(entry, mtime))
+        index = sorted(names)
+        self._indexes[entries] = (mtimes, index)
+        return index
+
+    def complete(self, prefix, path=None):
+        """Return the names of the modules on path starting with prefix."""
+        names = self.get_modules(path)
+        start = bisect.bisect_left(names, prefix)
+        end = start
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        return names[start:end]
+
+    def _get_entry_modules(self, entry, mtime):
+        cached = self._entries.get(entry)
+        if cached is not None and cached[0] == mtime and mtime is not None:
+            return cached[1]
+        try:
+            names = [
+                modname
+                for (importer, modname, ispkg) in iter_modules([entry])
+                if not modname.startswith("_")
+            ]
+        except OSError:
+            names = []
+        self._entries[entry] = (mtime, names)
+        return names
+
+
+def _get_mtime(entry):
+    try:
+        return os.stat(entry or ".").st_mtime_ns
+    except OSError:
+        return None
+
+
+module_index = ModuleIndex()
+
+
 def get_pydoc_completions(modulename):
     """Get possible completions for modulename for pydoc.
 
@@ -24,20 +106,33 @@ def get_pydoc_completions(modulename):
     """
     modulename = modulename.rstrip(".")
     if modulename == "":
-        return sorted(get_modules())
+        return get_modules()
     candidates = get_completions(modulename)
     if candidates:
         return sorted(candidates)
     needle = modulename
-    if "." in needle:
-        modulename, part = needle.rsplit(".", 1)
-        candidates = get_completions(modulename)
-    else:
-        candidates = get_modules()
+    if "." not in needle:
+        return module_index.complete(needle)
+    modulename, part = needle.rsplit(".", 1)
+    candidates = get_completions(modulename)
     return sorted(candidate for candidate in candidates if candidate.startswith(needle))
 
 
 def get_completions(modulename):
+    """Return the names pydoc can document directly under modulename.
+
+    Modules that were not imported yet are read from their source, so
+    browsing the documentation does not import them into the server.
+    Modules without source, like extension modules, are imported.
+
+    """
+    completions = get_static_completions(modulename)
+    if completions is None:
+        completions = get_imported_completions(modulename)
+    return completions
+
+
+def get_imported_completions(modulename):
     modules = set(
         "{0}.{1}".format(modulename, module) for module in get_modules(modulename)
     )
@@ -56,6 +151,353 @@ def get_completions(modulename):
     return modules
 
 
+def get_static_completions(modulename, depth=0):
+    """Return the completions under modulename found in source files.
+
+    This lists the submodules, classes, functions and imported names of
+    modules and the classes and methods of classes without importing
+    anything. Names imported from other modules, also with star
+    imports, are followed to their definition. Returns None if that is
+    not possible, because the module has no source or is imported
+    already anyway.
+
+    """
+    parts = modulename.split(".")
+    found = _find_module(parts)
+    if found is None:
+        return None
+    module_length, filename, package_path = found
+    module_name = ".".join(parts[:module_length])
+    if module_name in sys.modules:
+        # Importing is free, and more accurate
+        return None
+    qualname = parts[module_length:]
+    completions = set()
+    if package_path is not None and not qualname:
+        completions.update(module_index.get_modules(package_path))
+    if filename is not None:
+        package = parts[:module_length]
+        if not filename.endswith("__init__.py"):
+            package = package[:-1]
+        scopes, imports, star_imports, _ = _get_scopes(filename)
+        star_targets = [
+            ".".join(_resolve_import(package, level, target))
+            for level, target in star_imports
+        ]
+        if ".".join(qualname) in scopes:
+            completions.update(scopes[".".join(qualname)])
+            if not qualname:
+                for target_name in star_targets:
+                    completions.update(_get_star_names(target_name, depth + 1))
+        elif qualname[0] in imports:
+            if depth >= MAX_IMPORT_DEPTH:
+                return set()
+            level, target = imports[qualname[0]]
+            target = _resolve_import(package, level, target)
+            return _get_imported_name_completions(
+                modulename, ".".join(target + qualname[1:]), depth
+            )
+        else:
+            for target_name in star_targets:
+                if qualname[0] in _get_star_names(target_name, depth + 1):
+                    return _get_imported_name_completions(
+                        modulename, ".".join([target_name] + qualname), depth
+                    )
+    return set("{0}.{1}".format(modulename, name) for name in completions)
+
+
+def _resolve_import(package, level, target):
+    """Return the absolute name of an import in package, as a list."""
+    if level:
+        return package[: len(package) - level + 1] + target
+    return target
+
+
+def _get_imported_name_completions(modulename, target_name, depth):
+    """Return the completions under target_name as if under modulename."""
+    targets = get_static_completions(target_name, depth + 1)
+    if targets is None:
+        targets = get_imported_completions(target_name)
+    return set(modulename + name[len(target_name) :] for name in targets)
+
+
+def _get_star_names(modulename, depth):
+    """Return the names from modulename import * binds that pydoc lists.
+
+    Only the names in the __all__ of the module are bound, if it has
+    one. Modules without source are imported.
+
+    """
+    if depth >= MAX_IMPORT_DEPTH:
+        return set()
+    completions = get_static_completions(modulename, depth)
+    if completions is None:
+        completions = get_imported_completions(modulename)
+    names = set(name[len(modulename) + 1 :] for name in completions)
+    exports = _get_exports(modulename)
+    if exports is not None:
+        names.intersection_update(exports)
+    return names
+
+
+def _get_exports(modulename):
+    """Return the names in the __all__ of modulename, or None if unknown."""
+    module = sys.modules.get(modulename)
+    if module is not None:
+        exports = getattr(module, "__all__", None)
+        return None if exports is None else set(exports)
+    parts = modulename.split(".")
+    found = _find_module(parts)
+    if found is None or found[0] != len(parts) or found[1] is None:
+        return None
+    return _get_scopes(found[1])[3]
+
+
+# How many imports to follow for a name
+MAX_IMPORT_DEPTH = 5
+
+
+def _find_module(parts):
+    """Find the longest module prefix of parts like the importer would.
+
+    Returns the number of parts naming the module, its source file and,
+    for packages, its path. The source file is None for namespace
+    packages. Returns None if the module has no source or was not
+    found.
+
+    """
+    found = None
+    path = sys.path
+    for length, part in enumerate(parts, 1):
+        namespace_path = []
+        for entry in path:
+            location = os.path.join(entry or ".", part)
+            init = _find_source(os.path.join(location, "__init__"))
+            if init:
+                if init is NO_SOURCE:
+                    return None
+                found = (length, init, [location])
+                break
+            filename = _find_source(location)
+            if filename is NO_SOURCE:
+                return None
+            if filename:
+                return (length, filename, None)
+            if os.path.isdir(location):
+                namespace_path.append(location)
+        else:
+            if not namespace_path:
+                return found
+            found = (length, None, namespace_path)
+        path = found[2]
+    return found
+
+
+NO_SOURCE = object()
+
+
+def _find_source(location):
+    """Return the source file of the module at location.
+
+    Returns NO_SOURCE for extension modules, and None if there is no
+    module. Compiled modules that ship their source, like those
+    compiled with mypyc, count as having source.
+
+    """
+    if os.path.isfile(location + ".py"):
+        return location + ".py"
+    if any(os.path.isfile(location + suffix) for suffix in EXTENSION_SUFFIXES):
+        return NO_SOURCE
+    return None
+
+
+# filename -> (mtime, scopes, imports, star imports, exports)
+_scopes: Dict[str, Tuple[int, Any, Any, Any, Any]] = {}
+
+
+def _get_scopes(filename):
+    """Return the names defined in the module and classes of filename.
+
+    Returns a dict mapping the dotted name of every class, and "" for
+    the module, to the public names defined there, a dict mapping the
+    names the module imports to their import level and the dotted name
+    they were imported from, as a list, a list of the import level and
+    dotted name of the star imports, and the names in __all__, or None
+    if they are not known.
+
+    """
+    try:
+        mtime = os.stat(filename).st_mtime_ns
+    except OSError:
+        return {}, {}, [], None
+    cached = _scopes.get(filename)
+    if cached is not None and cached[0] == mtime:
+        return cached[1:]
+    try:
+        with open(filename, "rb") as f:
+            code = parso.python_bytes_to_unicode(f.read(), errors="replace")
+    except OSError:
+        return {}, {}, [], None
+    module = parso.parse(code)
+    scopes = {}
+    _collect_names(module, "", scopes)
+    imports = {}
+    star_imports = []
+    for node in module.iter_imports():
+        if node.type == "import_from" and node.is_star_import():
+            star_imports.append(
+                (node.level, [name.value for name in node.get_from_names()])
+            )
+            continue
+        for name, path in zip(node.get_defined_names(), node.get_paths()):
+            path = [part.value for part in path]
+            if node.type == "import_name" and name.value == path[0]:
+                # import a.b binds a
+                path = path[:1]
+            imports[name.value] = (node.level, path)
+    exports = _get_all_names(module)
+    _scopes[filename] = (mtime, scopes, imports, star_imports, exports)
+    return scopes, imports, star_imports, exports
+
+
+def _get_all_names(module):
+    """Return the names in the __all__ of module, or None if unknown.
+
+    Only literal lists and tuples of strings assigned or added to
+    __all__ in the module scope are understood. Additions in
+    conditional blocks are taken to happen.
+
+    """
+    exports = None
+
+    def walk(node):
+        nonlocal exports
+        for child in node.children:
+            if child.type in BLOCK_TYPES:
+                if not walk(child):
+                    return False
+            elif child.type == "expr_stmt" and len(child.children) == 3:
+                target, operator, value = child.children
+                if target.type != "name" or target.value != "__all__":
+                    continue
+                try:
+                    names = ast.literal_eval(value.get_code().strip())
+                except (SyntaxError, ValueError):
+                    return False
+                if not isinstance(names, (list, tuple)) or not all(
+                    isinstance(name, str) for name in names
+                ):
+                    return False
+                if operator.value == "=":
+                    exports = set(names)
+                elif operator.value == "+=" and exports is not None:
+                    exports.update(names)
+                else:
+                    return False
+        return True
+
+    if not walk(module):
+        return None
+    return exports
+
+
+# Statements whose bodies still belong to the scope they are in
+BLOCK_TYPES = (
+    "async_stmt",
+    "decorated",
+    "for_stmt",
+    "if_stmt",
+    "simple_stmt",
+    "suite",
+    "try_stmt",
+    "while_stmt",
+    "with_stmt",
+)
+
+
+def _collect_names(scope, qualname, scopes):
+    names = scopes.setdefault(qualname, set())
+    is_module = scope.type == "file_input"
+
+    def walk(node):
+        for child in node.children:
+            if child.type in ("classdef", "funcdef"):
+                name = child.name.value
+                if not name.startswith("_"):
+                    names.add(name)
+                    if child.type == "classdef":
+                        _collect_names(
+                            child, "{0}.{1}".format(qualname, name).lstrip("."), scopes
+                        )
+            elif child.type in ("import_name", "import_from"):
+                # Only modules reexport what they import
+                if is_module:
+                    names.update(
+                        name.value
+                        for name in child.get_defined_names()
+                        if not name.value.startswith("_")
+                    )
+            elif child.type == "expr_stmt" and _is_alias(child):
+                name = child.children[0].value
+                if not name.startswith("_"):
+                    names.add(name)
+            elif child.type in BLOCK_TYPES:
+                walk(child)
+
+    walk(scope if is_module else scope.children[-1])
+
+
+def _is_alias(expression):
+    """Return whether expression assigns a dotted name to a name.
+
+    Such aliases, like SelectorEventLoop = _UnixSelectorEventLoop,
+    usually name classes and functions, unlike other assignments.
+
+    """
+    if len(expression.children) != 3:
+        return False
+    target, operator, value = expression.children
+    if target.type != "name" or operator.value != "=":
+        return False
+    if value.type == "name":
+        return True
+    return (
+        value.type == "atom_expr"
+        and value.children[0].type == "name"
+        and all(
+            trailer.type == "trailer"
+            and trailer.children[0] == "."
+            and trailer.children[1].type == "name"
+            for trailer in value.children[1:]
+        )
+    )
+
+
+def get_module_version(modulename):
+    """Return a key that changes when the module for modulename does.
+
+    The key holds the modification times of the location the top level
+    module is found at, and of the source file of the module found for
+    modulename. Installing or upgrading the module changes them.
+
+    """
+    parts = modulename.split(".")
+    key = [sys.version]
+    for entry in sys.path:
+        location = os.path.join(entry or ".", parts[0])
+        candidates = [location, location + ".py"]
+        candidates.extend(location + suffix for suffix in EXTENSION_SUFFIXES)
+        mtimes = [(path, _get_mtime(path)) for path in candidates]
+        found = [mtime for mtime in mtimes if mtime[1] is not None]
+        if found:
+            key.extend(found)
+            break
+    found_module = _find_module(parts)
+    if found_module is not None and found_module[1] is not None:
+        key.append((found_module[1], _get_mtime(found_module[1])))
+    return tuple(key)
+
+
 def get_modules(modulename=None):
     """Return a list of modules and packages under modulename.
 
@@ -64,15 +506,7 @@ def get_modules(modulename=None):
 
     """
     if not modulename:
-        try:
-            return [
-                modname
-                for (importer, modname, ispkg) in iter_modules()
-                if not modname.startswith("_")
-            ] + list(sys.builtin_module_names)
-        except OSError:
-            # Bug in Python 2.6, see #275
-            return list(sys.builtin_module_names)
+        return list(module_index.get_modules())
     try:
         module = safeimport(modulename)
     except ErrorDuringImport:
@@ -80,9 +514,5 @@ def get_modules(modulename=None):
     if module is None:
         return []
     if hasattr(module, "__path__"):
-        return [
-            modname
-            for (importer, modname, ispkg) in iter_modules(module.__path__)
-            if not modname.startswith("_")
-        ]
+        return list(module_index.get_modules(module.__path__))
     return []
@@ -0,0 +1,257 @@
+"""Server-side storage of computed refactorings.
+
+Refactorings are stored under a handle for a while, so that they can
+be previewed and applied without running the analysis again. Only
+their edits are kept. The sources they were computed from are
+remembered by hash, which allows detecting refactorings that have
+become stale.
+
+"""
+
+import difflib
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from parso import split_lines
+
+from elpy.rpc import Fault
+
+
+@dataclass
+class StoredFile:
+    source_hash: str
+    # Lists of offset, length and replacement text
+    edits: List[list]
+    # The name of the file after the refactoring, if it is renamed
+    new_file_name: Optional[str] = None
+
+
+@dataclass
+class StoredRefactoring:
+    project_path: str
+    renames: List[Tuple[str, str]]
+    expires: float
+    files: Dict[str, StoredFile] = field(default_factory=dict)
+    complete: bool = False
+
+
+class RefactoringStore:
+    """Keep refactorings around for ttl seconds.
+
+    At most max_size refactorings are stored, the oldest ones are
+    dropped first.
+
+    A refactoring is added with add, followed by add_file for every
+    file it changes, as they are computed, and finish.
+
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_size: int = 16,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._refactorings: "OrderedDict[str, StoredRefactoring]" = OrderedDict()
+
+    def add(self, project_path: str, renames: List[Tuple[str, str]]) -> str:
+        """Store a new refactoring and return its handle.
+
+        renames lists the files and directories renamed by the
+        refactoring, as pairs of the old and new name.
+
+        """
+        self._expire()
+        handle = uuid.uuid4().hex
+        self._refactorings[handle] = StoredRefactoring(
+            project_path=project_path,
+            renames=renames,
+            expires=self.clock() + self.ttl,
+        )
+        while len(self._refactorings) > self.max_size:
+            self._refactorings.popitem(last=False)
+        return handle
+
+    def add_file(
+        self,
+        handle: str,
+        file_name: str,
+        source: str,
+        edits: List[list],
+        new_file_name: Optional[str] = None,
+    ) -> None:
+        """Add the edits of a file to the refactoring stored under handle.
+
+        source is the content of the file the edits apply to. Nothing
+        happens if the refactoring is no longer stored.
+
+        """
+        stored = self._refactorings.get(handle)
+        if stored is not None:
+            stored.files[file_name] = StoredFile(
+                source_hash=source_hash(source),
+                edits=edits,
+                new_file_name=new_file_name,
+            )
+
+    def finish(self, handle: str) -> None:
+        """Mark the refactoring stored under handle as complete."""
+        stored = self._refactorings.get(handle)
+        if stored is not None:
+            stored.complete = True
+
+    def get(self, handle: str) -> StoredRefactoring:
+        """Return the refactoring stored under handle.
+
+        Raises a Fault if there is none, for example because it
+        expired, or if it is not complete.
+
+        """
+        self._expire()
+        try:
+            stored = self._refactorings[handle]
+        except KeyError:
+            raise Fault("Unknown or expired refactoring {0}".format(handle), code=400)
+        if not stored.complete:
+            raise Fault("Refactoring {0} is not complete".format(handle), code=400)
+        return stored
+
+    def remove(self, handle: str) -> None:
+        self._refactorings.pop(handle, None)
+
+    def get_stale_files(self, handle: str, sources: Dict[str, str]) -> List[str]:
+        """Return the files that changed since the refactoring was computed.
+
+        sources maps file names to their current contents. Files not
+        in there are read from disk.
+
+        """
+        return self._read_sources(self.get(handle), sources)[1]
+
+    def get_diff(
+        self, handle: str, sources: Dict[str, str], filename: Optional[str] = None
+    ) -> str:
+        """Return the diff of the refactoring stored under handle.
+
+        If filename is given, only return the diff for that file.
+        sources is used as for get_stale_files. Raises a Fault listing
+        the stale files if any file changed.
+
+        """
+        stored = self.get(handle)
+        if filename is not None and filename not in stored.files:
+            raise Fault(
+                "Refactoring {0} does not change {1}".format(handle, filename),
+                code=400,
+            )
+        current_sources, stale_files = self._read_sources(stored, sources)
+        if stale_files:
+            raise Fault(
+                "Refactoring is out of date, files changed",
+                code=400,
+                data={"stale_files": stale_files},
+            )
+        project_path = stored.project_path
+        if filename is not None:
+            return _get_file_diff(
+                filename,
+                stored.files[filename],
+                current_sources[filename],
+                project_path,
+            )
+        # The diff looks like the one Jedi renders.
+        text = "".join(
+            "rename from {0}\nrename to {1}\n".format(
+                _relative_to(from_, project_path), _relative_to(to, project_path)
+            )
+            for from_, to in stored.renames
+        )
+        return text + "".join(
+            _get_file_diff(
+                file_name, stored_file, current_sources[file_name], project_path
+            )
+            for file_name, stored_file in stored.files.items()
+        )
+
+    def _read_sources(
+        self, stored: StoredRefactoring, sources: Dict[str, str]
+    ) -> Tuple[Dict[str, str], List[str]]:
+        """Return the current sources of the files and the stale ones."""
+        current_sources = {}
+        stale_files = []
+        for file_name, stored_file in stored.files.items():
+            source = sources.get(file_name)
+            if source is None:
+                try:
+                    with open(file_name, encoding="utf-8", newline="") as f:
+                        source = f.read()
+                except (OSError, UnicodeDecodeError):
+                    source = None
+            if source is None or source_hash(source) != stored_file.source_hash:
+                stale_files.append(file_name)
+            else:
+                current_sources[file_name] = source
+        return current_sources, stale_files
+
+    def _expire(self) -> None:
+        now = self.clock()
+        for handle in [
+            handle
+            for handle, stored in self._refactorings.items()
+            if stored.expires <= now
+        ]:
+            del self._refactorings[handle]
+
+
+def source_hash(source: str) -> str:
+    return hashlib.sha1(source.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def apply_edits(source: str, edits: List[list]) -> str:
+    """Return source with edits applied.
+
+    The edits must not overlap and be sorted by offset.
+
+    """
+    parts = []
+    last_end = 0
+    for offset, length, replacement in edits:
+        parts.append(source[last_end:offset])
+        parts.append(replacement)
+        last_end = offset + length
+    parts.append(source[last_end:])
+    return "".join(parts)
+
+
+def _get_file_diff(
+    file_name: str, stored_file: StoredFile, source: str, project_path: str
+) -> str:
+    old_lines = list(split_lines(source, keepends=True))
+    new_lines = list(split_lines(apply_edits(source, stored_file.edits), keepends=True))
+    # Like Jedi, leave out the note about a missing newline at the end
+    if old_lines[-1] != "":
+        old_lines[-1] += "\n"
+    if new_lines[-1] != "":
+        new_lines[-1] += "\n"
+    diff = difflib.unified_diff(
+        old_lines,
+        new_lines,
+        fromfile=_relative_to(file_name, project_path),
+        tofile=_relative_to(stored_file.new_file_name or file_name, project_path),
+    )
+    return "".join(diff).rstrip(" ")
+
+
+def _relative_to(file_name: str, project_path: str) -> str:
+    try:
+        return str(Path(file_name).relative_to(project_path))
+    except ValueError:
+        return file_name
@@ -9,6 +9,7 @@ See the documentation of the JSONRPCServer class for further details.
 
 import json
 import sys
+import threading
 import traceback
 
 from .json_encoder import JSONEncoder
@@ -38,6 +39,11 @@ class JSONRPCServer:
 
     {"id": 23, "error": "Simple error message"}
 
+    Methods that report progress before their result can send
+    notifications, which carry the id of the request being handled:
+
+    {"method": "progress", "params": {"request_id": 23, ...}}
+
     See http://www.jsonrpc.org/ for the inspiration of the protocol.
 
     """
@@ -57,6 +63,9 @@ class JSONRPCServer:
             self.stdout = sys.stdout
         else:
             self.stdout = stdout
+        self.request_id = None
+        # Notifications may be sent from other threads
+        self.write_lock = threading.Lock()
 
     def read_json(self):
         """Read a single line and decode it as JSON.
@@ -77,8 +86,23 @@ class JSONRPCServer:
 
         """
         serialized_value = JSONEncoder().encode(kwargs)
-        self.stdout.write(serialized_value + "\n")
-        self.stdout.flush()
+        with self.write_lock:
+            self.stdout.write(serialized_value + "\n")
+            self.stdout.flush()
+
+    def notify(self, method, params, request_id=None):
+        """Send a notification about the request currently handled.
+
+        params is a dict, which is sent along with the id of the
+        current request as "request_id". Notifications about earlier
+        requests, like those sent from a background thread, need to
+        pass request_id explicitly.
+
+        """
+        if request_id is None:
+            request_id = self.request_id
+        params = dict(params, request_id=request_id)
+        self.write_json(method=method, params=params)
 
     def handle_request(self):
         """Handle a single JSON-RPC request.
@@ -96,6 +120,7 @@ class JSONRPCServer:
         method_name = request["method"]
         request_id = request.get("id", None)
         params = request.get("params") or []
+        self.request_id = request_id
         try:
             method = getattr(self, "rpc_" + method_name, None)
             if method is not None:
@@ -116,6 +141,8 @@ class JSONRPCServer:
                 "data": {"traceback": traceback.format_exc()},
             }
             self.write_json(error=error, id=request_id)
+        finally:
+            self.request_id = None
 
     def handle(self, method_name, args):
         """Handle the call to method_name.
@@ -5,17 +5,34 @@ handles backend selection and passes methods on to the selected
 backend.
 
 """
+import functools
 import io
 import os
-import pydoc
+import sys
+import threading
+from pathlib import Path
 from typing import Any, Dict, Union
 
-from elpy import jedibackend
-from elpy.auto_pep8 import fix_code
-from elpy.blackutil import fix_code as fix_code_with_black
-from elpy.pydocutils import get_pydoc_completions
-from elpy.rpc import JSONRPCServer
-from elpy.yapfutil import fix_code as fix_code_with_yapf
+from elpy.lazyimport import LazyModule, import_times
+from elpy.rpc import Fault, JSONRPCServer
+
+# Backends and formatters are only imported once they are used, so
+# the server can start up quickly.
+jedibackend = LazyModule("elpy.jedibackend")
+auto_pep8 = LazyModule("elpy.auto_pep8")
+blackutil = LazyModule("elpy.blackutil")
+yapfutil = LazyModule("elpy.yapfutil")
+pydocutils = LazyModule("elpy.pydocutils")
+pydocrender = LazyModule("elpy.pydocrender")
+documents = LazyModule("elpy.documents")
+outline = LazyModule("elpy.outline")
+diagnostics = LazyModule("elpy.diagnostics")
+formatting = LazyModule("elpy.formatting")
+preparse = LazyModule("elpy.preparse")
+docsearch = LazyModule("elpy.docsearch")
+columnar = LazyModule("elpy.columnar")
+
+FORMATTERS = ("black", "yapf", "autopep8")
 
 
 class ElpyRPCServer(JSONRPCServer):
@@ -29,6 +46,84 @@ class ElpyRPCServer(JSONRPCServer):
         super(ElpyRPCServer, self).__init__(*args, **kwargs)
         self.backend = None
         self.project_root = None
+        self._documents = None
+        self._outlines = None
+        self._diagnostics = None
+        self._black_formatter = None
+        self._formatting_cache = None
+        self._file_formatter = None
+        self._pydoc_renderer = None
+        self.preparser = None
+        self.doc_index = None
+        self.ignored_directories = ()
+        self._paused_workers = []
+
+    @property
+    def documents(self):
+        if self._documents is None:
+            self._documents = documents.DocumentStore()
+        return self._documents
+
+    @property
+    def outlines(self):
+        if self._outlines is None:
+            self._outlines = outline.OutlineCache(self.documents)
+        return self._outlines
+
+    @property
+    def diagnostics(self):
+        if self._diagnostics is None:
+            self._diagnostics = diagnostics.DiagnosticsCache(self.documents)
+        return self._diagnostics
+
+    @property
+    def formatting_cache(self):
+        if self._formatting_cache is None:
+            self._formatting_cache = formatting.FormattingCache()
+        return self._formatting_cache
+
+    @property
+    def file_formatter(self):
+        if self._file_formatter is None:
+            self._file_formatter = formatting.FileFormatter()
+        return self._file_formatter
+
+    @property
+    def pydoc_renderer(self):
+        if self._pydoc_renderer is None:
+            self._pydoc_renderer = pydocrender.DocumentationRenderer()
+        return self._pydoc_renderer
+
+    @property
+    def black_formatter(self):
+        if self._black_formatter is None:
+            self._black_formatter = blackutil.BlackCodeFormatter()
+        return self._black_formatter
+
+    def read_json(self):
+        request = super(ElpyRPCServer, self).read_json()
+        # Requests are handled one at a time, background workers
+        # resume once this one was answered.
+        self._paused_workers = self._get_background_workers()
+        for worker in self._paused_workers:
+            worker.pause()
+        return request
+
+    def handle_request(self):
+        self._paused_workers = []
+        try:
+            super(ElpyRPCServer, self).handle_request()
+        finally:
+            for worker in self._paused_workers:
+                worker.resume()
+            self._paused_workers = []
+
+    def _get_background_workers(self):
+        return [
+            worker
+            for worker in (self.preparser, self.doc_index)
+            if worker is not None
+        ]
 
     def _call_backend(self, method, default, *args, **kwargs):
         """Call the backend method with args.
@@ -49,6 +144,10 @@ class ElpyRPCServer(JSONRPCServer):
         """
         return args
 
+    def rpc_get_import_times(self):
+        """Return the seconds spent importing lazily loaded modules."""
+        return dict(import_times)
+
     def rpc_init(self, options):
         self.project_root = options["project_root"]
         self.env = options["environment"]
@@ -58,6 +157,22 @@ class ElpyRPCServer(JSONRPCServer):
         else:
             self.backend = None
 
+        for worker in self._get_background_workers():
+            worker.stop()
+        self.preparser = None
+        self.doc_index = None
+        self.ignored_directories = options.get("ignored_directories", ())
+        if options.get("preparse") and self.backend is not None:
+            self.preparser = preparse.Preparser(
+                self.project_root,
+                self.backend.environment,
+                self.ignored_directories,
+                is_open=self.documents.is_open,
+            )
+            self.preparser.start()
+        if options.get("docsearch"):
+            self._start_doc_index()
+
         return {"jedi_available": (self.backend is not None)}
 
     def rpc_get_calltip(self, filename, source, offset):
@@ -82,15 +197,18 @@ class ElpyRPCServer(JSONRPCServer):
             offset,
         )
 
-    def rpc_get_completions(self, filename, source, offset):
-        """Get a list of completion candidates for the symbol at offset."""
+    def rpc_get_completions(self, filename, source, offset, use_columnar=False):
+        """Get a list of completion candidates for the symbol at offset.
+
+        If use_columnar is true, the list is encoded in columns, see
+        elpy.columnar.
+
+        """
+        # The backend returns the completions unique by name and sorted
         results = self._call_backend(
             "rpc_get_completions", [], filename, get_source(source), offset
         )
-        # Uniquify by name
-        results = list(dict((res["name"], res) for res in results).values())
-        results.sort(key=lambda cand: _pysymbol_key(cand["name"]))
-        return results
+        return encode_result(results, use_columnar)
 
     def rpc_get_completion_docstring(self, completion):
         """Return documentation for a previously returned completion."""
@@ -129,47 +247,152 @@ class ElpyRPCServer(JSONRPCServer):
         level modules are returned.
 
         """
-        return get_pydoc_completions(name)
+        return pydocutils.get_pydoc_completions(name)
 
-    def rpc_get_pydoc_documentation(self, symbol):
+    def rpc_get_pydoc_documentation(self, symbol, paginate=False):
         """Get the Pydoc documentation for the given symbol.
 
         Uses pydoc and can return a string with backspace characters
-        for bold highlighting.
+        for bold highlighting. The documentation is rendered in a helper
+        process, so the modules documented are not imported into the
+        server.
+
+        If paginate is true, return a dict instead. Its text is the
+        documentation, in which the classes and functions of modules
+        are only summarized. Its sections list their symbols and kinds,
+        to get their documentation on demand.
 
         """
-        try:
-            docstring = pydoc.render_doc(
-                str(symbol), "Elpy Pydoc Documentation for %s", False
-            )
-        except (ImportError, pydoc.ErrorDuringImport):
-            return None
-        else:
-            if isinstance(docstring, bytes):
-                docstring = docstring.decode("utf-8", "replace")
-            return docstring
+        return self.pydoc_renderer.render(str(symbol), paginate)
+
+    def rpc_search_docs(self, query, limit=20):
+        """Search the docstrings of the project and installed packages.
+
+        The docstrings are indexed in the background, starting with the
+        first search unless the docsearch option of rpc_init started it
+        earlier. Returns the best hits, each with the name, kind,
+        summary line and score of a docstring, and whether indexing is
+        complete.
 
-    def rpc_get_usages(self, filename, source, offset):
-        """Get usages for the symbol at point."""
+        """
+        if self.doc_index is None:
+            self._start_doc_index()
+        return {
+            "results": self.doc_index.search(query, limit),
+            "complete": self.doc_index.done.is_set(),
+        }
+
+    def _start_doc_index(self):
+        environment = self.backend.environment if self.backend is not None else None
+        self.doc_index = docsearch.DocSearchIndex(
+            self.project_root, environment, self.ignored_directories
+        )
+        self.doc_index.start()
+
+    def rpc_get_usages(self, filename, source, offset, use_columnar=False):
+        """Get usages for the symbol at point.
+
+        If use_columnar is true, the list is encoded in columns, with the
+        filenames in a string table, see elpy.columnar.
+
+        """
         source = get_source(source)
 
-        return self._call_backend("rpc_get_usages", None, filename, source, offset)
+        usages = self._call_backend("rpc_get_usages", None, filename, source, offset)
+        return encode_result(usages, use_columnar, interned=("filename",))
+
+    def rpc_get_names(self, filename, source, offset, use_columnar=False):
+        """Get all possible names
+
+        If use_columnar is true, the list is encoded in columns, with the
+        filenames in a string table, see elpy.columnar.
 
-    def rpc_get_names(self, filename, source, offset):
-        """Get all possible names"""
+        """
         source = get_source(source)
-        return self._call_backend("rpc_get_names", None, filename, source, offset)
+        names = self._call_backend("rpc_get_names", None, filename, source, offset)
+        return encode_result(names, use_columnar, interned=("filename",))
+
+    def rpc_get_outline(self, filename, source):
+        """Get the outline of classes, functions and assignments.
+
+        Returns a list of dicts with the keys name, kind, line, start,
+        end and children. start and end are the offsets of the text
+        covered by the definition.
+
+        """
+        return self.outlines.get_outline(filename, get_source(source))
+
+    def rpc_get_diagnostics(self, filename, source):
+        """Check the source of filename for problems.
+
+        Returns a list of dicts with the keys line, column, end_line,
+        end_column, code, message and severity. Syntax errors,
+        undefined names, unused imports and unused local variables are
+        reported.
+
+        """
+        return self.diagnostics.get_diagnostics(filename, get_source(source))
+
+    def rpc_close_document(self, filename):
+        """Forget the parsed contents of filename.
+
+        Meant to be called when the buffer of the file is killed.
+
+        """
+        self.documents.close_document(filename)
 
-    def rpc_get_rename_diff(self, filename, source, offset, new_name):
-        """Get the diff resulting from renaming the thing at point"""
+    def rpc_get_rename_diff(self, filename, source, offset, new_name, as_edits=False):
+        """Get the diff resulting from renaming the thing at point
+
+        If as_edits is true, return a list of edits per file instead
+        of a diff.
+
+        """
         source = get_source(source)
 
         return self._call_backend(
-            "rpc_get_rename_diff", None, filename, source, offset, new_name
+            "rpc_get_rename_diff",
+            None,
+            filename,
+            source,
+            offset,
+            new_name,
+            as_edits=as_edits,
+        )
+
+    def rpc_stream_rename_diff(
+        self, filename, source, offset, new_name, as_edits=False
+    ):
+        """Rename the thing at point, sending the changes file by file.
+
+        Every changed file is sent as a "refactoring_file"
+        notification with its diff, or its edits if as_edits is true.
+        The response summarizes the refactoring without any diff.
+
+        """
+        source = get_source(source)
+        return self._call_backend(
+            "rpc_stream_rename_diff",
+            None,
+            filename,
+            source,
+            offset,
+            new_name,
+            notify=functools.partial(self.notify, "refactoring_file"),
+            as_edits=as_edits,
         )
 
     def rpc_get_extract_variable_diff(
-        self, filename, source, offset, new_name, line_beg, line_end, col_beg, col_end
+        self,
+        filename,
+        source,
+        offset,
+        new_name,
+        line_beg,
+        line_end,
+        col_beg,
+        col_end,
+        as_edits=False,
     ):
         """Get the diff resulting from extracting the selected code"""
         source = get_source(source)
@@ -184,10 +407,20 @@ class ElpyRPCServer(JSONRPCServer):
             line_end,
             col_beg,
             col_end,
+            as_edits=as_edits,
         )
 
     def rpc_get_extract_function_diff(
-        self, filename, source, offset, new_name, line_beg, line_end, col_beg, col_end
+        self,
+        filename,
+        source,
+        offset,
+        new_name,
+        line_beg,
+        line_end,
+        col_beg,
+        col_end,
+        as_edits=False,
     ):
         """Get the diff resulting from extracting the selected code"""
         source = get_source(source)
@@ -202,27 +435,217 @@ class ElpyRPCServer(JSONRPCServer):
             line_end,
             col_beg,
             col_end,
+            as_edits=as_edits,
         )
 
-    def rpc_get_inline_diff(self, filename, source, offset):
+    def rpc_get_inline_diff(self, filename, source, offset, as_edits=False):
         """Get the diff resulting from inlining the thing at point."""
         source = get_source(source)
-        return self._call_backend("rpc_get_inline_diff", None, filename, source, offset)
+        return self._call_backend(
+            "rpc_get_inline_diff", None, filename, source, offset, as_edits=as_edits
+        )
+
+    def rpc_refactoring_preview(self, handle, filename=None, sources=None):
+        """Get the diff of a refactoring returned earlier.
 
-    def rpc_fix_code(self, source, directory):
-        """Formats Python code to conform to the PEP 8 style guide."""
+        If filename is given, only the diff for that file is returned.
+        sources maps file names to the current contents of modified
+        buffers, as for rpc_refactoring_apply.
+
+        """
+        return self._call_backend(
+            "rpc_refactoring_preview", None, handle, filename, sources
+        )
+
+    def rpc_refactoring_apply(self, handle, sources=None):
+        """Get the edits of a refactoring returned earlier.
+
+        sources maps file names to the current contents of modified
+        buffers. The refactoring is forgotten afterwards.
+
+        """
+        return self._call_backend("rpc_refactoring_apply", None, handle, sources)
+
+    def rpc_fix_code(self, source, directory, as_edits=False):
+        """Formats Python code to conform to the PEP 8 style guide.
+
+        If as_edits is true, return a list of [offset, length,
+        replacement] edits for the changed lines instead of the whole
+        formatted source.
+
+        """
         source = get_source(source)
-        return fix_code(source, directory)
+        fix_code = self._get_fixer("autopep8", directory)
+        return format_result(source, fix_code(source), as_edits)
+
+    def rpc_fix_code_with_yapf(self, source, directory, as_edits=False):
+        """Formats Python code to conform to the PEP 8 style guide.
 
-    def rpc_fix_code_with_yapf(self, source, directory):
-        """Formats Python code to conform to the PEP 8 style guide."""
+        See rpc_fix_code for as_edits.
+
+        """
         source = get_source(source)
-        return fix_code_with_yapf(source, directory)
+        fix_code = self._get_fixer("yapf", directory)
+        return format_result(source, fix_code(source), as_edits)
+
+    def rpc_fix_code_with_black(self, source, directory, as_edits=False):
+        """Formats Python code to conform to the PEP 8 style guide.
+
+        See rpc_fix_code for as_edits.
 
-    def rpc_fix_code_with_black(self, source, directory):
-        """Formats Python code to conform to the PEP 8 style guide."""
+        """
         source = get_source(source)
-        return fix_code_with_black(source, directory)
+        fix_code = self._get_fixer("black", directory)
+        return format_result(source, fix_code(source), as_edits)
+
+    def rpc_fix_code_range(self, source, directory, start_line, end_line):
+        """Format the top-level statements covering the lines with autopep8.
+
+        Lines start at 1 and end_line is included. Returns a list of
+        [offset, length, replacement] edits for the formatted region.
+
+        """
+        return formatting.fix_code_range(
+            self._get_fixer("autopep8", directory),
+            get_source(source),
+            start_line,
+            end_line,
+        )
+
+    def rpc_fix_code_range_with_yapf(self, source, directory, start_line, end_line):
+        """Format the top-level statements covering the lines with yapf.
+
+        See rpc_fix_code_range.
+
+        """
+        return formatting.fix_code_range(
+            self._get_fixer("yapf", directory),
+            get_source(source),
+            start_line,
+            end_line,
+        )
+
+    def rpc_fix_code_range_with_black(self, source, directory, start_line, end_line):
+        """Format the top-level statements covering the lines with black.
+
+        See rpc_fix_code_range.
+
+        """
+        return formatting.fix_code_range(
+            self._get_fixer("black", directory),
+            get_source(source),
+            start_line,
+            end_line,
+        )
+
+    def rpc_format_files(self, paths, formatter="black"):
+        """Format files in place, in parallel and in the background.
+
+        formatter is "black", "yapf" or "autopep8". Returns right away.
+        For every file, a "formatted_file" notification is sent with
+        its filename and status, which is "formatted", "unchanged" or
+        "error" (with a message). A final "formatted_files"
+        notification has the number of files per status.
+
+        """
+        if formatter not in FORMATTERS:
+            raise Fault("Unknown formatter {0}".format(formatter), code=400)
+        notify = functools.partial(self.notify, request_id=self.request_id)
+
+        def format_files():
+            # Errors are reported per file, this is a last resort.
+            counts = {"formatted": 0, "unchanged": 0, "error": len(paths)}
+            try:
+                counts = self.file_formatter.format_files(
+                    paths,
+                    formatter,
+                    self._get_config_key,
+                    functools.partial(notify, "formatted_file"),
+                )
+            finally:
+                notify("formatted_files", counts)
+
+        threading.Thread(target=format_files, daemon=True).start()
+        return {"files": len(paths)}
+
+    def _get_fixer(self, formatter, directory):
+        """Return a function formatting code for directory.
+
+        Results are cached by the configuration that applies to
+        directory, so formatting the same code again is cheap.
+
+        """
+        if formatter == "black":
+            fix_code = functools.partial(
+                self.black_formatter.format_code, directory=Path(directory)
+            )
+        elif formatter == "yapf":
+            fix_code = functools.partial(yapfutil.fix_code, directory=directory)
+        else:
+            fix_code = functools.partial(auto_pep8.fix_code, directory=directory)
+        return functools.partial(
+            self.formatting_cache.fix_code,
+            fix_code,
+            formatter,
+            self._get_config_key(formatter, directory),
+        )
+
+    def _get_config_key(self, formatter, directory):
+        """Return a key for the configuration of formatter in directory."""
+        if formatter == "black":
+            return self.black_formatter.get_config_key(Path(directory))
+        elif formatter == "yapf":
+            return yapfutil.get_config_key(directory)
+        else:
+            return auto_pep8.get_config_key(directory)
+
+
+def warm_up():
+    """Import the modules most sessions need.
+
+    This is meant to run in a background thread once the server
+    greeted the client, so the first requests do not have to wait.
+
+    """
+    for module in (jedibackend, documents, outline):
+        try:
+            module.load()
+        except ImportError:
+            pass
+    import parso
+
+    parso.load_grammar()
+
+
+def serve(stdin, stdout, warm_up_in_background=True):
+    """Greet the client on stdout and serve requests from stdin.
+
+    Anything else written to sys.stdout or sys.stderr is discarded, so
+    it does not corrupt the protocol.
+
+    """
+    import elpy
+
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    stdout.write("elpy-rpc ready ({0})\n".format(elpy.__version__))
+    stdout.flush()
+    if warm_up_in_background:
+        threading.Thread(target=warm_up, daemon=True).start()
+    ElpyRPCServer(stdin, stdout).serve_forever()
+
+
+def format_result(source, formatted, as_edits):
+    """Return formatted, or the edits turning source into it."""
+    if as_edits:
+        return formatting.get_edits(source, formatted)
+    return formatted
+
+
+def encode_result(rows, as_columns, interned=()):
+    """Return rows, encoded in columns if as_columns is true."""
+    if as_columns and rows is not None:
+        return columnar.encode(rows, interned)
+    return rows
 
 
 def get_source(fileobj: Union[str, Dict[str, Any]]) -> str:
@@ -248,18 +671,3 @@ def get_source(fileobj: Union[str, Dict[str, Any]]) -> str:
                     os.remove(fileobj["filename"])
                 except Exception:  # pragma: no cover
                     pass
-
-
-def _pysymbol_key(name):
-    """Return a sortable key index for name.
-
-    Sorting is case-insensitive, with the first underscore counting as
-    worse than any character, but subsequent underscores do not. This
-    means that dunder symbols (like __init__) are sorted after symbols
-    that start with an alphabetic character, but before those that
-    start with only a single underscore.
-
-    """
-    if name.startswith("_"):
-        name = "~" + name[1:]
-    return name.lower()
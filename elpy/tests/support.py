@@ -756,6 +756,126 @@ class RPCGetRenameDiffTests(object):
         diff = self.backend.rpc_get_rename_diff("test.py", source, offset, new_name)
         self.assertFalse(diff["success"])
 
+    def test_should_return_rename_edits(self):
+        source, offset = source_and_offset(
+            "def foo(a, b):\n" "  print(a_|_)\n" "  return b"
+        )
+        response = self.backend.rpc_get_rename_diff(
+            "test.py", source, offset, "c", as_edits=True
+        )
+        assert response["success"]
+        self.assertNotIn("diff", response)
+        self.assertEqual(response["renames"], [])
+        [file_edits] = response["edits"]
+        self.assertEqual(
+            apply_edits(source, file_edits["edits"]),
+            "def foo(c, b):\n" "  print(c)\n" "  return b",
+        )
+
+    def test_should_preview_stored_rename(self):
+        source, offset = source_and_offset(
+            "def foo(a, b):\n" "  print(a_|_)\n" "  return b"
+        )
+        response = self.backend.rpc_get_rename_diff("test.py", source, offset, "c")
+        [filename] = response["changed_files"]
+
+        sources = {str(filename): source}
+
+        preview = self.backend.rpc_refactoring_preview(
+            response["handle"], str(filename), sources
+        )
+
+        self.assertIn("+def foo(c, b):\n" "+  print(c)", preview)
+        self.assertEqual(
+            self.backend.rpc_refactoring_preview(response["handle"], None, sources),
+            response["diff"],
+        )
+        with self.assertRaises(Fault):
+            self.backend.rpc_refactoring_preview(response["handle"])
+
+    def test_should_apply_stored_rename(self):
+        source, offset = source_and_offset(
+            "def foo(a, b):\n" "  print(a_|_)\n" "  return b"
+        )
+        response = self.backend.rpc_get_rename_diff("test.py", source, offset, "c")
+        [filename] = response["changed_files"]
+
+        applied = self.backend.rpc_refactoring_apply(
+            response["handle"], {str(filename): source}
+        )
+
+        [file_edits] = applied["edits"]
+        self.assertEqual(
+            apply_edits(source, file_edits["edits"]),
+            "def foo(c, b):\n" "  print(c)\n" "  return b",
+        )
+        with self.assertRaises(Fault):
+            self.backend.rpc_refactoring_apply(response["handle"])
+
+    def test_should_not_apply_stale_rename(self):
+        source, offset = source_and_offset(
+            "def foo(a, b):\n" "  print(a_|_)\n" "  return b"
+        )
+        response = self.backend.rpc_get_rename_diff("test.py", source, offset, "c")
+        [filename] = response["changed_files"]
+
+        with self.assertRaises(Fault) as cm:
+            self.backend.rpc_refactoring_apply(
+                response["handle"], {str(filename): source + "\n"}
+            )
+
+        self.assertEqual(cm.exception.data, {"stale_files": [str(filename)]})
+
+    def test_should_stream_rename_diff_per_file(self):
+        source, offset = source_and_offset(
+            "def foo(a, b):\n" "  print(a_|_)\n" "  return b"
+        )
+        notifications = []
+        response = self.backend.rpc_stream_rename_diff(
+            "test.py", source, offset, "c", notify=notifications.append
+        )
+        assert response["success"]
+        self.assertNotIn("diff", response)
+        self.assertEqual(
+            [notification["filename"] for notification in notifications],
+            [str(filename) for filename in response["changed_files"]],
+        )
+        self.assertIn("+def foo(c, b):\n" "+  print(c)", notifications[0]["diff"])
+
+    def test_should_stream_rename_edits_per_file(self):
+        source, offset = source_and_offset(
+            "def foo(a, b):\n" "  print(a_|_)\n" "  return b"
+        )
+        notifications = []
+        self.backend.rpc_stream_rename_diff(
+            "test.py", source, offset, "c", notify=notifications.append, as_edits=True
+        )
+        [notification] = notifications
+        self.assertEqual(
+            apply_edits(source, notification["edits"]),
+            "def foo(c, b):\n" "  print(c)\n" "  return b",
+        )
+
+    def test_should_apply_streamed_rename(self):
+        source, offset = source_and_offset(
+            "def foo(a, b):\n" "  print(a_|_)\n" "  return b"
+        )
+        notifications = []
+        response = self.backend.rpc_stream_rename_diff(
+            "test.py", source, offset, "c", notify=notifications.append
+        )
+        [filename] = response["changed_files"]
+
+        applied = self.backend.rpc_refactoring_apply(
+            response["handle"], {str(filename): source}
+        )
+
+        [file_edits] = applied["edits"]
+        self.assertEqual(
+            apply_edits(source, file_edits["edits"]),
+            "def foo(c, b):\n" "  print(c)\n" "  return b",
+        )
+
 
 @unittest.skipIf(
     sys.version_info < (3, 6), "Jedi refactoring not available for python < 3.6"
@@ -786,6 +906,27 @@ class RPCGetExtractFunctionDiffTests(object):
             diff["diff"],
         )
 
+    def test_should_return_function_extraction_edits(self):
+        source, offset = source_and_offset("print(a)\n" "return b_|_\n")
+        response = self.backend.rpc_get_extract_function_diff(
+            "test.py",
+            source,
+            offset,
+            "foo",
+            line_beg=1,
+            line_end=2,
+            col_beg=0,
+            col_end=8,
+            as_edits=True,
+        )
+        assert response["success"]
+        self.assertNotIn("diff", response)
+        [file_edits] = response["edits"]
+        self.assertIn(
+            "def foo(a, b):\n" "    print(a)\n" "    return b\n",
+            apply_edits(source, file_edits["edits"]),
+        )
+
 
 @unittest.skipIf(
     sys.version_info < (3, 6), "Jedi refactoring not available for python < 3.6"
@@ -813,6 +954,28 @@ class RPCGetExtractVariableDiffTests(object):
             "-print(a + 1 + b/2)\n+c = a + 1 + b/2\n+print(c)\n", diff["diff"]
         )
 
+    def test_should_return_variable_extraction_edits(self):
+        source, offset = source_and_offset(
+            "b = 12\n" "a = 2\n" "print_|_(a + 1 + b/2)\n"
+        )
+        response = self.backend.rpc_get_extract_variable_diff(
+            "test.py",
+            source,
+            offset,
+            "c",
+            line_beg=3,
+            line_end=3,
+            col_beg=7,
+            col_end=16,
+            as_edits=True,
+        )
+        assert response["success"]
+        [file_edits] = response["edits"]
+        self.assertEqual(
+            apply_edits(source, file_edits["edits"]),
+            "b = 12\n" "a = 2\n" "c = a + 1 + b/2\n" "print(c)\n",
+        )
+
 
 @unittest.skipIf(
     sys.version_info < (3, 6), "Jedi refactoring not available for python < 3.6"
@@ -828,6 +991,20 @@ class RPCGetInlineDiffTests(object):
         assert diff["success"]
         self.assertIn("-bar = foo + 1\n-x = int(bar)\n+x = int(foo + 1)", diff["diff"])
 
+    def test_should_return_inline_edits(self):
+        source, offset = source_and_offset(
+            "foo = 3.1\n" "bar = foo + 1\n" "x = int(ba_|_r)\n"
+        )
+        response = self.backend.rpc_get_inline_diff(
+            "test.py", source, offset, as_edits=True
+        )
+        assert response["success"]
+        [file_edits] = response["edits"]
+        self.assertEqual(
+            apply_edits(source, file_edits["edits"]),
+            "foo = 3.1\n" "x = int(foo + 1)\n",
+        )
+
     def test_should_error_on_refactoring_failure(self):
         source, offset = source_and_offset(
             "foo = 3.1\n" "bar = foo + 1\n" "x = in_|_t(bar)\n"
@@ -909,6 +1086,17 @@ class RPCGetUsagesTests(GenericRPCTests):
         self.assertEqual(usages, [])
 
 
+def apply_edits(text, edits):
+    """Apply a list of [offset, length, replacement] edits to text.
+
+    Offsets refer to the original text.
+
+    """
+    for offset, length, replacement in sorted(edits, reverse=True):
+        text = text[:offset] + replacement + text[offset + length :]
+    return text
+
+
 def source_and_offset(source):
     """Return a source and offset from a source description.
 
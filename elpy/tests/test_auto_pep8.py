@@ -3,9 +3,12 @@
 """Tests for the elpy.autopep8 module"""
 
 import os
+import tempfile
 import unittest
+from unittest import mock
 
 from elpy import auto_pep8
+from elpy.rpc import Fault
 from elpy.tests.support import BackendTestCase
 
 
@@ -18,3 +21,48 @@ class Autopep8TestCase(BackendTestCase):
         code_block = "x=       123\n"
         new_block = auto_pep8.fix_code(code_block, os.getcwd())
         self.assertEqual(new_block, "x = 123\n")
+
+    def test_config_key_should_change_with_project_config(self):
+        with tempfile.TemporaryDirectory() as directory:
+            subdirectory = os.path.join(directory, "sub")
+            os.mkdir(subdirectory)
+            key = auto_pep8.get_config_key(subdirectory)
+
+            with open(os.path.join(directory, "setup.cfg"), "w") as f:
+                f.write("[pycodestyle]\nmax-line-length = 100\n")
+
+            self.assertNotEqual(auto_pep8.get_config_key(subdirectory), key)
+
+    def test_should_not_change_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch("os.chdir") as chdir:
+                auto_pep8.fix_code("x=1\n", directory)
+
+        self.assertFalse(chdir.called)
+
+    def test_should_read_project_config(self):
+        with tempfile.TemporaryDirectory() as directory:
+            code = "x = [1,2]\n"
+            self.assertEqual(auto_pep8.fix_code(code, directory), "x = [1, 2]\n")
+
+            with open(os.path.join(directory, "setup.cfg"), "w") as f:
+                f.write("[pycodestyle]\nignore = E231\n")
+
+            self.assertEqual(auto_pep8.fix_code(code, directory), code)
+
+    def test_should_cache_options(self):
+        with tempfile.TemporaryDirectory() as directory:
+            auto_pep8.fix_code("x=1\n", directory)
+
+            with mock.patch("autopep8.parse_args") as parse_args:
+                auto_pep8.fix_code("x=1\n", directory)
+
+        self.assertFalse(parse_args.called)
+
+    def test_should_raise_fault_for_invalid_config(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "setup.cfg"), "w") as f:
+                f.write("[pycodestyle]\nmax-line-length = 0\n")
+
+            with self.assertRaises(Fault):
+                auto_pep8.fix_code("x=1\n", directory)
@@ -0,0 +1,119 @@
+"""Tests for the elpy.benchmark module."""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from elpy import benchmark
+
+
+class TestPercentile(unittest.TestCase):
+    def test_should_return_nearest_rank(self):
+        samples = [float(number) for number in range(100, 0, -1)]
+        self.assertEqual(50.0, benchmark.percentile(samples, 50))
+        self.assertEqual(95.0, benchmark.percentile(samples, 95))
+        self.assertEqual(99.0, benchmark.percentile(samples, 99))
+        self.assertEqual(3.0, benchmark.percentile([3.0], 99))
+
+
+class TestCases(unittest.TestCase):
+    def test_should_vary_pydoc_symbols_between_iterations(self):
+        for case in benchmark.CASES:
+            if case.name.startswith("pydoc_"):
+                params = [case.get_params("/project", i) for i in range(-2, 31)]
+                self.assertEqual(len(params), len(set(map(tuple, params))))
+
+
+class TestCompare(unittest.TestCase):
+    baseline = {
+        "case": {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0, "peak_kb": 500.0}
+    }
+
+    def test_should_accept_results_within_threshold(self):
+        results = {
+            "case": {"p50_ms": 12.0, "p95_ms": 15.0, "p99_ms": 30.5, "peak_kb": 600.0}
+        }
+        self.assertEqual([], benchmark.compare(results, self.baseline, 0.25))
+
+    def test_should_report_regressions(self):
+        results = {
+            "case": {"p50_ms": 14.0, "p95_ms": 20.0, "p99_ms": 30.0, "peak_kb": 900.0}
+        }
+        self.assertEqual(
+            [
+                "case: p50_ms is 14.0, baseline 10.0",
+                "case: peak_kb is 900.0, baseline 500.0",
+            ],
+            benchmark.compare(results, self.baseline, 0.25),
+        )
+
+    def test_should_ignore_small_absolute_differences(self):
+        baseline = {"case": {"p50_ms": 0.1}}
+        results = {"case": {"p50_ms": 0.5}}
+        self.assertEqual([], benchmark.compare(results, baseline, 0.25))
+
+    def test_should_ignore_new_cases_and_cases_failing_in_baseline(self):
+        baseline = dict(self.baseline, failed={"error": "not installed"})
+        results = {
+            "new": {"p50_ms": 1.0},
+            "case": self.baseline["case"],
+            "failed": {"error": "not installed"},
+        }
+        self.assertEqual([], benchmark.compare(results, baseline, 0.25))
+
+    def test_should_report_cases_that_started_failing(self):
+        results = {"case": {"error": "boom"}}
+        self.assertEqual(
+            ["case: failed with boom"], benchmark.compare(results, self.baseline, 0.25)
+        )
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="elpy-test-")
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.baseline = os.path.join(self.tempdir, "baseline.json")
+
+    def main(self, *args):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = benchmark.main(
+                ["--iterations", "3", "--warmup", "1", "--cases", "calltip"]
+                + list(args)
+            )
+        return status, output.getvalue()
+
+    def test_should_report_and_save_results(self):
+        status, output = self.main("--save-baseline", self.baseline)
+
+        self.assertEqual(0, status)
+        self.assertIn("calltip", output)
+        with open(self.baseline) as f:
+            results = json.load(f)
+        self.assertEqual(
+            ["p50_ms", "p95_ms", "p99_ms", "peak_kb"], list(results["calltip"])
+        )
+
+    def test_should_fail_on_regression(self):
+        with open(self.baseline, "w") as f:
+            json.dump({"calltip": {"p50_ms": -10.0}}, f)
+
+        status, output = self.main("--baseline", self.baseline)
+
+        self.assertEqual(1, status)
+        self.assertIn("calltip: p50_ms", output)
+
+    def test_should_fail_when_a_case_starts_failing(self):
+        with open(self.baseline, "w") as f:
+            json.dump({"calltip": {"p50_ms": 10.0}}, f)
+
+        with mock.patch.object(benchmark, "run_case", return_value={"error": "boom"}):
+            status, output = self.main("--baseline", self.baseline)
+
+        self.assertEqual(1, status)
+        self.assertIn("calltip: failed with boom", output)
@@ -65,6 +65,37 @@ class BLACKTestCase(BackendTestCase):
         for src, expected in testdata:
             self._assert_format(src, expected)
 
+    def test_should_cache_configuration(self) -> None:
+        self.environment.create_or_replace_pyproject_toml(
+            "[tool.black]\nline-length = 10"
+        )
+        formatter = blackutil.BlackCodeFormatter()
+        directory = Path(self.environment.get_working_directory())
+
+        with mock.patch("toml.load", wraps=blackutil.toml.load) as load:
+            formatter.format_code("x=1\n", directory)
+            formatted = formatter.format_code("x=1\n", directory)
+
+        self.assertEqual(formatted, "x = 1\n")
+        self.assertEqual(load.call_count, 1)
+
+    def test_should_reload_changed_configuration(self) -> None:
+        self.environment.create_or_replace_pyproject_toml(
+            "[tool.black]\nline-length = 10"
+        )
+        formatter = blackutil.BlackCodeFormatter()
+        directory = Path(self.environment.get_working_directory())
+        src = "x, y = 123, 124\n"
+        self.assertEqual(
+            formatter.format_code(src, directory), "x, y = (\n    123,\n    124,\n)\n"
+        )
+
+        self.environment.create_or_replace_pyproject_toml(
+            "[tool.black]\nline-length = 88"
+        )
+
+        self.assertEqual(formatter.format_code(src, directory), src)
+
     def _assert_format(self, src: str, expected: str) -> None:
         new_block = blackutil.fix_code(src, self.environment.get_working_directory())
         self.assertEqual(new_block, expected)
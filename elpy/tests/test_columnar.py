@@ -0,0 +1,61 @@
+"""Tests for the elpy.columnar module."""
+
+import unittest
+
+from elpy import columnar
+
+
+class TestEncode(unittest.TestCase):
+    def test_should_encode_columns(self):
+        rows = [
+            {"name": "foo", "filename": "a.py", "offset": 3},
+            {"name": "foo", "filename": "b.py", "offset": 9},
+            {"name": "foo", "filename": "a.py", "offset": 12},
+        ]
+
+        self.assertEqual(
+            {
+                "length": 3,
+                "columns": {
+                    "name": ["foo", "foo", "foo"],
+                    "filename": [0, 1, 0],
+                    "offset": [3, 9, 12],
+                },
+                "strings": ["a.py", "b.py"],
+                "interned": ["filename"],
+            },
+            columnar.encode(rows, interned=("filename",)),
+        )
+
+    def test_should_fill_missing_keys_with_none(self):
+        rows = [{"name": "foo", "filename": None}, {"meta": "bar"}]
+
+        encoded = columnar.encode(rows, interned=("filename",))
+
+        self.assertEqual(
+            {
+                "name": ["foo", None],
+                "filename": [None, None],
+                "meta": [None, "bar"],
+            },
+            encoded["columns"],
+        )
+        self.assertEqual([], encoded["strings"])
+
+    def test_should_encode_empty_list(self):
+        self.assertEqual(
+            {"length": 0, "columns": {}, "strings": [], "interned": []},
+            columnar.encode([]),
+        )
+
+
+class TestDecode(unittest.TestCase):
+    def test_should_return_rows(self):
+        rows = [
+            {"name": "foo", "filename": "a.py", "offset": 3},
+            {"name": "bar", "filename": "a.py", "offset": 9},
+        ]
+
+        self.assertEqual(
+            rows, columnar.decode(columnar.encode(rows, interned=("filename",)))
+        )
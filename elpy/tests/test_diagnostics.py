@@ -0,0 +1,280 @@
+"""Tests for the elpy.diagnostics module."""
+
+import unittest
+from unittest import mock
+
+from elpy import diagnostics
+
+
+class DiagnosticsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = diagnostics.DiagnosticsCache()
+
+    def get_diagnostics(self, source, filename="test.py"):
+        return [
+            (diagnostic["line"], diagnostic["code"], diagnostic["message"])
+            for diagnostic in self.cache.get_diagnostics(filename, source)
+        ]
+
+
+class TestSyntaxErrors(DiagnosticsTestCase):
+    def test_should_report_syntax_errors(self):
+        self.assertEqual(
+            self.get_diagnostics("x = 1\ndef foo(:\n    pass\n"),
+            [(2, "E999", "SyntaxError: invalid syntax")],
+        )
+
+    def test_should_report_syntax_errors_that_need_context(self):
+        self.assertEqual(
+            self.get_diagnostics("def foo():\n    nonlocal x\n"),
+            [(2, "E999", "SyntaxError: no binding for nonlocal 'x' found")],
+        )
+
+    def test_should_not_report_syntax_parso_does_not_support(self):
+        source = (
+            "def foo(command):\n"
+            "    match command:\n"
+            "        case [first, *rest]:\n"
+            "            return first, rest\n"
+            "        case {'key': value}:\n"
+            "            pass\n"
+            "    return value\n"
+            "print(undefined)\n"
+        )
+
+        self.assertEqual(
+            self.get_diagnostics(source), [(8, "F821", "undefined name 'undefined'")]
+        )
+
+    def test_should_count_uses_in_syntax_parso_does_not_support(self):
+        source = (
+            "import os\n"
+            "def foo(command):\n"
+            "    x = command.strip()\n"
+            "    y = 1\n"
+            "    match x:\n"
+            "        case 'a':\n"
+            "            return os.sep\n"
+        )
+
+        self.assertEqual(
+            self.get_diagnostics(source),
+            [(4, "F841", "local variable 'y' is assigned to but never used")],
+        )
+
+
+class TestUndefinedNames(DiagnosticsTestCase):
+    def test_should_report_undefined_names(self):
+        self.assertEqual(
+            self.get_diagnostics("print(foo)\n"),
+            [(1, "F821", "undefined name 'foo'")],
+        )
+
+    def test_should_resolve_names_in_enclosing_scopes(self):
+        source = (
+            "import os\n"
+            "X = 1\n"
+            "def foo(a, b=X, *args, **kwargs):\n"
+            "    y = a\n"
+            "    def bar():\n"
+            "        return os, y, args, kwargs, b, foo, later\n"
+            "    return bar\n"
+            "later = [x for x in range(3)]\n"
+        )
+
+        self.assertEqual(self.get_diagnostics(source), [])
+
+    def test_should_ignore_attributes_and_keyword_arguments(self):
+        self.assertEqual(self.get_diagnostics("x = 1\nx.foo(bar=x.baz)\n"), [])
+
+    def test_should_not_resolve_class_names_in_methods(self):
+        source = (
+            "class Foo:\n"
+            "    x = 1\n"
+            "    y = x\n"
+            "    def bar(self, default=x):\n"
+            "        return x\n"
+        )
+
+        self.assertEqual(
+            self.get_diagnostics(source), [(5, "F821", "undefined name 'x'")]
+        )
+
+    def test_should_resolve_names_declared_global(self):
+        source = "def foo():\n    global X\n    X = 1\nprint(X)\n"
+
+        self.assertEqual(self.get_diagnostics(source), [])
+
+    def test_should_ignore_conversions_in_f_strings(self):
+        self.assertEqual(self.get_diagnostics('x = 1\nprint(f"{x!r} {x!s}")\n'), [])
+
+    def test_should_resolve_assignment_expressions(self):
+        source = (
+            "def foo(s):\n"
+            "    if len(n := s.split()) > 1:\n"
+            "        return n\n"
+            "    if (m := len(s)) > 1:\n"
+            "        return [y for x in s if (y := x)], m\n"
+        )
+
+        self.assertEqual(self.get_diagnostics(source), [])
+
+    def test_should_resolve_class_cell_in_methods(self):
+        source = (
+            "class Foo:\n"
+            "    def bar(self):\n"
+            "        return __class__\n"
+            "    def baz(self):\n"
+            "        return lambda: __class__\n"
+            "def qux():\n"
+            "    return __class__\n"
+        )
+
+        self.assertEqual(
+            self.get_diagnostics(source), [(7, "F821", "undefined name '__class__'")]
+        )
+
+    def test_should_not_report_anything_with_star_imports(self):
+        self.assertEqual(self.get_diagnostics("from os import *\nprint(path)\n"), [])
+
+
+class TestUnusedImports(DiagnosticsTestCase):
+    def test_should_report_unused_imports(self):
+        source = "import os\nimport sys\nfrom json import dumps as d\nprint(sys)\n"
+
+        self.assertEqual(
+            self.get_diagnostics(source),
+            [
+                (1, "F401", "'os' imported but unused"),
+                (3, "F401", "'d' imported but unused"),
+            ],
+        )
+
+    def test_should_count_uses_in_functions(self):
+        source = "import os\ndef foo():\n    return os\n"
+
+        self.assertEqual(self.get_diagnostics(source), [])
+
+    def test_should_count_names_in_all(self):
+        source = "from os import path\n__all__ = ['path']\n"
+
+        self.assertEqual(self.get_diagnostics(source), [])
+
+    def test_should_count_additions_to_all(self):
+        source = (
+            "from os import path, sep\n"
+            "from json import dumps, loads\n"
+            "__all__ = ['path']\n"
+            "__all__ += ['sep']\n"
+            "__all__.extend(['dumps'])\n"
+            "__all__.append('loads')\n"
+        )
+
+        self.assertEqual(self.get_diagnostics(source), [])
+
+    def test_should_count_imports_rebound_when_they_fail(self):
+        source = (
+            "try:\n"
+            "    from json import loads\n"
+            "except ImportError:\n"
+            "    loads = None\n"
+            "try:\n"
+            "    from json import dumps\n"
+            "except (ModuleNotFoundError, OSError):\n"
+            "    def dumps(value):\n"
+            "        pass\n"
+            "try:\n"
+            "    import os\n"
+            "except OSError:\n"
+            "    os = None\n"
+        )
+
+        self.assertEqual(
+            self.get_diagnostics(source), [(11, "F401", "'os' imported but unused")]
+        )
+
+    def test_should_count_uses_in_string_annotations(self):
+        source = (
+            "from __future__ import annotations\n"
+            "from typing import Dict, List\n"
+            "x: 'List[int]' = []\n"
+            "def foo(a: 'Dict[str, int]'):\n"
+            "    pass\n"
+        )
+
+        self.assertEqual(self.get_diagnostics(source), [])
+
+    def test_should_not_report_imports_in_packages(self):
+        self.assertEqual(self.get_diagnostics("import os\n", "pkg/__init__.py"), [])
+
+    def test_should_report_unused_imports_in_functions(self):
+        source = "def foo():\n    import os\n"
+
+        self.assertEqual(
+            self.get_diagnostics(source), [(2, "F401", "'os' imported but unused")]
+        )
+
+
+class TestUnusedVariables(DiagnosticsTestCase):
+    def test_should_report_unused_local_variables(self):
+        source = "def foo():\n    x = 1\n    y = 2\n    a, b = 1, 2\n    return y\n"
+
+        self.assertEqual(
+            self.get_diagnostics(source),
+            [(2, "F841", "local variable 'x' is assigned to but never used")],
+        )
+
+    def test_should_count_uses_in_nested_functions(self):
+        source = (
+            "def foo():\n"
+            "    x = 1\n"
+            "    def bar():\n"
+            "        nonlocal x\n"
+            "        x = 2\n"
+            "    return bar\n"
+        )
+
+        self.assertEqual(self.get_diagnostics(source), [])
+
+    def test_should_not_report_module_variables(self):
+        self.assertEqual(self.get_diagnostics("x = 1\n"), [])
+
+
+class TestCaching(DiagnosticsTestCase):
+    def test_should_only_check_changed_functions(self):
+        source = "def foo():\n    return 1\n\ndef bar():\n    return 2\n"
+        self.get_diagnostics(source)
+
+        with mock.patch(
+            "elpy.diagnostics._check_function", wraps=diagnostics._check_function
+        ) as check_function:
+            self.get_diagnostics(source.replace("return 2", "return 3"))
+
+        self.assertEqual(check_function.call_count, 1)
+        self.assertEqual(check_function.call_args[0][0].name.value, "bar")
+
+    def test_should_move_cached_results_with_their_function(self):
+        source = "def foo():\n    x = 1\n    return y\n"
+        self.get_diagnostics(source)
+
+        self.assertEqual(
+            self.get_diagnostics("import os\n\n" + source),
+            [
+                (1, "F401", "'os' imported but unused"),
+                (4, "F841", "local variable 'x' is assigned to but never used"),
+                (5, "F821", "undefined name 'y'"),
+            ],
+        )
+
+    def test_should_resolve_cached_free_names_again(self):
+        source = "def foo():\n    return y\n"
+        self.get_diagnostics(source)
+
+        self.assertEqual(self.get_diagnostics(source + "y = 1\n"), [])
+
+    def test_should_limit_number_of_cached_functions(self):
+        self.cache.size = 1
+
+        self.get_diagnostics("def foo():\n    pass\ndef bar():\n    pass\n")
+
+        self.assertEqual(len(self.cache._functions), 1)
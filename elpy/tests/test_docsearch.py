@@ -0,0 +1,213 @@
+"""Tests for the elpy.docsearch module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from elpy import docsearch
+
+
+class FakeEnvironment:
+    def __init__(self, sys_path):
+        self.sys_path = sys_path
+
+    def get_sys_path(self):
+        return self.sys_path
+
+
+class DocSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="elpy-test-")
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.project_root = os.path.join(self.tempdir, "project")
+        self.site_packages = os.path.join(self.tempdir, "site-packages")
+        self.cache_directory = os.path.join(self.tempdir, "cache")
+        self.environment = FakeEnvironment([self.site_packages])
+        os.makedirs(self.project_root)
+        os.makedirs(self.site_packages)
+
+    def write(self, *path, source=""):
+        path = os.path.join(self.tempdir, *path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(source)
+        return path
+
+    def install(self, name, version, files):
+        for filename, source in files.items():
+            self.write("site-packages", filename, source=source)
+        dist_info = "{0}-{1}.dist-info".format(name, version)
+        self.write(
+            "site-packages",
+            dist_info,
+            "METADATA",
+            source="Metadata-Version: 2.1\nName: {0}\nVersion: {1}\n".format(
+                name, version
+            ),
+        )
+        self.write(
+            "site-packages",
+            dist_info,
+            "RECORD",
+            source="".join("{0},,\n".format(filename) for filename in files),
+        )
+
+    def build(self):
+        index = docsearch.DocSearchIndex(
+            self.project_root,
+            self.environment,
+            cache_directory=self.cache_directory,
+            idle_delay=0,
+        )
+        index.run()
+        return index
+
+    def names(self, index, query):
+        return [hit["name"] for hit in index.search(query)]
+
+
+class TestDocSearchIndex(DocSearchTestCase):
+    def test_should_find_project_docstrings(self):
+        self.write(
+            "project",
+            "shapes.py",
+            source='"""Geometric shapes."""\n'
+            "class Circle:\n"
+            '    """A round shape with a radius."""\n'
+            "    def area(self):\n"
+            '        """Compute the area of the circle."""\n'
+            "def _hidden():\n"
+            '    """A round secret."""\n',
+        )
+
+        index = self.build()
+
+        self.assertTrue(index.done.is_set())
+        self.assertEqual(
+            ["shapes.Circle", "shapes.Circle.area"], self.names(index, "round circle")
+        )
+        self.assertEqual(
+            [
+                {
+                    "name": "shapes",
+                    "kind": "module",
+                    "summary": "Geometric shapes.",
+                    "score": mock.ANY,
+                }
+            ],
+            index.search("geometric"),
+        )
+
+    def test_should_rank_rare_terms_higher(self):
+        self.write(
+            "project",
+            "a.py",
+            source='def one():\n    """Parse the input."""\n'
+            'def two():\n    """Parse the input."""\n'
+            'def three():\n    """Tokenize the input."""\n',
+        )
+
+        index = self.build()
+
+        self.assertEqual("a.three", self.names(index, "tokenize input")[0])
+
+    def test_should_index_installed_distributions(self):
+        self.install(
+            "fancylib",
+            "1.0",
+            {
+                "fancylib/__init__.py": '"""Fancy things."""\n',
+                "fancylib/colors.py": 'def blend():\n    """Blend two colors."""\n',
+            },
+        )
+
+        index = self.build()
+
+        self.assertEqual(["fancylib.colors.blend"], self.names(index, "blend"))
+        self.assertEqual(["fancylib"], self.names(index, "fancy"))
+
+    def test_should_query_environment_before_starting(self):
+        self.install(
+            "fancylib", "1.0", {"fancylib/__init__.py": '"""Fancy things."""\n'}
+        )
+        index = docsearch.DocSearchIndex(
+            None, self.environment, cache_directory=self.cache_directory, idle_delay=0
+        )
+        self.environment.sys_path = []
+
+        index.run()
+
+        self.assertEqual(["fancylib"], self.names(index, "fancy"))
+
+    def test_should_reuse_persisted_index_of_same_version(self):
+        self.install(
+            "fancylib",
+            "1.0",
+            {"fancylib/__init__.py": '"""Fancy things."""\n'},
+        )
+        self.build()
+
+        with mock.patch.object(docsearch, "extract_docs") as extract_docs:
+            index = self.build()
+
+        self.assertFalse(extract_docs.called)
+        self.assertEqual(["fancylib"], self.names(index, "fancy"))
+
+    def test_should_reindex_new_versions(self):
+        self.install(
+            "fancylib", "1.0", {"fancylib/__init__.py": '"""Fancy things."""\n'}
+        )
+        self.build()
+        shutil.rmtree(os.path.join(self.site_packages, "fancylib-1.0.dist-info"))
+        self.install(
+            "fancylib", "2.0", {"fancylib/__init__.py": '"""Plain things."""\n'}
+        )
+
+        index = self.build()
+
+        self.assertEqual(["fancylib"], self.names(index, "plain"))
+
+    def test_should_not_persist_incomplete_index(self):
+        self.install(
+            "fancylib", "1.0", {"fancylib/__init__.py": '"""Fancy things."""\n'}
+        )
+        index = docsearch.DocSearchIndex(
+            None, self.environment, cache_directory=self.cache_directory
+        )
+        index.stop()
+
+        index.run()
+
+        self.assertFalse(os.path.exists(self.cache_directory))
+
+    def test_should_return_nothing_for_empty_query(self):
+        self.write("project", "a.py", source='"""The module."""\n')
+        self.assertEqual([], self.build().search("the"))
+
+
+class TestExtractDocs(DocSearchTestCase):
+    def test_should_skip_nested_functions_and_syntax_errors(self):
+        path = self.write(
+            "project",
+            "a.py",
+            source="def outer():\n"
+            '    """Outer."""\n'
+            "    def inner():\n"
+            '        """Inner."""\n',
+        )
+        broken = self.write("project", "b.py", source="def (:\n")
+
+        self.assertEqual(
+            [("a.outer", "function", "Outer.")], docsearch.extract_docs(path, "a")
+        )
+        self.assertEqual([], docsearch.extract_docs(broken, "b"))
+
+
+class TestTokenize(unittest.TestCase):
+    def test_should_split_identifiers_and_drop_stop_words(self):
+        self.assertEqual(
+            ["read", "csv", "file", "into", "dataframe"],
+            docsearch.tokenize("Read_CSV file into the DataFrame."),
+        )
@@ -0,0 +1,90 @@
+"""Tests for the elpy.documents module."""
+
+import unittest
+from unittest import mock
+
+from elpy import documents
+
+
+class DocumentStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.store = documents.DocumentStore()
+
+
+class TestGetDocument(DocumentStoreTestCase):
+    def test_should_parse_source(self):
+        module = self.store.get_module("test.py", "def foo():\n    pass\n")
+
+        self.assertEqual([f.name.value for f in module.iter_funcdefs()], ["foo"])
+
+    def test_should_reuse_document_for_same_source(self):
+        first = self.store.get_document("test.py", "x = 1\n")
+        module = first.module
+
+        second = self.store.get_document("test.py", "x = 1\n")
+
+        self.assertIs(first, second)
+        self.assertIs(second.module, module)
+        self.assertEqual(second.version, 0)
+
+    def test_should_update_document_for_changed_source(self):
+        source = "".join("def f{0}():\n    return {0}\n\n".format(i) for i in range(50))
+        self.store.get_document("test.py", source)
+        changed = source.replace("return 25", "return 'changed'")
+
+        document = self.store.get_document("test.py", changed)
+
+        self.assertEqual(document.version, 1)
+        self.assertEqual(document.source, changed)
+        self.assertEqual(document.module.get_code(), changed)
+
+    def test_should_use_diff_parser_for_changes(self):
+        self.store.get_document("test.py", "x = 1\n")
+
+        with mock.patch.object(self.store, "_parse") as parse:
+            module = self.store.get_module("test.py", "x = 1\ny = 2\n")
+
+        self.assertFalse(parse.called)
+        self.assertEqual(module.get_code(), "x = 1\ny = 2\n")
+
+    def test_should_fall_back_to_full_parse(self):
+        self.store.get_document("test.py", "x = 1\n")
+
+        with mock.patch.object(documents, "DiffParser") as DiffParser:
+            DiffParser.side_effect = ValueError("diff parser failed")
+            module = self.store.get_module("test.py", "y = 2\n")
+
+        self.assertEqual(module.get_code(), "y = 2\n")
+
+    def test_should_keep_documents_apart(self):
+        self.store.get_document("a.py", "x = 1\n")
+        self.store.get_document("b.py", "y = 2\n")
+
+        self.assertEqual(self.store.get_module("a.py", "x = 1\n").get_code(), "x = 1\n")
+
+    def test_should_drop_least_recently_used_document(self):
+        store = documents.DocumentStore(size=1)
+        first = store.get_document("a.py", "x = 1\n")
+        store.get_document("b.py", "x = 1\n")
+
+        self.assertIsNot(store.get_document("a.py", "x = 1\n"), first)
+
+
+class TestCloseDocument(DocumentStoreTestCase):
+    def test_should_forget_document(self):
+        first = self.store.get_document("test.py", "x = 1\n")
+
+        self.store.close_document("test.py")
+
+        self.assertIsNot(self.store.get_document("test.py", "x = 1\n"), first)
+        self.store.close_document("test.py")
+        self.assertFalse(self.store.is_open("test.py"))
+
+    def test_should_know_open_documents(self):
+        self.store.get_document("test.py", "x = 1\n")
+
+        self.assertTrue(self.store.is_open("test.py"))
+        self.assertFalse(self.store.is_open("other.py"))
+
+    def test_should_ignore_unknown_document(self):
+        self.store.close_document("unknown.py")
@@ -0,0 +1,108 @@
+"""Tests for the elpy.environments module."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import jedi
+
+from elpy import environments
+
+
+class EnvironmentCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="elpy-test-cache")
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        self.cache_file = os.path.join(self.cache_dir, "environments.json")
+        self.env_path = jedi.get_default_environment().path
+        self.cache = self.make_cache()
+
+    def make_cache(self, **kwargs):
+        return environments.EnvironmentCache(cache_file=self.cache_file, **kwargs)
+
+
+class TestGetEnvironment(EnvironmentCacheTestCase):
+    def test_should_return_environment_for_path(self):
+        environment = self.cache.get_environment(self.env_path)
+
+        self.assertEqual(environment.path, self.env_path)
+
+    def test_should_reuse_pooled_environment(self):
+        first = self.cache.get_environment(self.env_path)
+        with mock.patch("jedi.create_environment") as create_environment:
+            second = self.cache.get_environment(self.env_path)
+
+        self.assertIs(first, second)
+        self.assertFalse(create_environment.called)
+
+    def test_should_store_metadata_on_disk(self):
+        environment = self.cache.get_environment(self.env_path)
+
+        with open(self.cache_file) as f:
+            data = json.load(f)
+        executable = environments.get_executable_path(self.env_path)
+        self.assertEqual(
+            data["environments"][executable]["sys_path"],
+            environment.get_sys_path(),
+        )
+
+    def test_should_restore_environment_from_disk(self):
+        environment = self.cache.get_environment(self.env_path)
+
+        with mock.patch("jedi.create_environment") as create_environment:
+            restored = self.make_cache().get_environment(self.env_path)
+
+        self.assertFalse(create_environment.called)
+        self.assertIsInstance(restored, environments.CachedEnvironment)
+        self.assertEqual(restored.version_info, environment.version_info)
+        self.assertEqual(restored.get_sys_path(), environment.get_sys_path())
+
+    def test_should_ignore_stale_metadata(self):
+        self.cache.get_environment(self.env_path)
+        with open(self.cache_file) as f:
+            data = json.load(f)
+        for info in data["environments"].values():
+            info["mtime"] -= 1
+        with open(self.cache_file, "w") as f:
+            json.dump(data, f)
+
+        restored = self.make_cache().get_environment(self.env_path)
+
+        self.assertNotIsInstance(restored, environments.CachedEnvironment)
+
+    def test_should_ignore_broken_cache_file(self):
+        with open(self.cache_file, "w") as f:
+            f.write("{not json")
+
+        environment = self.cache.get_environment(self.env_path)
+
+        self.assertEqual(environment.path, self.env_path)
+
+    def test_should_evict_least_recently_used_environment(self):
+        cache = self.make_cache(pool_size=0)
+        first = cache.get_environment(self.env_path)
+
+        second = cache.get_environment(self.env_path)
+
+        self.assertIsNot(first, second)
+
+    @mock.patch("jedi.create_environment")
+    def test_should_not_cache_missing_interpreters(self, create_environment):
+        self.cache.get_environment("/does/not/exist")
+        self.cache.get_environment("/does/not/exist")
+
+        self.assertEqual(create_environment.call_count, 2)
+        create_environment.assert_called_with("/does/not/exist", safe=False)
+
+
+class TestCachedEnvironment(EnvironmentCacheTestCase):
+    def test_should_be_usable_for_completions(self):
+        self.cache.get_environment(self.env_path)
+        environment = self.make_cache().get_environment(self.env_path)
+
+        completions = jedi.Script("import jso", environment=environment).complete()
+
+        self.assertIn("json", [c.name for c in completions])
@@ -0,0 +1,241 @@
+"""Tests for the elpy.formatting module."""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from elpy import formatting
+from elpy.rpc import Fault
+from elpy.tests.support import apply_edits
+
+SOURCE = (
+    "import os\n"  # 1
+    "\n"
+    "\n"
+    "@decorator\n"  # 4
+    "def foo():\n"
+    "    x=1\n"
+    "    return x\n"
+    "# A comment\n"  # 8
+    "y=2\n"  # 9
+    "z  =  3\n"  # 10
+)
+
+
+class TestGetStatementLines(unittest.TestCase):
+    def test_should_extend_range_to_enclosing_statement(self):
+        self.assertEqual(formatting.get_statement_lines(SOURCE, 6, 6), (4, 7))
+
+    def test_should_cover_all_statements_within_range(self):
+        self.assertEqual(formatting.get_statement_lines(SOURCE, 7, 9), (4, 9))
+
+    def test_should_return_none_without_statements(self):
+        self.assertIsNone(formatting.get_statement_lines(SOURCE, 2, 3))
+
+    def test_should_handle_missing_final_newline(self):
+        self.assertEqual(formatting.get_statement_lines("x = 1\ny=2", 2, 2), (2, 2))
+
+
+class TestGetEdits(unittest.TestCase):
+    def test_should_return_no_edits_without_changes(self):
+        self.assertEqual(formatting.get_edits("x = 1\n", "x = 1\n"), [])
+
+    def test_should_leave_out_unchanged_lines(self):
+        old = "a = 1\nb=2\nc = 3\n"
+        new = "a = 1\nb = 2\nc = 3\n"
+
+        edits = formatting.get_edits(old, new, offset=10)
+
+        self.assertEqual(edits, [[16, 4, "b = 2\n"]])
+
+    def test_should_return_an_edit_per_changed_region(self):
+        old = "a=1\nb = 2\nc = 3\nd=4\n"
+        new = "a = 1\nb = 2\nc = 3\nd = 4\n"
+
+        edits = formatting.get_edits(old, new)
+
+        self.assertEqual(edits, [[0, 4, "a = 1\n"], [16, 4, "d = 4\n"]])
+
+    def test_should_handle_added_lines(self):
+        old = "a = 1\nb = 2\n"
+        new = "a = 1\n\n\nb = 2\n"
+
+        edits = formatting.get_edits(old, new)
+
+        self.assertEqual(apply_edits(old, edits), new)
+
+    def test_should_replace_long_changes_in_one_edit(self):
+        old = "a = 1\nb=2\nc=3\nd=4\ne = 5\n"
+        new = "a = 1\nb = 2\nc=3\nd = 4\ne = 5\n"
+
+        with mock.patch.object(formatting, "MAX_DIFF_LINES", 2):
+            edits = formatting.get_edits(old, new)
+
+        self.assertEqual(edits, [[6, 12, "b = 2\nc=3\nd = 4\n"]])
+
+    def test_should_diff_many_similar_lines_quickly(self):
+        old = "".join("def f{0}( a ):\n    return a\n\n".format(i) for i in range(5000))
+        new = old.replace("( a )", "(a)")
+
+        edits = formatting.get_edits(old, new)
+
+        self.assertEqual(apply_edits(old, edits), new)
+
+
+class TestFixCodeRange(unittest.TestCase):
+    def fix_code(self, code):
+        self.formatted.append(code)
+        return code.replace("x=1", "x = 1")
+
+    def setUp(self):
+        self.formatted = []
+
+    def test_should_only_format_enclosing_statements(self):
+        edits = formatting.fix_code_range(self.fix_code, SOURCE, 6, 6)
+
+        self.assertEqual(
+            self.formatted, ["@decorator\ndef foo():\n    x=1\n    return x\n"]
+        )
+        self.assertEqual(apply_edits(SOURCE, edits), SOURCE.replace("x=1", "x = 1"))
+
+    def test_should_return_no_edits_without_statements(self):
+        self.assertEqual(formatting.fix_code_range(self.fix_code, SOURCE, 2, 3), [])
+        self.assertEqual(self.formatted, [])
+
+
+class TestFormattingCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = formatting.FormattingCache(size=4)
+        self.fix_code = mock.MagicMock(
+            side_effect=lambda code: code.replace("=", " = ")
+        )
+
+    def test_should_reuse_results(self):
+        self.assertEqual(self.cache.fix_code(self.fix_code, "f", 1, "x=1\n"), "x = 1\n")
+        self.assertEqual(self.cache.fix_code(self.fix_code, "f", 1, "x=1\n"), "x = 1\n")
+
+        self.assertEqual(self.fix_code.call_count, 1)
+
+    def test_should_know_formatted_code_is_unchanged(self):
+        self.cache.fix_code(self.fix_code, "f", 1, "x=1\n")
+
+        self.assertEqual(
+            self.cache.fix_code(self.fix_code, "f", 1, "x = 1\n"), "x = 1\n"
+        )
+        self.assertEqual(self.fix_code.call_count, 1)
+
+    def test_should_distinguish_formatters_and_configurations(self):
+        self.cache.fix_code(self.fix_code, "f", 1, "x=1\n")
+        self.cache.fix_code(self.fix_code, "g", 1, "x=1\n")
+        self.cache.fix_code(self.fix_code, "f", 2, "x=1\n")
+
+        self.assertEqual(self.fix_code.call_count, 3)
+
+    def test_should_limit_size(self):
+        for index in range(10):
+            self.cache.fix_code(self.fix_code, "f", 1, "x={0}\n".format(index))
+
+        self.assertEqual(len(self.cache._results), 4)
+
+    def test_should_not_cache_errors(self):
+        self.fix_code.side_effect = ValueError()
+
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.cache.fix_code(self.fix_code, "f", 1, "x=1\n")
+
+        self.assertEqual(self.fix_code.call_count, 2)
+
+
+class TestFileFormatter(unittest.TestCase):
+    def setUp(self):
+        self.formatter = formatting.FileFormatter(processes=1)
+        self.addCleanup(self.formatter.shutdown)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.results = []
+
+    def write(self, filename, source):
+        path = os.path.join(self.directory, filename)
+        with open(path, "w") as f:
+            f.write(source)
+        return path
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def format_files(self, paths, get_config_key=lambda formatter, directory: 1):
+        self.results = []
+        return self.formatter.format_files(
+            paths, "black", get_config_key, self.results.append
+        )
+
+    def test_should_format_files_in_place(self):
+        ugly = self.write("ugly.py", "x=1\n")
+        pretty = self.write("pretty.py", "x = 1\n")
+        broken = self.write("broken.py", "x = \n")
+
+        counts = self.format_files([ugly, pretty, broken])
+
+        self.assertEqual(counts, {"formatted": 1, "unchanged": 1, "error": 1})
+        self.assertEqual(self.read(ugly), "x = 1\n")
+        statuses = {result["filename"]: result["status"] for result in self.results}
+        self.assertEqual(
+            statuses, {ugly: "formatted", pretty: "unchanged", broken: "error"}
+        )
+
+    def test_should_skip_files_formatted_before(self):
+        path = self.write("ugly.py", "x=1\n")
+        self.format_files([path])
+
+        with mock.patch.object(
+            self.formatter, "_get_executor", wraps=self.formatter._get_executor
+        ) as get_executor:
+            counts = self.format_files([path])
+            os.utime(path, ns=(0, 0))
+            self.format_files([path])
+
+        self.assertEqual(counts["unchanged"], 1)
+        self.assertFalse(get_executor.called)
+
+    def test_should_format_changed_files_again(self):
+        path = self.write("ugly.py", "x=1\n")
+        self.format_files([path])
+        self.write("ugly.py", "x=2\n")
+
+        self.assertEqual(self.format_files([path])["formatted"], 1)
+
+    def test_should_report_errors_looking_up_the_configuration(self):
+        path = self.write("ugly.py", "x=1\n")
+
+        def get_config_key(formatter, directory):
+            raise Fault("black is not installed", code=400)
+
+        counts = self.format_files([path], get_config_key)
+
+        self.assertEqual(counts, {"formatted": 0, "unchanged": 0, "error": 1})
+        self.assertEqual(
+            self.results,
+            [
+                {
+                    "filename": path,
+                    "status": "error",
+                    "message": "black is not installed",
+                }
+            ],
+        )
+        self.assertEqual(self.read(path), "x=1\n")
+
+    def test_should_format_again_when_config_changes(self):
+        path = self.write("pretty.py", "x = 1\n")
+        self.format_files([path])
+
+        with mock.patch.object(
+            self.formatter, "_get_executor", wraps=self.formatter._get_executor
+        ) as get_executor:
+            self.format_files([path], lambda formatter, directory: 2)
+
+        self.assertTrue(get_executor.called)
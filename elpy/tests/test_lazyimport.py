@@ -0,0 +1,39 @@
+"""Tests for the elpy.lazyimport module."""
+
+import sys
+import unittest
+from unittest import mock
+
+from elpy import lazyimport
+
+
+class TestLazyModule(unittest.TestCase):
+    def test_should_not_import_before_use(self):
+        with mock.patch("importlib.import_module") as import_module:
+            lazyimport.LazyModule("elpy.rpc")
+
+        self.assertFalse(import_module.called)
+
+    def test_should_import_on_attribute_access(self):
+        module = lazyimport.LazyModule("elpy.rpc")
+
+        self.assertIs(module.Fault, sys.modules["elpy.rpc"].Fault)
+
+    def test_should_record_import_time(self):
+        module = lazyimport.LazyModule("elpy.json_encoder")
+
+        module.load()
+
+        self.assertIn("elpy.json_encoder", lazyimport.import_times)
+
+    def test_should_be_true_for_importable_module(self):
+        self.assertTrue(lazyimport.LazyModule("elpy.rpc"))
+
+    def test_should_be_false_for_missing_module(self):
+        self.assertFalse(lazyimport.LazyModule("elpy.does_not_exist"))
+
+    def test_should_raise_import_error_on_use_of_missing_module(self):
+        module = lazyimport.LazyModule("elpy.does_not_exist")
+
+        with self.assertRaises(ImportError):
+            module.anything
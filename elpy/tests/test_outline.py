@@ -0,0 +1,122 @@
+"""Tests for the elpy.outline module."""
+
+import unittest
+from unittest import mock
+
+from elpy import outline
+
+
+class OutlineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = outline.OutlineCache()
+
+    def get_outline(self, source):
+        return self.cache.get_outline("test.py", source)
+
+    def summarize(self, entries):
+        return [
+            (entry["kind"], entry["name"], self.summarize(entry["children"]))
+            for entry in entries
+        ]
+
+
+class TestGetOutline(OutlineTestCase):
+    def test_should_return_nested_definitions(self):
+        source = (
+            "X = 1\n"
+            "class Foo(object):\n"
+            "    y = 2\n"
+            "    def bar(self):\n"
+            "        z = 3\n"
+            "        def baz():\n"
+            "            pass\n"
+        )
+
+        self.assertEqual(
+            self.summarize(self.get_outline(source)),
+            [
+                ("assignment", "X", []),
+                (
+                    "class",
+                    "Foo",
+                    [
+                        ("assignment", "y", []),
+                        ("function", "bar", [("function", "baz", [])]),
+                    ],
+                ),
+            ],
+        )
+
+    def test_should_return_ranges(self):
+        source = "import os\n\n@decorator\ndef foo():\n    pass\n"
+
+        [entry] = self.get_outline(source)
+
+        self.assertEqual(entry["line"], 4)
+        self.assertEqual(
+            source[entry["start"] : entry["end"]],
+            "@decorator\ndef foo():\n    pass\n",
+        )
+
+    def test_should_include_async_functions(self):
+        source = "class Foo:\n    async def bar(self):\n        pass\n"
+
+        [entry] = self.get_outline(source)
+        [child] = entry["children"]
+
+        self.assertEqual(child["name"], "bar")
+        self.assertTrue(source[child["start"] :].startswith("async def"))
+
+    def test_should_find_definitions_in_blocks(self):
+        source = (
+            "try:\n"
+            "    import json\n"
+            "except ImportError:\n"
+            "    json = None\n"
+            "if True:\n"
+            "    def foo():\n"
+            "        pass\n"
+        )
+
+        self.assertEqual(
+            self.summarize(self.get_outline(source)),
+            [("assignment", "json", []), ("function", "foo", [])],
+        )
+
+    def test_should_list_all_assigned_names(self):
+        self.assertEqual(
+            self.summarize(self.get_outline("a, b = 1, 2\n")),
+            [("assignment", "a", []), ("assignment", "b", [])],
+        )
+
+    def test_should_not_fail_for_syntax_errors(self):
+        source = "def foo(:\n    pass\ndef bar():\n    pass\n"
+
+        self.assertIn(("function", "bar", []), self.summarize(self.get_outline(source)))
+
+    def test_should_not_fail_for_empty_source(self):
+        self.assertEqual(self.get_outline(""), [])
+
+
+class TestOutlineCache(OutlineTestCase):
+    def test_should_cache_outline_for_same_source(self):
+        first = self.get_outline("x = 1\n")
+        with mock.patch.object(outline, "get_outline") as get_outline:
+            second = self.get_outline("x = 1\n")
+
+        self.assertIs(first, second)
+        self.assertFalse(get_outline.called)
+
+    def test_should_recompute_outline_for_changed_source(self):
+        self.get_outline("x = 1\n")
+
+        self.assertEqual(
+            self.summarize(self.get_outline("y = 1\n")), [("assignment", "y", [])]
+        )
+
+    def test_should_drop_least_recently_used_outline(self):
+        cache = outline.OutlineCache(size=1)
+        first = cache.get_outline("test.py", "x = 1\n")
+        cache.get_outline("other.py", "x = 1\n")
+
+        self.assertIsNot(cache.get_outline("test.py", "x = 1\n"), first)
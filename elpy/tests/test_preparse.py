@@ -0,0 +1,190 @@
+"""Tests for the elpy.preparse module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import parso
+from parso.cache import parser_cache
+
+from elpy import preparse
+
+
+class FakeEnvironment:
+    def __init__(self, sys_path):
+        self.sys_path = sys_path
+
+    def get_grammar(self):
+        return parso.load_grammar()
+
+    def get_sys_path(self):
+        return self.sys_path
+
+
+class PreparserTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="elpy-test-")
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.project_root = os.path.join(self.tempdir, "project")
+        self.site_packages = os.path.join(self.tempdir, "site-packages")
+        self.environment = FakeEnvironment([self.site_packages])
+        cache_directory = os.path.join(self.tempdir, "cache")
+        patcher = mock.patch("jedi.settings.cache_directory", cache_directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, *path, source=""):
+        path = os.path.join(self.tempdir, *path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(source)
+        return path
+
+    def preparse(self, **kwargs):
+        preparser = preparse.Preparser(
+            self.project_root, self.environment, idle_delay=0, **kwargs
+        )
+        preparser.run()
+        return preparser
+
+    def assertParsed(self, path):
+        grammar = self.environment.get_grammar()
+        self.assertIn(Path(path), parser_cache.get(grammar._hashed, {}))
+
+    def assertNotParsed(self, path):
+        grammar = self.environment.get_grammar()
+        self.assertNotIn(Path(path), parser_cache.get(grammar._hashed, {}))
+
+
+class TestRun(PreparserTestCase):
+    def test_should_parse_project_files(self):
+        module = self.write("project", "pkg", "module.py", source="x = 1\n")
+        script = self.write("project", "script.py")
+
+        preparser = self.preparse()
+
+        self.assertParsed(module)
+        self.assertParsed(script)
+        self.assertEqual(preparser.parsed_files, 2)
+        self.assertTrue(preparser.done.is_set())
+
+    def test_should_skip_ignored_directories(self):
+        self.write("project", "script.py")
+        hidden = self.write("project", ".tox", "hidden.py")
+        cache = self.write("project", "__pycache__", "cached.py")
+        venv = self.write("project", "myenv", "lib", "module.py")
+        self.write("project", "myenv", "pyvenv.cfg")
+        data = self.write("project", "data", "generated.py")
+
+        self.preparse(ignored_directories=["data"])
+
+        for path in (hidden, cache, venv, data):
+            self.assertNotParsed(path)
+
+    def test_should_skip_open_files(self):
+        script = self.write("project", "script.py")
+        opened = self.write("project", "opened.py")
+
+        preparser = self.preparse(is_open=lambda path: path == opened)
+
+        self.assertParsed(script)
+        self.assertNotParsed(opened)
+        self.assertEqual(preparser.parsed_files, 1)
+
+    def test_should_not_use_the_diff_parser(self):
+        self.write("project", "script.py")
+        grammar = self.environment.get_grammar()
+
+        with mock.patch.object(
+            self.environment, "get_grammar", return_value=grammar
+        ), mock.patch.object(grammar, "parse", wraps=grammar.parse) as parse:
+            self.preparse()
+
+        self.assertFalse(parse.call_args.kwargs["diff_cache"])
+
+    def test_should_stop_after_max_files(self):
+        for name in "abc":
+            self.write("project", name + ".py")
+
+        preparser = self.preparse(max_files=2)
+
+        self.assertEqual(preparser.parsed_files, 2)
+
+    def test_should_parse_most_imported_packages(self):
+        self.write("project", "a.py", source="import common\nimport rare\n")
+        self.write("project", "b.py", source="from common.sub import x\n")
+        self.write("project", "c.py", source="import common, local\nfrom . import a\n")
+        self.write("project", "local.py")
+        common_init = self.write("site-packages", "common", "__init__.py")
+        common_sub = self.write("site-packages", "common", "sub.py")
+        rare = self.write("site-packages", "rare.py")
+        local = self.write("site-packages", "local.py")
+
+        self.preparse(max_packages=1)
+
+        self.assertParsed(common_init)
+        self.assertParsed(common_sub)
+        self.assertNotParsed(rare)
+        self.assertNotParsed(local)
+
+
+class TestPausing(PreparserTestCase):
+    def test_should_wait_while_paused(self):
+        self.write("project", "script.py")
+        preparser = preparse.Preparser(
+            self.project_root, self.environment, idle_delay=0
+        )
+        preparser.pause()
+        preparser.start()
+
+        self.assertFalse(preparser.done.wait(0.1))
+        self.assertEqual(preparser.parsed_files, 0)
+
+        preparser.resume()
+
+        self.assertTrue(preparser.done.wait(5))
+        self.assertEqual(preparser.parsed_files, 1)
+
+    def test_should_wait_for_idle_delay_after_resume(self):
+        now = [0.0]
+        preparser = preparse.Preparser(
+            self.project_root, self.environment, clock=lambda: now[0]
+        )
+        preparser.pause()
+        preparser.resume()
+
+        self.assertEqual(preparser._resume_at, 0.5)
+        now[0] = 1.0
+        self.assertTrue(preparser._wait_until_idle())
+
+    def test_should_query_environment_before_starting(self):
+        with mock.patch.object(
+            self.environment, "get_sys_path", return_value=[self.site_packages]
+        ) as get_sys_path:
+            preparser = preparse.Preparser(self.project_root, self.environment)
+            self.assertEqual(get_sys_path.call_count, 1)
+
+            preparser.pause()
+            preparser.start()
+            preparser.stop()
+            self.assertTrue(preparser.done.wait(5))
+
+        self.assertEqual(get_sys_path.call_count, 1)
+
+    def test_should_not_create_workers_without_task(self):
+        with self.assertRaises(TypeError):
+            preparse.BackgroundWorker()
+
+    def test_should_stop_while_paused(self):
+        self.write("project", "script.py")
+        preparser = preparse.Preparser(self.project_root, self.environment)
+        preparser.pause()
+        preparser.start()
+
+        preparser.stop()
+
+        self.assertTrue(preparser.done.wait(5))
+        self.assertEqual(preparser.parsed_files, 0)
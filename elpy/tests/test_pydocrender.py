@@ -0,0 +1,104 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from elpy import pydocrender
+from elpy.rpc import Fault
+
+
+class TestDocumentationRenderer(unittest.TestCase):
+    def setUp(self):
+        self.renderer = pydocrender.DocumentationRenderer()
+        self.addCleanup(self.renderer.stop)
+
+    def test_should_render_documentation(self):
+        documentation = self.renderer.render("json.dumps")
+        self.assertIn("Elpy Pydoc Documentation for function dumps", documentation)
+
+    def test_should_return_none_for_unknown_symbol(self):
+        self.assertIsNone(self.renderer.render("frob.open"))
+
+    def test_should_cache_pages_separately(self):
+        documentation = self.renderer.render("json")
+        page = self.renderer.render("json", paginate=True)
+        self.assertLess(len(page["text"]), len(documentation))
+        self.assertEqual(documentation, self.renderer.render("json"))
+
+    def test_should_cache_documentation(self):
+        documentation = self.renderer.render("json.dumps")
+        with mock.patch.object(self.renderer, "_request") as request:
+            self.assertEqual(documentation, self.renderer.render("json.dumps"))
+        self.assertFalse(request.called)
+
+    def test_should_restart_helper_after_max_renders(self):
+        self.renderer.max_renders = 1
+        self.renderer.render("json")
+        process = self.renderer._process
+        self.renderer.render("os")
+        self.assertIsNot(process, self.renderer._process)
+        self.assertIsNotNone(process.poll())
+
+    def test_should_time_out(self):
+        directory = tempfile.mkdtemp(prefix="test-elpy-pydocrender-")
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, "elpyslowmodule.py"), "w") as f:
+            f.write("import time\ntime.sleep(60)\n")
+        sys.path.insert(0, directory)
+        self.addCleanup(sys.path.remove, directory)
+        self.renderer.timeout = 1
+
+        with self.assertRaises(Fault) as cm:
+            self.renderer.render("elpyslowmodule")
+
+        self.assertIn("timed out", cm.exception.message)
+        self.renderer.timeout = 10
+        self.assertIsNotNone(self.renderer.render("json"))
+
+
+class TestRenderDocumentation(unittest.TestCase):
+    @mock.patch("pydoc.render_doc")
+    def test_should_call_pydoc(self, render_doc):
+        render_doc.return_value = "expected"
+
+        actual = pydocrender.render_documentation("open")
+
+        render_doc.assert_called_with(
+            "open", "Elpy Pydoc Documentation for %s", False, None
+        )
+        self.assertEqual("expected", actual)
+
+
+class TestRenderPaginatedDocumentation(unittest.TestCase):
+    def test_should_summarize_module(self):
+        documentation = pydocrender.render_documentation("json", paginate=True)
+
+        self.assertIn(" - Deserialize ``s``", documentation["text"])
+        self.assertNotIn("object_pairs_hook", documentation["text"])
+        self.assertEqual(
+            [
+                {"symbol": "json.decoder", "kind": "module"},
+                {"symbol": "json.encoder", "kind": "module"},
+                {"symbol": "json.scanner", "kind": "module"},
+                {"symbol": "json.tool", "kind": "module"},
+                {"symbol": "json.JSONDecodeError", "kind": "class"},
+                {"symbol": "json.JSONDecoder", "kind": "class"},
+                {"symbol": "json.JSONEncoder", "kind": "class"},
+                {"symbol": "json.dump", "kind": "function"},
+                {"symbol": "json.dumps", "kind": "function"},
+                {"symbol": "json.load", "kind": "function"},
+                {"symbol": "json.loads", "kind": "function"},
+            ],
+            documentation["sections"],
+        )
+
+    def test_should_render_other_symbols_in_full(self):
+        documentation = pydocrender.render_documentation("json.loads", paginate=True)
+
+        self.assertIn("object_pairs_hook", documentation["text"])
+        self.assertEqual([], documentation["sections"])
+
+    def test_should_return_none_for_unknown_symbol(self):
+        self.assertIsNone(pydocrender.render_documentation("frob", paginate=True))
@@ -85,3 +85,193 @@ class TestGetModules(unittest.TestCase):
             os.chmod(tmpdir, 0o755)
             shutil.rmtree(tmpdir)
             sys.path.remove(tmpdir)
+
+
+class TestModuleIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = elpy.pydocutils.ModuleIndex()
+        self.directory = tempfile.mkdtemp(prefix="test-elpy-module-index-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        for name in ("foo.py", "foobar.py", "bar.py", "_private.py"):
+            self.touch(name)
+
+    def touch(self, name):
+        with open(os.path.join(self.directory, name), "w"):
+            pass
+
+    def test_should_list_sorted_modules(self):
+        self.assertEqual(
+            ["bar", "foo", "foobar"], self.index.get_modules([self.directory])
+        )
+
+    def test_should_complete_prefix(self):
+        self.assertEqual(["foo", "foobar"], self.index.complete("fo", [self.directory]))
+        self.assertEqual([], self.index.complete("qux", [self.directory]))
+
+    def test_should_not_list_unchanged_entries_again(self):
+        self.index.get_modules([self.directory])
+        with mock.patch.object(elpy.pydocutils, "iter_modules") as iter_modules:
+            self.index.get_modules([self.directory])
+        self.assertFalse(iter_modules.called)
+
+    def test_should_list_changed_entries_again(self):
+        self.index.get_modules([self.directory])
+        self.touch("qux.py")
+        stat = os.stat(self.directory)
+        os.utime(self.directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIn("qux", self.index.get_modules([self.directory]))
+
+    def test_should_include_builtin_modules_for_sys_path(self):
+        self.assertIn("sys", self.index.get_modules())
+
+
+class TestGetStaticCompletions(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="test-elpy-static-completions-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        sys.path.insert(0, self.directory)
+        self.addCleanup(sys.path.remove, self.directory)
+        self.write(
+            "elpystaticpkg/__init__.py",
+            "from .core import Engine\n"
+            "import os.path\n"
+            "def run():\n"
+            "    pass\n"
+            "_private = 1\n",
+        )
+        self.write(
+            "elpystaticpkg/core.py",
+            "raise RuntimeError('imported')\n"
+            "class Engine:\n"
+            "    def start(self):\n"
+            "        pass\n"
+            "    class Part:\n"
+            "        pass\n"
+            "    def _stop(self):\n"
+            "        pass\n",
+        )
+
+    def write(self, name, content):
+        filename = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "w") as f:
+            f.write(content)
+
+    def test_should_list_module_without_importing(self):
+        completions = elpy.pydocutils.get_pydoc_completions("elpystaticpkg")
+        self.assertEqual(
+            [
+                "elpystaticpkg.Engine",
+                "elpystaticpkg.core",
+                "elpystaticpkg.os",
+                "elpystaticpkg.run",
+            ],
+            completions,
+        )
+        self.assertNotIn("elpystaticpkg", sys.modules)
+
+    def test_should_list_class_members(self):
+        self.assertEqual(
+            ["elpystaticpkg.core.Engine.Part", "elpystaticpkg.core.Engine.start"],
+            elpy.pydocutils.get_pydoc_completions("elpystaticpkg.core.Engine"),
+        )
+
+    def test_should_follow_imports(self):
+        self.assertEqual(
+            ["elpystaticpkg.Engine.Part", "elpystaticpkg.Engine.start"],
+            elpy.pydocutils.get_pydoc_completions("elpystaticpkg.Engine"),
+        )
+        self.assertNotIn("elpystaticpkg.core", sys.modules)
+
+    def test_should_complete_partial_names(self):
+        self.assertEqual(
+            ["elpystaticpkg.core.Engine.start"],
+            elpy.pydocutils.get_pydoc_completions("elpystaticpkg.core.Engine.st"),
+        )
+
+    def test_should_import_extension_modules(self):
+        self.write("elpystaticext" + elpy.pydocutils.EXTENSION_SUFFIXES[0], "")
+        self.assertIsNone(elpy.pydocutils.get_static_completions("elpystaticext"))
+
+    def test_should_follow_star_imports(self):
+        self.write(
+            "elpystaticstar/__init__.py",
+            "from .events import *\nfrom .tasks import *\n",
+        )
+        self.write(
+            "elpystaticstar/events.py",
+            "def get_loop():\n"
+            "    pass\n"
+            "class Loop:\n"
+            "    def run(self):\n"
+            "        pass\n",
+        )
+        self.write(
+            "elpystaticstar/tasks.py",
+            "__all__ = ['gather']\n"
+            "if True:\n"
+            "    __all__ += ['Task']\n"
+            "def gather():\n"
+            "    pass\n"
+            "def hidden():\n"
+            "    pass\n"
+            "Task = _Task = object\n"
+            "Task = object\n",
+        )
+
+        self.assertEqual(
+            [
+                "elpystaticstar.Loop",
+                "elpystaticstar.Task",
+                "elpystaticstar.events",
+                "elpystaticstar.gather",
+                "elpystaticstar.get_loop",
+                "elpystaticstar.tasks",
+            ],
+            elpy.pydocutils.get_pydoc_completions("elpystaticstar."),
+        )
+        self.assertEqual(
+            ["elpystaticstar.Loop.run"],
+            elpy.pydocutils.get_pydoc_completions("elpystaticstar.Loop"),
+        )
+        self.assertNotIn("elpystaticstar", sys.modules)
+
+    def test_should_follow_star_imports_of_the_standard_library(self):
+        with mock.patch.dict(sys.modules):
+            for name in list(sys.modules):
+                if name.partition(".")[0] == "asyncio":
+                    del sys.modules[name]
+            completions = elpy.pydocutils.get_pydoc_completions("asyncio.")
+        self.assertIn("asyncio.run", completions)
+        self.assertIn("asyncio.gather", completions)
+        self.assertIn("asyncio.Task", completions)
+
+    def test_should_import_star_imports_without_source(self):
+        with mock.patch.dict(sys.modules):
+            for name in list(sys.modules):
+                if name.partition(".")[0] == "sqlite3":
+                    del sys.modules[name]
+            completions = elpy.pydocutils.get_pydoc_completions("sqlite3.")
+        self.assertIn("sqlite3.connect", completions)
+        self.assertIn("sqlite3.Connection", completions)
+        self.assertIn("sqlite3.Binary", completions)
+
+
+class TestGetModuleVersion(unittest.TestCase):
+    def test_should_change_with_module(self):
+        directory = tempfile.mkdtemp(prefix="test-elpy-module-version-")
+        self.addCleanup(shutil.rmtree, directory)
+        sys.path.insert(0, directory)
+        self.addCleanup(sys.path.remove, directory)
+        filename = os.path.join(directory, "elpyversioned.py")
+        version = elpy.pydocutils.get_module_version("elpyversioned.foo")
+
+        with open(filename, "w") as f:
+            f.write("def foo():\n    pass\n")
+        installed = elpy.pydocutils.get_module_version("elpyversioned.foo")
+        os.utime(filename, ns=(0, 0))
+
+        self.assertNotEqual(version, installed)
+        self.assertNotEqual(
+            installed, elpy.pydocutils.get_module_version("elpyversioned.foo")
+        )
@@ -0,0 +1,168 @@
+"""Tests for the elpy.refactorings module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from elpy import refactorings
+from elpy.rpc import Fault
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RefactoringStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.store = refactorings.RefactoringStore(ttl=10, max_size=2, clock=self.clock)
+
+    def add(self, files=None, project_path="/project", renames=()):
+        """Add a complete refactoring changing files, a dict of sources."""
+        handle = self.store.add(project_path, list(renames))
+        for file_name, source in (files or {}).items():
+            self.store.add_file(handle, file_name, source, [[0, 1, "y"]])
+        self.store.finish(handle)
+        return handle
+
+
+class TestAdd(RefactoringStoreTestCase):
+    def test_should_return_handle_for_refactoring(self):
+        handle = self.add({"/project/a.py": "x = 1\n"})
+
+        stored = self.store.get(handle)
+        self.assertEqual(stored.project_path, "/project")
+        self.assertEqual(
+            stored.files["/project/a.py"],
+            refactorings.StoredFile(
+                source_hash=refactorings.source_hash("x = 1\n"), edits=[[0, 1, "y"]]
+            ),
+        )
+
+    def test_should_return_different_handles(self):
+        self.assertNotEqual(self.add(), self.add())
+
+    def test_should_drop_oldest_refactoring_when_full(self):
+        first = self.add()
+        self.add()
+        self.add()
+
+        with self.assertRaises(Fault):
+            self.store.get(first)
+
+    def test_should_ignore_files_of_dropped_refactorings(self):
+        handle = self.store.add("/project", [])
+        self.store.remove(handle)
+
+        self.store.add_file(handle, "/project/a.py", "x = 1\n", [])
+        self.store.finish(handle)
+
+
+class TestGet(RefactoringStoreTestCase):
+    def test_should_fail_for_unknown_handle(self):
+        with self.assertRaises(Fault) as cm:
+            self.store.get("unknown")
+
+        self.assertEqual(cm.exception.code, 400)
+
+    def test_should_fail_for_expired_refactoring(self):
+        handle = self.add()
+        self.clock.now = 10
+
+        with self.assertRaises(Fault):
+            self.store.get(handle)
+
+    def test_should_fail_for_removed_refactoring(self):
+        handle = self.add()
+        self.store.remove(handle)
+
+        with self.assertRaises(Fault):
+            self.store.get(handle)
+
+    def test_should_fail_for_incomplete_refactoring(self):
+        handle = self.store.add("/project", [])
+
+        with self.assertRaises(Fault):
+            self.store.get(handle)
+
+
+class TestGetStaleFiles(RefactoringStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp(prefix="elpy-test-refactorings")
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.filename = os.path.join(self.directory, "test.py")
+        with open(self.filename, "w") as f:
+            f.write("x = 1\n")
+
+    def test_should_report_nothing_for_unchanged_files(self):
+        handle = self.add({self.filename: "x = 1\n"})
+
+        self.assertEqual(self.store.get_stale_files(handle, {}), [])
+
+    def test_should_report_changed_files_on_disk(self):
+        handle = self.add({self.filename: "x = 1\n"})
+        with open(self.filename, "w") as f:
+            f.write("x = 2\n")
+
+        self.assertEqual(self.store.get_stale_files(handle, {}), [self.filename])
+
+    def test_should_prefer_given_sources(self):
+        handle = self.add({self.filename: "x = 2\n"})
+
+        self.assertEqual(
+            self.store.get_stale_files(handle, {self.filename: "x = 2\n"}), []
+        )
+
+    def test_should_report_missing_files(self):
+        missing = os.path.join(self.directory, "missing.py")
+        handle = self.add({missing: ""})
+
+        self.assertEqual(self.store.get_stale_files(handle, {}), [missing])
+
+
+class TestGetDiff(RefactoringStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.handle = self.store.add("/project", [("/project/a.py", "/project/b.py")])
+        self.store.add_file(
+            self.handle, "/project/a.py", "x = 1\nz = x\n", [[0, 1, "y"], [10, 1, "y"]]
+        )
+        self.store.finish(self.handle)
+        self.sources = {"/project/a.py": "x = 1\nz = x\n"}
+
+    def test_should_render_diff_of_file(self):
+        self.assertEqual(
+            self.store.get_diff(self.handle, self.sources, "/project/a.py"),
+            "--- a.py\n+++ a.py\n@@ -1,3 +1,3 @@\n-x = 1\n-z = x\n+y = 1\n+z = y\n",
+        )
+
+    def test_should_render_renames(self):
+        self.assertTrue(
+            self.store.get_diff(self.handle, self.sources).startswith(
+                "rename from a.py\nrename to b.py\n--- a.py\n"
+            )
+        )
+
+    def test_should_fail_for_stale_files(self):
+        with self.assertRaises(Fault) as cm:
+            self.store.get_diff(self.handle, {"/project/a.py": "x = 2\n"})
+
+        self.assertEqual(cm.exception.data, {"stale_files": ["/project/a.py"]})
+
+    def test_should_fail_for_files_not_changed(self):
+        with self.assertRaises(Fault):
+            self.store.get_diff(self.handle, self.sources, "/project/c.py")
+
+
+class TestApplyEdits(unittest.TestCase):
+    def test_should_apply_edits_in_order(self):
+        self.assertEqual(
+            refactorings.apply_edits("x = 1\nz = x\n", [[0, 1, "y"], [10, 1, "yy"]]),
+            "y = 1\nz = yy\n",
+        )
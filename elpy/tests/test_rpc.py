@@ -86,6 +86,34 @@ class TestWriteJson(TestJSONRPCServer):
             self.assertEqual(json.loads(self.read()), obj)
 
 
+class TestNotify(TestJSONRPCServer):
+    def test_should_write_notification_line(self):
+        self.rpc.notify("progress", {"done": 1})
+        self.assertEqual(
+            json.loads(self.read()),
+            {"method": "progress", "params": {"done": 1, "request_id": None}},
+        )
+
+    def test_should_include_current_request_id(self):
+        def test_method():
+            self.rpc.notify("progress", {"done": 1})
+            return "result"
+
+        self.write(json.dumps(dict(method="foo", id=23)))
+        self.rpc.rpc_foo = test_method
+        self.rpc.handle_request()
+        notification, response = self.read().splitlines()
+
+        self.assertEqual(json.loads(notification)["params"]["request_id"], 23)
+        self.assertEqual(json.loads(response), dict(id=23, result="result"))
+        self.assertIsNone(self.rpc.request_id)
+
+    def test_should_use_given_request_id(self):
+        self.rpc.notify("progress", {"done": 1}, request_id=42)
+
+        self.assertEqual(json.loads(self.read())["params"]["request_id"], 42)
+
+
 class TestHandleRequest(TestJSONRPCServer):
     def test_should_fail_if_json_does_not_contain_a_method(self):
         self.write(json.dumps(dict(params=[], id=23)))
@@ -2,13 +2,18 @@
 
 """Tests for the elpy.server module"""
 
+import io
+import json
 import os
+import sys
 import tempfile
+import time
 import unittest
 from unittest import mock
 
-from elpy import server
-from elpy.tests.support import BackendTestCase
+from elpy import formatting, server
+from elpy.rpc import Fault
+from elpy.tests.support import apply_edits
 
 
 class ServerTestCase(unittest.TestCase):
@@ -42,6 +47,22 @@ class TestRPCEcho(ServerTestCase):
         self.assertEqual(("hello", "world"), self.srv.rpc_echo("hello", "world"))
 
 
+class TestRPCGetImportTimes(ServerTestCase):
+    def test_should_return_import_times_of_lazy_modules(self):
+        server.jedibackend.load()
+
+        import_times = self.srv.rpc_get_import_times()
+
+        self.assertIn("elpy.jedibackend", import_times)
+
+
+class TestWarmUp(unittest.TestCase):
+    def test_should_import_jedi_backend(self):
+        server.warm_up()
+
+        self.assertIsNotNone(server.jedibackend._module)
+
+
 class TestRPCInit(ServerTestCase):
     @mock.patch("elpy.jedibackend.JediBackend")
     def test_should_set_project_root(self, JediBackend):
@@ -92,6 +113,118 @@ class TestRPCInit(ServerTestCase):
 
         self.assertIsNone(self.srv.backend)
 
+    @mock.patch("elpy.preparse.Preparser")
+    @mock.patch("elpy.jedibackend.JediBackend")
+    def test_should_not_preparse_by_default(self, JediBackend, Preparser):
+        self.srv.rpc_init(
+            {"project_root": "/project/root", "environment": "/project/env"}
+        )
+
+        self.assertFalse(Preparser.called)
+        self.assertIsNone(self.srv.preparser)
+
+    @mock.patch("elpy.preparse.Preparser")
+    @mock.patch("elpy.jedibackend.JediBackend")
+    def test_should_start_preparser_if_asked_to(self, JediBackend, Preparser):
+        self.srv.rpc_init(
+            {
+                "project_root": "/project/root",
+                "environment": "/project/env",
+                "preparse": True,
+                "ignored_directories": ["data"],
+            }
+        )
+
+        Preparser.assert_called_with(
+            "/project/root",
+            JediBackend.return_value.environment,
+            ["data"],
+            is_open=self.srv.documents.is_open,
+        )
+        Preparser.return_value.start.assert_called_with()
+
+    @mock.patch("elpy.preparse.Preparser")
+    @mock.patch("elpy.jedibackend.JediBackend")
+    def test_should_stop_previous_preparser(self, JediBackend, Preparser):
+        options = {
+            "project_root": "/project/root",
+            "environment": "/project/env",
+            "preparse": True,
+        }
+        self.srv.rpc_init(options)
+        first_preparser = self.srv.preparser
+
+        self.srv.rpc_init(dict(options, preparse=False))
+
+        first_preparser.stop.assert_called_with()
+        self.assertIsNone(self.srv.preparser)
+
+
+class TestRPCSearchDocs(ServerTestCase):
+    @mock.patch("elpy.docsearch.DocSearchIndex")
+    def test_should_start_index_on_first_search(self, DocSearchIndex):
+        index = DocSearchIndex.return_value
+        index.search.return_value = [{"name": "json.loads"}]
+        index.done.is_set.return_value = False
+
+        result = self.srv.rpc_search_docs("parse json", 5)
+
+        DocSearchIndex.assert_called_once_with(None, None, ())
+        index.start.assert_called_once_with()
+        index.search.assert_called_with("parse json", 5)
+        self.assertEqual(
+            {"results": [{"name": "json.loads"}], "complete": False}, result
+        )
+
+        self.srv.rpc_search_docs("parse json")
+        self.assertEqual(1, DocSearchIndex.call_count)
+
+    @mock.patch("elpy.docsearch.DocSearchIndex")
+    @mock.patch("elpy.jedibackend.JediBackend")
+    def test_should_start_index_if_asked_to(self, JediBackend, DocSearchIndex):
+        options = {
+            "project_root": "/project/root",
+            "environment": "/project/env",
+            "docsearch": True,
+            "ignored_directories": ["data"],
+        }
+        self.srv.rpc_init(options)
+
+        DocSearchIndex.assert_called_with(
+            "/project/root", JediBackend.return_value.environment, ["data"]
+        )
+        DocSearchIndex.return_value.start.assert_called_with()
+
+        self.srv.rpc_init(dict(options, docsearch=False))
+
+        DocSearchIndex.return_value.stop.assert_called_with()
+        self.assertIsNone(self.srv.doc_index)
+
+
+class TestPreparserPausing(unittest.TestCase):
+    def test_should_pause_preparser_while_handling_requests(self):
+        stdin = io.StringIO('{"id": 1, "method": "echo", "params": []}\n')
+        srv = server.ElpyRPCServer(stdin, io.StringIO())
+        srv.preparser = mock.MagicMock()
+        srv.rpc_echo = mock.MagicMock(
+            side_effect=lambda: srv.preparser.resume.assert_not_called()
+        )
+
+        srv.handle_request()
+
+        srv.preparser.pause.assert_called_once_with()
+        srv.preparser.resume.assert_called_once_with()
+
+    def test_should_pause_doc_index_while_handling_requests(self):
+        stdin = io.StringIO('{"id": 1, "method": "echo", "params": []}\n')
+        srv = server.ElpyRPCServer(stdin, io.StringIO())
+        srv.doc_index = mock.MagicMock()
+
+        srv.handle_request()
+
+        srv.doc_index.pause.assert_called_once_with()
+        srv.doc_index.resume.assert_called_once_with()
+
 
 class TestRPCGetCalltip(BackendCallTestCase):
     def test_should_call_backend(self):
@@ -112,32 +245,26 @@ class TestRPCGetCompletions(BackendCallTestCase):
             [], self.srv.rpc_get_completions("filname", "source", "offset")
         )
 
-    def test_should_sort_results(self):
+    def test_should_encode_columns_if_asked_to(self):
         with mock.patch.object(self.srv, "backend") as backend:
             backend.rpc_get_completions.return_value = [
-                {"name": "_e"},
-                {"name": "__d"},
-                {"name": "c"},
-                {"name": "B"},
-                {"name": "a"},
+                {"name": "b", "suffix": ""},
+                {"name": "a", "suffix": ""},
             ]
-            expected = list(reversed(backend.rpc_get_completions.return_value))
-
-            actual = self.srv.rpc_get_completions("filename", "source", "offset")
-
-            self.assertEqual(expected, actual)
 
-    def test_should_uniquify_results(self):
-        with mock.patch.object(self.srv, "backend") as backend:
-            backend.rpc_get_completions.return_value = [
-                {"name": "a"},
-                {"name": "a"},
-            ]
-            expected = [{"name": "a"}]
-
-            actual = self.srv.rpc_get_completions("filename", "source", "offset")
+            actual = self.srv.rpc_get_completions(
+                "filename", "source", "offset", use_columnar=True
+            )
 
-            self.assertEqual(expected, actual)
+        self.assertEqual(
+            {
+                "length": 2,
+                "columns": {"name": ["b", "a"], "suffix": ["", ""]},
+                "strings": [],
+                "interned": [],
+            },
+            actual,
+        )
 
 
 class TestRPCGetCompletionDocs(ServerTestCase):
@@ -206,7 +333,9 @@ class TestRPCGetCalltipOrOnelineDocstring(BackendCallTestCase):
 
 class TestRPCGetRenameDiff(BackendCallTestCase):
     def test_should_call_backend(self):
-        self.assert_calls_backend("rpc_get_rename_diff", add_args=["new_name"])
+        self.assert_calls_backend(
+            "rpc_get_rename_diff", add_args=["new_name"], add_kwargs={"as_edits": True}
+        )
 
     def test_should_handle_no_backend(self):
         self.srv.backend = None
@@ -215,10 +344,78 @@ class TestRPCGetRenameDiff(BackendCallTestCase):
         )
 
 
+class TestRPCStreamRenameDiff(ServerTestCase):
+    def test_should_call_backend(self):
+        with mock.patch.object(self.srv, "backend") as backend:
+            self.srv.rpc_stream_rename_diff("filename", "source", "offset", "new_name")
+
+            args, kwargs = backend.rpc_stream_rename_diff.call_args
+            self.assertEqual(args, ("filename", "source", "offset", "new_name"))
+            self.assertFalse(kwargs["as_edits"])
+
+    def test_should_send_changed_files_as_notifications(self):
+        self.srv.stdout = io.StringIO()
+        with mock.patch.object(self.srv, "backend") as backend:
+            self.srv.rpc_stream_rename_diff("filename", "source", "offset", "new_name")
+            notify = backend.rpc_stream_rename_diff.call_args[1]["notify"]
+
+            notify({"filename": "test.py", "diff": "test diff"})
+
+        self.assertEqual(
+            json.loads(self.srv.stdout.getvalue()),
+            {
+                "method": "refactoring_file",
+                "params": {
+                    "filename": "test.py",
+                    "diff": "test diff",
+                    "request_id": None,
+                },
+            },
+        )
+
+    def test_should_handle_no_backend(self):
+        self.srv.backend = None
+        self.assertIsNone(
+            self.srv.rpc_stream_rename_diff("filname", "source", "offset", "new_name")
+        )
+
+
+class TestRPCRefactoringPreview(ServerTestCase):
+    def test_should_call_backend(self):
+        with mock.patch.object(self.srv, "backend") as backend:
+            self.srv.rpc_refactoring_preview(
+                "handle", "filename", {"filename": "source"}
+            )
+
+            backend.rpc_refactoring_preview.assert_called_with(
+                "handle", "filename", {"filename": "source"}
+            )
+
+    def test_should_handle_no_backend(self):
+        self.srv.backend = None
+        self.assertIsNone(self.srv.rpc_refactoring_preview("handle"))
+
+
+class TestRPCRefactoringApply(ServerTestCase):
+    def test_should_call_backend(self):
+        with mock.patch.object(self.srv, "backend") as backend:
+            self.srv.rpc_refactoring_apply("handle", {"filename": "source"})
+
+            backend.rpc_refactoring_apply.assert_called_with(
+                "handle", {"filename": "source"}
+            )
+
+    def test_should_handle_no_backend(self):
+        self.srv.backend = None
+        self.assertIsNone(self.srv.rpc_refactoring_apply("handle"))
+
+
 class TestRPCGetExtract_VariableDiff(BackendCallTestCase):
     def test_should_call_backend(self):
         self.assert_calls_backend(
-            "rpc_get_extract_variable_diff", add_args=["name", 12, 13, 3, 5]
+            "rpc_get_extract_variable_diff",
+            add_args=["name", 12, 13, 3, 5],
+            add_kwargs={"as_edits": False},
         )
 
     def test_should_handle_no_backend(self):
@@ -233,7 +430,9 @@ class TestRPCGetExtract_VariableDiff(BackendCallTestCase):
 class TestRPCGetExtract_FunctionDiff(BackendCallTestCase):
     def test_should_call_backend(self):
         self.assert_calls_backend(
-            "rpc_get_extract_function_diff", add_args=["name", 12, 13, 3, 5]
+            "rpc_get_extract_function_diff",
+            add_args=["name", 12, 13, 3, 5],
+            add_kwargs={"as_edits": False},
         )
 
     def test_should_handle_no_backend(self):
@@ -247,7 +446,7 @@ class TestRPCGetExtract_FunctionDiff(BackendCallTestCase):
 
 class TestRPCGetInlineDiff(BackendCallTestCase):
     def test_should_call_backend(self):
-        self.assert_calls_backend("rpc_get_inline_diff")
+        self.assert_calls_backend("rpc_get_inline_diff", add_kwargs={"as_edits": True})
 
     def test_should_handle_no_backend(self):
         self.srv.backend = None
@@ -255,7 +454,7 @@ class TestRPCGetInlineDiff(BackendCallTestCase):
 
 
 class TestRPCGetPydocCompletions(ServerTestCase):
-    @mock.patch.object(server, "get_pydoc_completions")
+    @mock.patch("elpy.pydocutils.get_pydoc_completions")
     def test_should_call_pydoc_completions(self, get_pydoc_completions):
         srv = server.ElpyRPCServer()
         srv.rpc_get_pydoc_completions()
@@ -265,15 +464,34 @@ class TestRPCGetPydocCompletions(ServerTestCase):
 
 
 class TestGetPydocDocumentation(ServerTestCase):
-    @mock.patch("pydoc.render_doc")
-    def test_should_find_documentation(self, render_doc):
-        render_doc.return_value = "expected"
+    def setUp(self):
+        super(TestGetPydocDocumentation, self).setUp()
+        self.addCleanup(self.srv.pydoc_renderer.stop)
 
-        actual = self.srv.rpc_get_pydoc_documentation("open")
+    def test_should_find_documentation(self):
+        with mock.patch.object(self.srv.pydoc_renderer, "render") as render:
+            render.return_value = "expected"
 
-        render_doc.assert_called_with("open", "Elpy Pydoc Documentation for %s", False)
+            actual = self.srv.rpc_get_pydoc_documentation("open")
+
+        render.assert_called_with("open", False)
         self.assertEqual("expected", actual)
 
+    def test_should_paginate_documentation(self):
+        documentation = self.srv.rpc_get_pydoc_documentation("json", paginate=True)
+
+        self.assertNotIn("object_pairs_hook", documentation["text"])
+        self.assertIn(
+            {"symbol": "json.loads", "kind": "function"}, documentation["sections"]
+        )
+        self.assertIn("Deserialize", self.srv.rpc_get_pydoc_documentation("json.loads"))
+
+    def test_should_not_import_module(self):
+        docstring = self.srv.rpc_get_pydoc_documentation("xmlrpc.server")
+
+        self.assertIn("SimpleXMLRPCServer", docstring)
+        self.assertNotIn("xmlrpc.server", sys.modules)
+
     def test_should_return_none_for_unknown_module(self):
         actual = self.srv.rpc_get_pydoc_documentation("frob.open")
 
@@ -295,6 +513,73 @@ class TestRPCGetUsages(BackendCallTestCase):
         self.srv.backend = None
         self.assertIsNone(self.srv.rpc_get_usages("filname", "source", "offset"))
 
+    def test_should_encode_columns_if_asked_to(self):
+        with mock.patch.object(self.srv, "backend") as backend:
+            backend.rpc_get_usages.return_value = [
+                {"name": "x", "filename": "a.py", "offset": 1},
+                {"name": "x", "filename": "a.py", "offset": 5},
+            ]
+
+            actual = self.srv.rpc_get_usages("a.py", "source", 1, use_columnar=True)
+
+        self.assertEqual([0, 0], actual["columns"]["filename"])
+        self.assertEqual(["a.py"], actual["strings"])
+
+
+class TestRPCGetOutline(ServerTestCase):
+    def test_should_return_outline(self):
+        outline = self.srv.rpc_get_outline("test.py", "def foo():\n    pass\n")
+
+        self.assertEqual(
+            outline,
+            [
+                {
+                    "name": "foo",
+                    "kind": "function",
+                    "line": 1,
+                    "start": 0,
+                    "end": 20,
+                    "children": [],
+                }
+            ],
+        )
+
+
+class TestRPCGetDiagnostics(ServerTestCase):
+    def test_should_return_diagnostics(self):
+        diagnostics = self.srv.rpc_get_diagnostics("test.py", "import os\n")
+
+        self.assertEqual(
+            diagnostics,
+            [
+                {
+                    "line": 1,
+                    "column": 7,
+                    "end_line": 1,
+                    "end_column": 9,
+                    "code": "F401",
+                    "message": "'os' imported but unused",
+                    "severity": "warning",
+                }
+            ],
+        )
+
+    def test_should_share_documents(self):
+        self.srv.rpc_get_diagnostics("test.py", "x = 1\n")
+
+        self.assertIs(self.srv.diagnostics.documents, self.srv.documents)
+
+
+class TestRPCCloseDocument(ServerTestCase):
+    def test_should_forget_document(self):
+        document = self.srv.documents.get_document("test.py", "x = 1\n")
+
+        self.srv.rpc_close_document("test.py")
+
+        self.assertIsNot(
+            self.srv.documents.get_document("test.py", "x = 1\n"), document
+        )
+
 
 class TestRPCGetNames(BackendCallTestCase):
     def test_should_call_backend(self):
@@ -340,26 +625,174 @@ class TestGetSource(unittest.TestCase):
         self.assertEqual(source, "möp")
 
 
-class TestPysymbolKey(BackendTestCase):
-    def keyLess(self, a, b):
-        self.assertLess(b, a)
-        self.assertLess(server._pysymbol_key(a), server._pysymbol_key(b))
+class Autopep8TestCase(ServerTestCase):
+    def test_rpc_fix_code_should_return_formatted_string(self):
+        code_block = "x=       123\n"
+        new_block = self.srv.rpc_fix_code(code_block, os.getcwd())
+        self.assertEqual(new_block, "x = 123\n")
 
-    def test_should_be_case_insensitive(self):
-        self.keyLess("bar", "Foo")
 
-    def test_should_sort_private_symbols_after_public_symbols(self):
-        self.keyLess("foo", "_bar")
+class BlackTestCase(ServerTestCase):
+    def test_rpc_fix_code_with_black_should_return_formatted_string(self):
+        new_block = self.srv.rpc_fix_code_with_black("x=       123\n", os.getcwd())
+        self.assertEqual(new_block, "x = 123\n")
 
-    def test_should_sort_private_symbols_after_dunder_symbols(self):
-        self.assertLess(server._pysymbol_key("__foo__"), server._pysymbol_key("_bar"))
+    def test_rpc_fix_code_with_black_should_reuse_formatter(self):
+        self.srv.rpc_fix_code_with_black("x = 1\n", os.getcwd())
+        formatter = self.srv.black_formatter
 
-    def test_should_sort_dunder_symbols_after_public_symbols(self):
-        self.keyLess("bar", "__foo")
+        self.srv.rpc_fix_code_with_black("x = 1\n", os.getcwd())
 
+        self.assertIs(self.srv.black_formatter, formatter)
 
-class Autopep8TestCase(ServerTestCase):
-    def test_rpc_fix_code_should_return_formatted_string(self):
-        code_block = "x=       123\n"
-        new_block = self.srv.rpc_fix_code(code_block, os.getcwd())
-        self.assertEqual(new_block, "x = 123\n")
+
+class TestRPCFixCodeRange(ServerTestCase):
+    source = "x=1\n\n\ndef foo():\n    y=2\n    return y\n"
+    expected = "x=1\n\n\ndef foo():\n    y = 2\n    return y\n"
+
+    def assert_formats_range(self, method):
+        edits = method(self.source, os.getcwd(), 5, 5)
+
+        self.assertEqual(apply_edits(self.source, edits), self.expected)
+
+    def test_should_format_range_with_autopep8(self):
+        self.assert_formats_range(self.srv.rpc_fix_code_range)
+
+    def test_should_format_range_with_yapf(self):
+        self.assert_formats_range(self.srv.rpc_fix_code_range_with_yapf)
+
+    def test_should_format_range_with_black(self):
+        self.assert_formats_range(self.srv.rpc_fix_code_range_with_black)
+
+
+class TestRPCFixCodeAsEdits(ServerTestCase):
+    source = "x = 1\ny=2\nz = 3\n"
+
+    def assert_returns_edits(self, method):
+        edits = method(self.source, os.getcwd(), True)
+
+        self.assertEqual(edits, [[6, 4, "y = 2\n"]])
+
+    def test_should_return_edits_from_autopep8(self):
+        self.assert_returns_edits(self.srv.rpc_fix_code)
+
+    def test_should_return_edits_from_yapf(self):
+        self.assert_returns_edits(self.srv.rpc_fix_code_with_yapf)
+
+    def test_should_return_edits_from_black(self):
+        self.assert_returns_edits(self.srv.rpc_fix_code_with_black)
+
+    def test_should_return_no_edits_for_formatted_code(self):
+        self.assertEqual(
+            self.srv.rpc_fix_code_with_black("x = 1\n", os.getcwd(), True), []
+        )
+
+
+class TestFormattingCache(ServerTestCase):
+    def test_should_not_format_same_code_twice(self):
+        with mock.patch("elpy.yapfutil.fix_code", return_value="x = 1\n") as fix_code:
+            for _ in range(2):
+                self.assertEqual(
+                    self.srv.rpc_fix_code_with_yapf("x=1\n", os.getcwd()), "x = 1\n"
+                )
+
+        self.assertEqual(fix_code.call_count, 1)
+
+    def test_should_format_again_when_config_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Black remembers project roots, so mark this one up front.
+            os.mkdir(os.path.join(directory, ".git"))
+            source = "x, y = 123, 124\n"
+            self.assertEqual(
+                self.srv.rpc_fix_code_with_black(source, directory), source
+            )
+
+            with open(os.path.join(directory, "pyproject.toml"), "w") as f:
+                f.write("[tool.black]\nline-length = 10\n")
+
+            self.assertEqual(
+                self.srv.rpc_fix_code_with_black(source, directory),
+                "x, y = (\n    123,\n    124,\n)\n",
+            )
+
+
+class TestRPCFormatFiles(ServerTestCase):
+    def setUp(self):
+        super(TestRPCFormatFiles, self).setUp()
+        self.srv.stdout = io.StringIO()
+        self.srv.request_id = 7
+        self.srv._file_formatter = mock.MagicMock()
+
+        def format_files(paths, formatter, get_config_key, callback):
+            for path in paths:
+                callback({"filename": path, "status": "formatted"})
+            return {"formatted": len(paths), "unchanged": 0, "error": 0}
+
+        self.srv._file_formatter.format_files.side_effect = format_files
+
+    def get_notifications(self):
+        for _ in range(500):
+            lines = self.srv.stdout.getvalue().splitlines()
+            if lines and json.loads(lines[-1])["method"] == "formatted_files":
+                return [json.loads(line) for line in lines]
+            time.sleep(0.01)
+        self.fail("Formatting did not finish")
+
+    def test_should_return_number_of_files(self):
+        self.assertEqual(
+            self.srv.rpc_format_files(["a.py", "b.py"], "black"), {"files": 2}
+        )
+        self.get_notifications()
+
+    def test_should_send_notifications(self):
+        self.srv.rpc_format_files(["a.py"], "yapf")
+
+        self.assertEqual(
+            self.get_notifications(),
+            [
+                {
+                    "method": "formatted_file",
+                    "params": {
+                        "filename": "a.py",
+                        "status": "formatted",
+                        "request_id": 7,
+                    },
+                },
+                {
+                    "method": "formatted_files",
+                    "params": {
+                        "formatted": 1,
+                        "unchanged": 0,
+                        "error": 0,
+                        "request_id": 7,
+                    },
+                },
+            ],
+        )
+
+    def test_should_report_formatters_that_are_not_installed(self):
+        self.srv._file_formatter = formatting.FileFormatter(processes=1)
+        with mock.patch.object(
+            self.srv,
+            "_get_config_key",
+            side_effect=Fault("black is not installed", code=400),
+        ):
+            self.srv.rpc_format_files(["a.py"], "black")
+            notifications = self.get_notifications()
+
+        self.assertEqual(
+            [notification["params"] for notification in notifications],
+            [
+                {
+                    "filename": os.path.abspath("a.py"),
+                    "status": "error",
+                    "message": "black is not installed",
+                    "request_id": 7,
+                },
+                {"formatted": 0, "unchanged": 0, "error": 1, "request_id": 7},
+            ],
+        )
+
+    def test_should_reject_unknown_formatters(self):
+        with self.assertRaises(Fault):
+            self.srv.rpc_format_files(["a.py"], "gofmt")
@@ -2,6 +2,8 @@
 """Tests for the elpy.yapf module"""
 
 import os
+import tempfile
+from unittest import mock
 
 from elpy import yapfutil
 from elpy.rpc import Fault
@@ -29,6 +31,38 @@ class YAPFTestCase(BackendTestCase):
         for src, expected in testdata:
             self._assert_format(src, expected)
 
+    def test_config_key_should_change_with_style_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            key = yapfutil.get_config_key(directory)
+
+            with open(os.path.join(directory, ".style.yapf"), "w") as f:
+                f.write("[style]\nbased_on_style = pep8\n")
+
+            self.assertNotEqual(yapfutil.get_config_key(directory), key)
+
+    def test_should_use_style_of_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            src = "def foo():\n    return 1\n"
+            self.assertEqual(yapfutil.fix_code(src, directory), src)
+
+            with open(os.path.join(directory, ".style.yapf"), "w") as f:
+                f.write("[style]\nbased_on_style = pep8\nindent_width = 2\n")
+
+            self.assertEqual(
+                yapfutil.fix_code(src, directory), "def foo():\n  return 1\n"
+            )
+
+    def test_should_cache_style(self):
+        with tempfile.TemporaryDirectory() as directory:
+            style = yapfutil.get_style(directory)
+
+            with mock.patch(
+                "yapf.yapflib.file_resources.GetDefaultStyleForDir"
+            ) as get_default_style:
+                self.assertIs(yapfutil.get_style(directory), style)
+
+        self.assertFalse(get_default_style.called)
+
     def _assert_format(self, src, expected):
         new_block = yapfutil.fix_code(src, os.getcwd())
         self.assertEqual(new_block, expected)
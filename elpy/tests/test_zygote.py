@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from elpy import zygote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def start_client(socket_path):
+    return subprocess.Popen(
+        [sys.executable, "-m", "elpy", "--connect", socket_path],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        cwd=ROOT,
+        universal_newlines=True,
+    )
+
+
+def echo(client, value):
+    client.stdin.write(
+        json.dumps({"id": 1, "method": "echo", "params": [value]}) + "\n"
+    )
+    client.stdin.flush()
+    return json.loads(client.stdout.readline())
+
+
+@unittest.skipUnless(zygote.is_supported(), "Zygote mode needs fork")
+class TestZygote(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="elpy-test-")
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.socket_path = os.path.join(self.tempdir, "zygote")
+
+    def start_zygote(self):
+        process = subprocess.Popen(
+            [sys.executable, "-m", "elpy", "--zygote", self.socket_path], cwd=ROOT
+        )
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        deadline = time.time() + 30
+        while not os.path.exists(self.socket_path):
+            if time.time() > deadline or process.poll() is not None:
+                self.fail("Zygote did not start")
+            time.sleep(0.05)
+        return process
+
+    def run_client(self):
+        client = start_client(self.socket_path)
+        self.addCleanup(client.stdout.close)
+        self.assertTrue(client.stdout.readline().startswith("elpy-rpc ready"))
+        self.assertEqual({"id": 1, "result": ["hello"]}, echo(client, "hello"))
+        client.stdin.close()
+        self.assertEqual(0, client.wait(timeout=30))
+
+    def test_should_serve_forked_clients(self):
+        self.start_zygote()
+
+        self.run_client()
+        self.run_client()
+
+    def test_should_serve_itself_without_zygote(self):
+        self.run_client()
+
+    def test_should_not_connect_without_zygote(self):
+        self.assertFalse(zygote.connect(self.socket_path))
+
+    def test_should_only_allow_the_user_to_connect(self):
+        self.start_zygote()
+
+        self.assertEqual(0o600, os.stat(self.socket_path).st_mode & 0o777)
+
+    def send_request(self, data):
+        """Send data to the zygote like a client and return the reply."""
+        stdin_read, stdin_write = os.pipe()
+        stdout_read, stdout_write = os.pipe()
+        for fd in (stdin_read, stdin_write, stdout_read, stdout_write):
+            self.addCleanup(os.close, fd)
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(connection.close)
+        connection.connect(self.socket_path)
+        socket.send_fds(connection, [b"\0"], [stdin_read, stdout_write])
+        connection.sendall(data + b"\n")
+        connection.shutdown(socket.SHUT_WR)
+        return zygote._read_until_closed(connection)
+
+    def test_should_ignore_invalid_requests(self):
+        self.start_zygote()
+        request = dict(zygote._get_request(), cwd=os.path.join(self.tempdir, "x"))
+
+        self.assertEqual(b"", self.send_request(b"[]"))
+        self.assertEqual(b"", self.send_request(b'"x"'))
+        # The zygote still answers
+        reply = self.send_request(json.dumps(request).encode("utf-8"))
+        self.assertTrue(reply.startswith(b"0"))
+
+    def test_should_report_failing_children(self):
+        self.start_zygote()
+        missing_directory = os.path.join(self.tempdir, "missing")
+        request = dict(zygote._get_request(), cwd=missing_directory)
+
+        reply = self.send_request(json.dumps(request).encode("utf-8"))
+        reply = reply.decode("utf-8")
+
+        self.assertTrue(reply.startswith("0Could not start a server in "))
+        self.assertIn(missing_directory, reply)
@@ -6,6 +6,7 @@ from elpy.use_cases import (
     get_completions_use_case,
     refactor_rename_use_case,
 )
+from elpy.use_cases.interface import ChangedFile
 
 
 class GetCompletionsPresenterTestImpl:
@@ -20,10 +21,15 @@ class GetCompletionsPresenterTestImpl:
 class RefactorRenamePresenterTestImpl:
     def __init__(self) -> None:
         self.responses: List[refactor_rename_use_case.Response] = []
+        self.changed_files: List[ChangedFile] = []
 
     def present_refactoring(self, response: refactor_rename_use_case.Response) -> None:
         self.responses.append(response)
 
+    def present_changed_file(self, changed_file: ChangedFile) -> None:
+        assert not self.responses
+        self.changed_files.append(changed_file)
+
 
 class GetCompletionDocstringPresenterTestImpl:
     def __init__(self) -> None:
@@ -1,12 +1,13 @@
-from typing import Optional
+from typing import Iterator, Optional
 
-from elpy.use_cases.interface import Refactoring
+from elpy.use_cases.interface import ChangedFile, Refactoring, StreamedRefactoring
 
 
 class TestingRefactorer:
     def __init__(self) -> None:
         self._can_do_renaming = True
         self._refactoring: Optional[Refactoring] = None
+        self.requested_edits: Optional[bool] = None
 
     def disable_renaming(self) -> None:
         self._can_do_renaming = False
@@ -26,5 +27,29 @@ class TestingRefactorer:
         offset: int,
         file_name: str,
         new_identifier_name: str,
+        as_edits: bool = False,
     ) -> Optional[Refactoring]:
+        self.requested_edits = as_edits
         return self._refactoring
+
+    def rename_identifier_by_file(
+        self,
+        source: str,
+        offset: int,
+        file_name: str,
+        new_identifier_name: str,
+        as_edits: bool = False,
+    ) -> Optional[StreamedRefactoring]:
+        self.requested_edits = as_edits
+        if self._refactoring is None:
+            return None
+        return StreamedRefactoring(
+            changed_files=self._render_changed_files(self._refactoring),
+            project_path=self._refactoring.project_path,
+            renames=self._refactoring.renames or [],
+            handle=self._refactoring.handle,
+        )
+
+    def _render_changed_files(self, refactoring: Refactoring) -> Iterator[ChangedFile]:
+        for file_name in refactoring.changed_files:
+            yield ChangedFile(file_name=file_name, diff=refactoring.diff)
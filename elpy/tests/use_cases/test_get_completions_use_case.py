@@ -1,7 +1,12 @@
 from typing import Callable, Optional, cast
 from unittest import TestCase
 
-from elpy.use_cases.get_completions_use_case import Completion, Request, Response
+from elpy.use_cases.get_completions_use_case import (
+    Completion,
+    Request,
+    Response,
+    pysymbol_key,
+)
 
 from .dependency_injection import DependencyInjector
 
@@ -100,6 +105,40 @@ class Tests(TestCase):
             lambda response: response.proposals[0].description == expected_description
         )
 
+    def test_propose_completions_without_copying_them(self) -> None:
+        completion = Completion(
+            name="xyz",
+            suffix="yz",
+            annotation="test annotation",
+            description="description test",
+        )
+        self.completer.set_completions([completion])
+        self.use_case.get_completions(self.get_request())
+        self.assertResponse(lambda response: response.proposals[0] is completion)
+        self.assertFalse(hasattr(completion, "__dict__"))
+
+    def test_propose_completions_sorted_by_name(self) -> None:
+        self.completer.set_completions(
+            [self.get_completion(name) for name in ["_e", "__d", "c", "B", "a"]]
+        )
+        self.use_case.get_completions(self.get_request())
+        self.assertResponse(
+            lambda response: [proposal.name for proposal in response.proposals]
+            == ["a", "B", "c", "__d", "_e"]
+        )
+
+    def test_propose_completions_unique_by_name(self) -> None:
+        self.completer.set_completions(
+            [self.get_completion("a"), self.get_completion("a")]
+        )
+        self.use_case.get_completions(self.get_request())
+        self.assertResponse(lambda response: len(response.proposals) == 1)
+
+    def get_completion(self, name: str) -> Completion:
+        return Completion(
+            name=name, suffix=name, annotation="statement", description=name
+        )
+
     def get_request(self) -> Request:
         return Request(
             file_name="testfile.py",
@@ -115,3 +154,21 @@ class Tests(TestCase):
         if condition:
             response = cast(Response, output)
             self.assertTrue(condition(response))
+
+
+class TestPysymbolKey(TestCase):
+    def keyLess(self, a: str, b: str) -> None:
+        self.assertLess(b, a)
+        self.assertLess(pysymbol_key(a), pysymbol_key(b))
+
+    def test_should_be_case_insensitive(self) -> None:
+        self.keyLess("bar", "Foo")
+
+    def test_should_sort_private_symbols_after_public_symbols(self) -> None:
+        self.keyLess("foo", "_bar")
+
+    def test_should_sort_private_symbols_after_dunder_symbols(self) -> None:
+        self.assertLess(pysymbol_key("__foo__"), pysymbol_key("_bar"))
+
+    def test_should_sort_dunder_symbols_after_public_symbols(self) -> None:
+        self.keyLess("bar", "__foo")
@@ -1,7 +1,7 @@
 from typing import Callable
 from unittest import TestCase
 
-from elpy.use_cases.interface import Refactoring
+from elpy.use_cases.interface import FileEdits, Refactoring, TextEdit
 from elpy.use_cases.refactor_rename_use_case import Changes, FailureReason, Request
 
 from .dependency_injection import DependencyInjector
@@ -102,3 +102,94 @@ class EnabledCapabilitiesWithSucceedingRefactoring(TestCase):
 
     def create_request(self) -> Request:
         return Request(source="x = 1", offset=0, new_name="y", file_name="test.py")
+
+
+class EnabledCapabilitiesWithSucceedingEditsRefactoring(TestCase):
+    def setUp(self) -> None:
+        self.injector = DependencyInjector()
+        self.refactorer = self.injector.get_refactorer()
+        self.presenter = self.injector.get_refactor_rename_presenter()
+        self.use_case = self.injector.get_refactor_rename_use_case()
+        self.refactorer.enable_renaming()
+        self.expected_edits = [
+            FileEdits(
+                file_name="test.py",
+                edits=[TextEdit(offset=0, length=1, replacement="y")],
+            )
+        ]
+        self.refactorer.set_refactoring_result(
+            Refactoring(
+                changed_files=["test.py"],
+                diff=None,
+                project_path="test/path",
+                file_edits=self.expected_edits,
+                renames=[],
+            )
+        )
+
+    def test_that_edits_are_requested_from_refactorer(self) -> None:
+        self.use_case.create_rename_diff(request=self.create_request())
+        self.assertTrue(self.refactorer.requested_edits)
+
+    def test_that_expected_edits_are_rendered(self) -> None:
+        self.use_case.create_rename_diff(request=self.create_request())
+        changes = self.presenter.responses[0].changes
+        assert isinstance(changes, Changes)
+        self.assertEqual(changes.file_edits, self.expected_edits)
+
+    def test_that_no_diff_is_rendered(self) -> None:
+        self.use_case.create_rename_diff(request=self.create_request())
+        changes = self.presenter.responses[0].changes
+        assert isinstance(changes, Changes)
+        self.assertIsNone(changes.diff)
+
+    def create_request(self) -> Request:
+        return Request(
+            source="x = 1", offset=0, new_name="y", file_name="test.py", as_edits=True
+        )
+
+
+class StreamedRenamingTests(TestCase):
+    def setUp(self) -> None:
+        self.injector = DependencyInjector()
+        self.refactorer = self.injector.get_refactorer()
+        self.presenter = self.injector.get_refactor_rename_presenter()
+        self.use_case = self.injector.get_refactor_rename_use_case()
+        self.refactorer.enable_renaming()
+        self.refactorer.set_refactoring_result(
+            Refactoring(
+                changed_files=["a.py", "b.py"],
+                diff="test diff",
+                project_path="test/path",
+            )
+        )
+
+    def test_that_every_changed_file_is_presented(self) -> None:
+        self.use_case.stream_rename_diff(request=self.create_request())
+        self.assertEqual(
+            [changed_file.file_name for changed_file in self.presenter.changed_files],
+            ["a.py", "b.py"],
+        )
+
+    def test_that_summary_lists_changed_files_without_diff(self) -> None:
+        self.use_case.stream_rename_diff(request=self.create_request())
+        changes = self.presenter.responses[0].changes
+        assert isinstance(changes, Changes)
+        self.assertEqual(changes.changed_files, ["a.py", "b.py"])
+        self.assertIsNone(changes.diff)
+
+    def test_that_failure_reason_is_given_without_result(self) -> None:
+        self.refactorer.set_refactoring_result(None)
+        self.use_case.stream_rename_diff(request=self.create_request())
+        self.assertEqual(self.presenter.responses[0].changes, FailureReason.NO_RESULT)
+        self.assertFalse(self.presenter.changed_files)
+
+    def test_that_failure_reason_is_given_when_renaming_is_disabled(self) -> None:
+        self.refactorer.disable_renaming()
+        self.use_case.stream_rename_diff(request=self.create_request())
+        self.assertEqual(
+            self.presenter.responses[0].changes, FailureReason.NOT_AVAILABLE
+        )
+
+    def create_request(self) -> Request:
+        return Request(source="x = 1", offset=0, new_name="y", file_name="test.py")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Iterable, List, Protocol
+from typing import Dict, Iterable, List, Protocol
 
 
 @dataclass
@@ -10,21 +10,16 @@ class GetCompletionsUseCase:
     presenter: GetCompletionsPresenter
 
     def get_completions(self, request: Request) -> None:
-        response = Response(
-            proposals=[
-                Proposal(
-                    name=completion.name,
-                    suffix=completion.suffix,
-                    annotation=completion.annotation,
-                    description=completion.description,
-                )
-                for completion in self.completer.get_completions(
-                    file_name=request.file_name,
-                    source=request.source,
-                    offset=request.offset,
-                )
-            ]
-        )
+        # Completions are proposed as they are, without copying them,
+        # unique by name and sorted.
+        unique: Dict[str, Completion] = {}
+        for completion in self.completer.get_completions(
+            file_name=request.file_name,
+            source=request.source,
+            offset=request.offset,
+        ):
+            unique[completion.name] = completion
+        response = Response(proposals=sorted(unique.values(), key=get_sort_key))
         self.presenter.present_completion(response)
 
 
@@ -37,23 +32,36 @@ class Request:
 
 @dataclass
 class Response:
-    proposals: List[Proposal]
+    proposals: List[Completion]
 
 
 @dataclass
-class Proposal:
+class Completion:
+    __slots__ = ("name", "suffix", "annotation", "description")
+
     name: str
     suffix: str
     annotation: str
     description: str
 
 
-@dataclass
-class Completion:
-    name: str
-    suffix: str
-    annotation: str
-    description: str
+def get_sort_key(completion: Completion) -> str:
+    return pysymbol_key(completion.name)
+
+
+def pysymbol_key(name: str) -> str:
+    """Return a sortable key index for name.
+
+    Sorting is case-insensitive, with the first underscore counting as
+    worse than any character, but subsequent underscores do not. This
+    means that dunder symbols (like __init__) are sorted after symbols
+    that start with an alphabetic character, but before those that
+    start with only a single underscore.
+
+    """
+    if name.startswith("_"):
+        name = "~" + name[1:]
+    return name.lower()
 
 
 class Completer(Protocol):
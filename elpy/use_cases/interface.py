@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Iterable, Optional, Protocol
+from typing import Iterable, Iterator, List, Optional, Protocol, Tuple
 
 
 @dataclass
@@ -25,9 +25,20 @@ class Refactorer(Protocol):
         offset: int,
         file_name: str,
         new_identifier_name: str,
+        as_edits: bool = False,
     ) -> Optional[Refactoring]:
         ...
 
+    def rename_identifier_by_file(
+        self,
+        source: str,
+        offset: int,
+        file_name: str,
+        new_identifier_name: str,
+        as_edits: bool = False,
+    ) -> Optional[StreamedRefactoring]:
+        ...
+
     def can_do_renaming(self) -> bool:
         ...
 
@@ -35,5 +46,36 @@ class Refactorer(Protocol):
 @dataclass
 class Refactoring:
     changed_files: Iterable[str]
-    diff: str
+    diff: Optional[str]
+    project_path: str
+    file_edits: Optional[List[FileEdits]] = None
+    renames: Optional[List[Tuple[str, str]]] = None
+    handle: Optional[str] = None
+
+
+@dataclass
+class TextEdit:
+    offset: int
+    length: int
+    replacement: str
+
+
+@dataclass
+class FileEdits:
+    file_name: str
+    edits: List[TextEdit]
+
+
+@dataclass
+class ChangedFile:
+    file_name: str
+    diff: Optional[str] = None
+    edits: Optional[List[TextEdit]] = None
+
+
+@dataclass
+class StreamedRefactoring:
+    changed_files: Iterator[ChangedFile]
     project_path: str
+    renames: List[Tuple[str, str]]
+    handle: Optional[str] = None
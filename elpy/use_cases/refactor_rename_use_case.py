@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import enum
 from dataclasses import dataclass
-from typing import List, Protocol, Union
+from typing import List, Optional, Protocol, Tuple, Union
 
-from elpy.use_cases.interface import Refactorer
+from elpy.use_cases.interface import ChangedFile, FileEdits, Refactorer
 
 
 @dataclass
@@ -23,6 +23,7 @@ class RefactorRenameUseCase:
             offset=request.offset,
             file_name=request.file_name,
             new_identifier_name=request.new_name,
+            as_edits=request.as_edits,
         )
         if refactoring is None:
             self.presenter.present_refactoring(
@@ -35,6 +36,49 @@ class RefactorRenameUseCase:
                     project_path=refactoring.project_path,
                     diff=refactoring.diff,
                     changed_files=list(refactoring.changed_files),
+                    file_edits=refactoring.file_edits,
+                    renames=refactoring.renames,
+                    handle=refactoring.handle,
+                )
+            )
+        )
+
+    def stream_rename_diff(self, request: Request) -> None:
+        """Present the changes of a renaming one file at a time.
+
+        Every changed file is presented as soon as its changes are
+        rendered, followed by a summary response without a diff.
+
+        """
+        if not self.refactorer.can_do_renaming():
+            self.presenter.present_refactoring(
+                Response(changes=FailureReason.NOT_AVAILABLE)
+            )
+            return
+        refactoring = self.refactorer.rename_identifier_by_file(
+            source=request.source,
+            offset=request.offset,
+            file_name=request.file_name,
+            new_identifier_name=request.new_name,
+            as_edits=request.as_edits,
+        )
+        if refactoring is None:
+            self.presenter.present_refactoring(
+                Response(changes=FailureReason.NO_RESULT)
+            )
+            return
+        changed_files = []
+        for changed_file in refactoring.changed_files:
+            self.presenter.present_changed_file(changed_file)
+            changed_files.append(changed_file.file_name)
+        self.presenter.present_refactoring(
+            Response(
+                changes=Changes(
+                    project_path=refactoring.project_path,
+                    diff=None,
+                    changed_files=changed_files,
+                    renames=refactoring.renames,
+                    handle=refactoring.handle,
                 )
             )
         )
@@ -44,6 +88,9 @@ class RefactorRenamePresenter(Protocol):
     def present_refactoring(self, response: Response) -> None:
         ...
 
+    def present_changed_file(self, changed_file: ChangedFile) -> None:
+        ...
+
 
 @dataclass
 class Request:
@@ -51,6 +98,7 @@ class Request:
     offset: int
     new_name: str
     file_name: str
+    as_edits: bool = False
 
 
 @dataclass
@@ -66,5 +114,8 @@ class FailureReason(enum.Enum):
 @dataclass
 class Changes:
     project_path: str
-    diff: str
+    diff: Optional[str]
     changed_files: List[str]
+    file_edits: Optional[List[FileEdits]] = None
+    renames: Optional[List[Tuple[str, str]]] = None
+    handle: Optional[str] = None
@@ -3,23 +3,74 @@
 """
 
 import os
+from typing import Any, Dict, Tuple
 
 from elpy.rpc import Fault
 
 try:
-    from yapf.yapflib import file_resources, yapf_api
+    from yapf.yapflib import file_resources, style, yapf_api
 except ImportError:  # pragma: no cover
     yapf_api = None
 
+# The files yapf looks for in every directory
+CONFIG_FILES = (".style.yapf", "setup.cfg", "pyproject.toml")
+
+# directory -> (config key, style)
+_styles: Dict[str, Tuple[Any, Any]] = {}
+
+
+def get_config_key(directory):
+    """Return a key that changes whenever the style might.
+
+    yapf uses the first configuration file found from directory
+    upwards, or the user style. The key lists the modification times
+    of all files it might read.
+
+    """
+    paths = []
+    parent = os.path.abspath(directory or os.getcwd())
+    while True:
+        paths.extend(os.path.join(parent, filename) for filename in CONFIG_FILES)
+        parent, tail = os.path.split(parent)
+        if not tail:
+            break
+    if yapf_api:
+        paths.append(os.path.expanduser(style.GLOBAL_STYLE))
+    key = []
+    for path in paths:
+        try:
+            key.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+    return tuple(key)
+
+
+def get_style(directory):
+    """Return the parsed yapf style that applies to directory.
+
+    Styles are cached per directory until one of the configuration
+    files changes.
+
+    """
+    directory = os.path.abspath(directory or os.getcwd())
+    config_key = get_config_key(directory)
+    cached = _styles.get(directory)
+    if cached is None or cached[0] != config_key:
+        style_config = file_resources.GetDefaultStyleForDir(directory)
+        cached = (config_key, style.CreateStyleFromConfig(style_config))
+        _styles[directory] = cached
+    return cached[1]
+
 
 def fix_code(code, directory):
     """Formats Python code to conform to the PEP 8 style guide."""
     if not yapf_api:
         raise Fault("yapf not installed", code=400)
-    style_config = file_resources.GetDefaultStyleForDir(directory or os.getcwd())
     try:
+        # Without a style_config, yapf formats with the global style.
+        style.SetGlobalStyle(get_style(directory))
         reformatted_source, _ = yapf_api.FormatCode(
-            code, filename="<stdin>", style_config=style_config, verify=False
+            code, filename="<stdin>", style_config=None, verify=False
         )
         return reformatted_source
     except Exception as e:
@@ -0,0 +1,175 @@
+"""Pre-forked, warm server processes.
+
+Starting a new server means importing Jedi and warming its caches
+again. In zygote mode, a parent process does that once and then waits
+on a Unix domain control socket. Every client connecting to it gets a
+forked child which is ready to serve right away and shares the warm
+memory of the parent copy-on-write.
+
+The client is a small launcher process which passes its standard
+input and output to the zygote and waits for the child to exit:
+
+  python -m elpy --zygote /path/to/socket
+  python -m elpy --connect /path/to/socket
+
+If no zygote is listening, the launcher runs a normal server itself.
+
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+from typing import List
+
+PROTOCOL_VERSION = 1
+
+
+def is_supported() -> bool:
+    """Return whether zygote mode works on this platform."""
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+
+
+def serve_zygote(socket_path: str) -> None:
+    """Warm up and fork a server for every client connecting."""
+    from elpy.server import warm_up
+
+    warm_up()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        os.unlink(socket_path)
+    except OSError:
+        pass
+    # Only the user may connect, also right after the socket is created.
+    umask = os.umask(0o177)
+    try:
+        listener.bind(socket_path)
+    finally:
+        os.umask(umask)
+    listener.listen()
+    # Let the kernel reap exited children.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    try:
+        while True:
+            connection, _ = listener.accept()
+            try:
+                _handle_connection(listener, connection)
+            except (OSError, ValueError):
+                pass
+            finally:
+                connection.close()
+    finally:
+        listener.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+
+def _handle_connection(listener, connection) -> None:
+    _, fds, _, _ = socket.recv_fds(connection, 1, 2)
+    try:
+        with connection.makefile("r", encoding="utf-8") as f:
+            request = json.loads(f.readline())
+        if len(fds) != 2 or not _is_compatible(request):
+            return
+        if os.fork() == 0:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            listener.close()
+            status = 1
+            try:
+                _run_child(connection, request, fds[0], fds[1])
+                status = 0
+            finally:
+                # The launcher waits for this connection to close.
+                os._exit(status)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def _is_compatible(request) -> bool:
+    return (
+        isinstance(request, dict)
+        and request.get("protocol") == PROTOCOL_VERSION
+        and request.get("executable") == sys.executable
+    )
+
+
+def _run_child(connection, request, stdin_fd: int, stdout_fd: int) -> None:
+    """Set up the forked child like the launcher and serve it.
+
+    The launcher is told whether this worked: b"1" if the server is
+    taking over, or b"0" followed by an error message if it could not
+    be set up. In the latter case the launcher runs a server itself.
+
+    """
+    from elpy.server import serve
+
+    try:
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["environment"])
+        sys.path[:] = request["sys_path"]
+        stdin = open(stdin_fd, "r", encoding="utf-8")
+        stdout = open(stdout_fd, "w", encoding="utf-8")
+    except Exception as e:
+        message = "Could not start a server in {0}: {1}".format(request.get("cwd"), e)
+        connection.sendall(b"0" + message.encode("utf-8", "replace"))
+        raise
+    connection.sendall(b"1")
+    serve(stdin, stdout, warm_up_in_background=False)
+
+
+def connect(socket_path: str) -> bool:
+    """Have the zygote at socket_path serve this process' stdin and stdout.
+
+    Returns once the forked server exited. Returns False without doing
+    anything if no zygote could be reached, or after writing the error
+    to stderr if the forked server could not be set up.
+
+    """
+    if not is_supported():
+        return False
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        socket.send_fds(connection, [b"\0"], [sys.stdin.fileno(), sys.stdout.fileno()])
+        connection.sendall(json.dumps(_get_request()).encode("utf-8") + b"\n")
+        connection.shutdown(socket.SHUT_WR)
+        # The forked server confirms it took over, and closes the
+        # connection once it exits.
+        reply = connection.recv(1)
+        if reply != b"1":
+            if reply == b"0":
+                message = _read_until_closed(connection)
+                sys.stderr.write(
+                    "elpy: {0}\n".format(message.decode("utf-8", "replace"))
+                )
+            return False
+        _read_until_closed(connection)
+    except OSError:
+        return False
+    finally:
+        connection.close()
+    return True
+
+
+def _get_request():
+    return {
+        "protocol": PROTOCOL_VERSION,
+        "executable": sys.executable,
+        "cwd": os.getcwd(),
+        "environment": dict(os.environ),
+        "sys_path": sys.path,
+    }
+
+
+def _read_until_closed(connection) -> bytes:
+    data: List[bytes] = []
+    while True:
+        chunk = connection.recv(4096)
+        if not chunk:
+            return b"".join(data)
+        data.append(chunk)